@@ -8,6 +8,7 @@ from datetime import datetime
 from db.database import get_db
 from db import models, crud
 from services import analytics_service
+from services.ingestion_engine import get_engine
 from api.deps import get_current_user
 
 logger = logging.getLogger("BotAnalytics")
@@ -133,11 +134,12 @@ async def resolve_gap(
         qa_content = f"Question: {request.query}\nAnswer: {request.answer}"
         filename = f"quick_fix_{request.query[:10].replace(' ', '_')}_{str(datetime.now().timestamp())}.txt"
         
-        # We use the RAG pipeline directly to add this 'document'
-        from services import rag_pipeline
-        success = rag_pipeline.add_document_to_knowledge_base(bot.public_id, qa_content, filename)
+        # Shared ingestion engine, awaited off the event loop
+        result = await get_engine().run_async(
+            "ingest_text", bot.public_id, qa_content, filename, "manual"
+        )
         
-        if not success:
+        if not result.success:
             raise HTTPException(status_code=500, detail="Failed to add knowledge to vector store")
             
         # 2. Mark specific log as resolved (if provided) or find matching ones
@@ -1,5 +1,4 @@
 import os
-import shutil
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import List
@@ -7,7 +6,7 @@ from fastapi.responses import RedirectResponse
 
 from db import crud, schemas
 from db.database import get_db
-from services import data_ingestion, asset_manager
+from services import data_ingestion, asset_manager, upload_pipeline, garbage_collector
 
 
 from api.deps import get_current_user
@@ -83,36 +82,33 @@ async def upload_knowledge(
     if bot.owner_id != current_user.id:
          raise HTTPException(status_code=403, detail="Not authorized to modify this bot")
 
-    asset = asset_manager.upload_asset(db, public_id, file)
+    # 2. Spool to local disk once (no Cloudinary -> download round trip)
+    spool_path = upload_pipeline.spool_upload(file)
+    
+    asset, needs_upload = asset_manager.register_asset(
+        db, public_id, file.filename, os.path.getsize(spool_path)
+    )
     if not asset:
+        upload_pipeline.cleanup_spool(spool_path)
         raise HTTPException(status_code=500, detail="Failed to upload asset")
-    
-    # 2. Save Temp File
-    # Create temp directory
-    # temp_dir = f"./data/temp/{public_id}"
-    # os.makedirs(temp_dir, exist_ok=True)
-    
-    # # Define full path
-    # temp_file_path = f"{temp_dir}/{file.filename}"
-    
-    # # Write bytes to disk
-    # with open(temp_file_path, "wb") as buffer:
-    #     shutil.copyfileobj(file.file, buffer)
 
-    # 3. Queue Background Task
+    # 3. Queue Background Task: index from the spool while it is pushed to storage
     background_tasks.add_task(
-        data_ingestion.ingest_from_url,         
-        public_id, 
-        asset.cloudinary_url, 
-        asset.filename
+        upload_pipeline.process_spooled_upload,
+        spool_path,
+        public_id,
+        asset.id,
+        data_ingestion.ingest_file_from_path,
+        needs_upload
     )
 
-    return {"message": "File uploaded to Cloud & Indexing started."}
+    return {"message": "File received & Indexing started."}
 
 
 @router.delete("/{public_id}")
 def delete_existing_bot(
     public_id: str, 
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -130,8 +126,9 @@ def delete_existing_bot(
     if not success:
         raise HTTPException(status_code=404, detail="Bot not found")
     
-    # Optional: You could also try to delete the Chroma collection here,
-    # but for a hackathon, leaving the vector files is safer to avoid "File Lock" crashes.
+    # Collection + stored files are reaped in the background; a collection that is
+    # still being written to is skipped here and picked up by the periodic reaper.
+    background_tasks.add_task(garbage_collector.collect_bot, public_id)
     
     return {"message": "Bot deleted successfully"}
 
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+import os
+import json
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from db import schemas, crud
+from db import models, schemas, crud
 from db.database import get_db
+from api.deps import get_current_user
 
-from services import rag_pipeline
+from services import rag_pipeline, conversation_memory
+
+BATCH_CHAT_MAX_QUESTIONS = int(os.getenv("BATCH_CHAT_MAX_QUESTIONS", "500"))
+BATCH_CHAT_MAX_CONCURRENCY = int(os.getenv("BATCH_CHAT_MAX_CONCURRENCY", "16"))
 
 router = APIRouter(
     prefix="/api/v1/chat", 
@@ -14,6 +21,7 @@ router = APIRouter(
 def chat_with_bot(
     request: Request,
     chat_request: schemas.ChatRequest, 
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ): 
     
@@ -47,9 +55,16 @@ def chat_with_bot(
         ans = rag_pipeline.generate_response(
             message=chat_request.message, 
             bot=bot,
-            db=db
+            db=db,
+            session_id=chat_request.session_id
         )
         
+        if chat_request.session_id:
+            memory = conversation_memory.get_memory()
+            memory.record_turn(bot.public_id, chat_request.session_id, chat_request.message, ans)
+            # Summarizing old turns can call the LLM: done after the response is sent
+            background_tasks.add_task(memory.compact, bot.public_id, chat_request.session_id)
+        
     except Exception as e:
         print(f"Error in RAG Pipeline: {e}")
         raise HTTPException(
@@ -57,4 +72,65 @@ def chat_with_bot(
             detail="Something went wrong generating the response"
         )  
         
-    return schemas.ChatResponse(response=ans)
\ No newline at end of file
+    return schemas.ChatResponse(response=ans, session_id=chat_request.session_id)
+
+
+@router.post("/batch")
+def batch_chat_with_bot(
+    batch_request: schemas.BatchChatRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Answer a list of questions for one bot (pre-launch test suites).
+    Streams NDJSON: one JSON object per line as each answer completes
+    (out of order; "index" refers to the request list), then a summary line.
+    """
+    bot = crud.get_bot_by_public_id(db, public_id=batch_request.bot_id)
+    if not bot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail="Bot not Found"
+        )
+    if bot.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    questions = batch_request.questions
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+    # Blank entries are rejected, not dropped: "index" must match the request list
+    blank = [i for i, q in enumerate(questions) if not q or not q.strip()]
+    if blank:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Empty questions at positions {blank[:10]}"
+        )
+    if len(questions) > BATCH_CHAT_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"At most {BATCH_CHAT_MAX_QUESTIONS} questions per batch"
+        )
+    
+    concurrency = min(batch_request.concurrency or rag_pipeline.BATCH_CHAT_CONCURRENCY, BATCH_CHAT_MAX_CONCURRENCY)
+    
+    def stream():
+        answered = gaps = errors = 0
+        for result in rag_pipeline.generate_batch_responses(
+            questions, bot, concurrency=concurrency, log_gaps=batch_request.log_gaps
+        ):
+            if "error" in result:
+                errors += 1
+            else:
+                answered += 1
+                gaps += result["flagged_as_gap"]
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        
+        yield json.dumps({
+            "done": True, 
+            "questions": len(questions), 
+            "answered": answered, 
+            "knowledge_gaps": gaps, 
+            "errors": errors
+        }) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+import os
+import json
+from typing import List
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
 from db.database import get_db
-from db import models
+from db import models, schemas
 # Import your existing asset manager
-from services import asset_manager, data_ingestion
+from services import asset_manager, data_ingestion, upload_pipeline, ingestion_engine
+from services import vector_store, index_profiles, index_tuning
 # Import RAG service to process the file content
 from services import rag_pipeline 
-import requests
 import logging
 from api.deps import get_current_user
 
@@ -17,6 +20,7 @@ router = APIRouter(prefix="/api/v1/bots", tags=["Knowledge Base"])
 @router.post("/{bot_id}/knowledge-base/upload")
 async def upload_knowledge(
     bot_id: str, 
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...), 
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -28,49 +32,182 @@ async def upload_knowledge(
     if bot.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # We pass the public_id (bot_id) to asset_manager
-    asset = asset_manager.upload_asset(db, bot_id, file)
+    # Spool once; training reads the local copy while storage upload runs alongside
+    spool_path = upload_pipeline.spool_upload(file)
+    
+    asset, needs_upload = asset_manager.register_asset(
+        db, bot_id, file.filename, os.path.getsize(spool_path)
+    )
     if not asset:
+        upload_pipeline.cleanup_spool(spool_path)
         raise HTTPException(500, "Failed to Upload Asset")
     
+    # Train in the background through the shared ingestion engine
+    background_tasks.add_task(
+        upload_pipeline.process_spooled_upload,
+        spool_path,
+        bot_id,
+        asset.id,
+        data_ingestion.ingest_file_from_path,
+        needs_upload
+    )
+
+    return {"status": "processing", "filename": asset.filename, "message": "File saved & training started."}
+
+
+@router.post("/{bot_id}/knowledge-base/bulk-upload")
+async def bulk_upload_knowledge(
+    bot_id: str, 
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...), 
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Upload many files and/or ZIP archives at once.
+    Everything is indexed as ONE background job; poll its progress with
+    GET /{bot_id}/knowledge-base/jobs/{job_id}.
+    """
+    bot = db.query(models.Bot).filter(models.Bot.public_id == bot_id).first()
+    if not bot: raise HTTPException(404, "Bot Not Found")
+
+    if bot.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # 1. Spool every document (archives are extracted member by member)
+    spool_paths = []
+    skipped = []
+    taken = set()  # filenames used so far: each file needs its own source name
     try:
-        # Download the text from Cloudinary
-        # Note: This works for .txt/.md files directly. 
-        # For PDFs, you'll need a PDF parser (PyPDF2) here. 
-        # Assuming Text for now as per "manual entry" discussion.
-        response = requests.get(asset.cloudinary_url)
-        response.raise_for_status()
-        
-        file_content = ""
-        
-        # PDF Handling 
-        if asset.filename.endswith(".pdf"):
-             import fitz
-             
-             with fitz.open(stream=response.content, filetype="pdf") as doc:
-                 for page in doc:
-                     file_content += page.get_text()
-        else:
-             # Regular Text
-             file_content = response.text
-
-        # Inject into RAG
-        if not file_content.strip():
-            logger.warning(f"File {asset.filename} seems empty or unreadable.")
-        else:
-            rag_pipeline.add_document_to_knowledge_base(bot_id, file_content, asset.filename)
-        
-    except Exception as e:
-        logger.error(f"Training Failed: {e}")
-        # We don't fail the request because the file IS saved. 
-        # We just return a warning status.
-        return {
-            "status": "partial_success", 
-            "message": "File saved, but training failed. Please retry.",
-            "error": str(e)
-        }
+        for file in files:
+            name = file.filename or ""
+            if name.lower().endswith(".zip"):
+                spool_paths.extend(
+                    upload_pipeline.spool_archive(file, ingestion_engine.SUPPORTED_EXTENSIONS, taken)
+                )
+            elif name.lower().endswith(ingestion_engine.SUPPORTED_EXTENSIONS):
+                spool_paths.append(upload_pipeline.spool_upload(file, taken))
+            else:
+                skipped.append(name)
+            
+            if len(spool_paths) > upload_pipeline.BULK_MAX_FILES:
+                raise ValueError("Too many files in one bulk upload")
+    except ValueError as e:
+        for path in spool_paths:
+            upload_pipeline.cleanup_spool(path)
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not spool_paths:
+        raise HTTPException(status_code=400, detail="No supported documents found")
+    
+    # 2. Register assets
+    uploads = []
+    for path in spool_paths:
+        asset, needs_upload = asset_manager.register_asset(
+            db, bot_id, os.path.basename(path), os.path.getsize(path)
+        )
+        if not asset:
+            upload_pipeline.cleanup_spool(path)
+            skipped.append(os.path.basename(path))
+            continue
+        uploads.append({"spool_path": path, "asset_id": asset.id, "needs_upload": needs_upload})
+    
+    # 3. One batched ingestion job for all of them
+    job = ingestion_engine.create_job(bot_id, len(uploads))
+    background_tasks.add_task(upload_pipeline.process_bulk_upload, job, uploads)
+
+    return {
+        "status": "processing",
+        "job_id": job.job_id,
+        "files": len(uploads),
+        "skipped": skipped,
+        "message": f"{len(uploads)} files queued for training."
+    }
+
+
+@router.get("/{bot_id}/knowledge-base/jobs/{job_id}")
+def get_ingestion_job(
+    bot_id: str, 
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Aggregated progress of a bulk ingestion job"""
+    bot = db.query(models.Bot).filter(models.Bot.public_id == bot_id).first()
+    if not bot: raise HTTPException(404, "Bot Not Found")
 
-    return {"status": "success", "filename": asset.filename, "message": "Bot trained successfully."}
+    if bot.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    job = ingestion_engine.get_job(job_id)
+    if not job or job.bot_id != bot_id:
+        raise HTTPException(404, "Job Not Found")
+    
+    return job.to_dict()
+
+
+@router.get("/{bot_id}/knowledge-base/index-profile")
+def get_index_profile(
+    bot_id: str, 
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Configured and effective vector index parameters"""
+    bot = db.query(models.Bot).filter(models.Bot.public_id == bot_id).first()
+    if not bot: raise HTTPException(404, "Bot Not Found")
+
+    if bot.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    collection = vector_store.get_vector_store(bot_id)._collection
+    chunks = collection.count()
+    
+    return {
+        "profile": bot.index_profile or index_profiles.AUTO,
+        "params": index_profiles.parse_params(bot.index_params),
+        "effective": index_tuning.effective_profile(bot, chunks).to_dict(),
+        "current": {
+            "metadata": collection.metadata,
+            "ef_search": index_tuning.current_search_ef(collection),
+        },
+        "chunks": chunks,
+        "available": {name: p.to_dict() for name, p in index_profiles.PROFILES.items()},
+    }
+
+
+@router.put("/{bot_id}/knowledge-base/index-profile")
+def update_index_profile(
+    bot_id: str, 
+    update: schemas.IndexProfileUpdate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Pin a profile ("auto" = by size) and/or override parameters.
+    ef_search applies in place; a new M / ef_construction rebuilds the index in the background.
+    """
+    bot = db.query(models.Bot).filter(models.Bot.public_id == bot_id).first()
+    if not bot: raise HTTPException(404, "Bot Not Found")
+
+    if bot.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if update.profile != index_profiles.AUTO and update.profile not in index_profiles.PROFILES:
+        raise HTTPException(400, f"Unknown profile. Use auto or one of {list(index_profiles.PROFILES)}")
+    
+    params = {k: v for k, v in update.model_dump().items() if k in index_profiles.TUNABLE_PARAMS and v}
+    if any(v < 2 or v > 2048 for v in params.values()):
+        raise HTTPException(400, "Index parameters must be between 2 and 2048")
+    
+    bot.index_profile = update.profile
+    bot.index_params = json.dumps(params) if params else None
+    db.commit()
+    
+    profile = index_tuning.effective_profile(bot)
+    background_tasks.add_task(index_tuning.apply_profile, bot_id, profile)
+    
+    return {"status": "applying", "effective": profile.to_dict()}
 
 
 @router.get("/{bot_id}/knowledge-base")
@@ -89,8 +226,8 @@ def list_knowledge(
     # 1. Get DB Assets (Files)
     db_files = asset_manager.list_assets(db, bot_id)
     
-    # 2. Get Chroma Sources (Web Types)
-    chroma_sources = data_ingestion.list_bot_files(bot_id)
+    # 2. Get Web Sources (indexed manifest query)
+    chroma_sources = data_ingestion.list_bot_files(bot_id, source_type="web")
     
     final_list = list(db_files)
     
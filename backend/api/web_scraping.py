@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import json
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, HttpUrl
-from typing import Literal
+from typing import Literal, Optional
 from db.database import get_db
 from db import models, crud
 from services.web_scraping_service import WebScrapingService
+from services import crawl_jobs, crawl_scheduler
 from api.deps import get_current_user
 
 router = APIRouter(prefix="/api/v1/bots", tags=["Web Scraping"])
@@ -20,6 +22,8 @@ class WebsiteScrapeRequest(BaseModel):
     method: Literal["sitemap", "crawl", "single"] = "sitemap"
     max_pages: int = 50
     max_depth: int = 2
+    force: bool = False  # re-scrape unchanged pages too
+    refresh_interval_hours: Optional[int] = None  # keep the site current (incremental recrawl)
 
 # ============================================================================
 # HELPER: Get Bot ID with Auth
@@ -32,6 +36,27 @@ def get_bot_id_with_auth(public_id: str, db: Session, current_user: models.User)
         raise HTTPException(status_code=403, detail="Not authorized")
     return bot.id
 
+def get_job_with_auth(public_id: str, job_id: str, db: Session, current_user: models.User) -> models.CrawlJob:
+    get_bot_id_with_auth(public_id, db, current_user)
+    job = crud.get_crawl_job(db, public_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Crawl job not found")
+    return job
+
+def schedule_if_requested(public_id: str, request: WebsiteScrapeRequest, db: Session):
+    if not request.refresh_interval_hours:
+        return None
+    schedule = crawl_scheduler.schedule_refresh(
+        db,
+        public_id,
+        str(request.start_url),
+        request.method,
+        request.max_pages,
+        request.max_depth,
+        request.refresh_interval_hours
+    )
+    return {"id": schedule.id, "interval_hours": schedule.interval_hours, "next_run_at": schedule.next_run_at}
+
 # ============================================================================
 # ENDPOINTS
 # ============================================================================
@@ -77,43 +102,167 @@ def scrape_website(
         method=request.method,
         db=db,
         max_pages=request.max_pages,
-        max_depth=request.max_depth
+        max_depth=request.max_depth,
+        force=request.force
     )
     
     if not result['success']:
         raise HTTPException(status_code=400, detail=result.get('error', 'Scraping failed'))
     
+    result['schedule'] = schedule_if_requested(public_id, request, db)
     return result
 
 @router.post("/{public_id}/scrape/website/async")
 def scrape_website_async(
     public_id: str,
     request: WebsiteScrapeRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
-    Scrape website in background (for large sites)
+    Scrape website in background (for large sites) as a resumable crawl job
     """
     bot_id = get_bot_id_with_auth(public_id, db, current_user)
     
-    background_tasks.add_task(
-        WebScrapingService.scrape_website,
-        bot_id=bot_id,
-        start_url=str(request.start_url),
-        method=request.method,
-        db=db,
-        max_pages=request.max_pages,
-        max_depth=request.max_depth
+    job = crud.create_crawl_job(
+        db,
+        public_id,
+        str(request.start_url),
+        request.method,
+        request.max_pages,
+        request.max_depth,
+        force=request.force
     )
+    crawl_jobs.submit(job.id)
     
     return {
         "success": True,
         "message": "Scraping started in background",
-        "bot_id": bot_id
+        "bot_id": bot_id,
+        "job_id": job.id,
+        "status": job.status,
+        "schedule": schedule_if_requested(public_id, request, db)
+    }
+
+@router.get("/{public_id}/scrape/jobs")
+def list_scrape_jobs(
+    public_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Recent background crawl jobs of this bot
+    """
+    get_bot_id_with_auth(public_id, db, current_user)
+    
+    return [crawl_jobs.progress(db, job) for job in crud.list_crawl_jobs(db, public_id)]
+
+@router.get("/{public_id}/scrape/jobs/{job_id}")
+def get_scrape_job(
+    public_id: str,
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Progress of a background crawl job
+    """
+    job = get_job_with_auth(public_id, job_id, db, current_user)
+    return crawl_jobs.progress(db, job)
+
+@router.post("/{public_id}/scrape/jobs/{job_id}/{action}")
+def control_scrape_job(
+    public_id: str,
+    job_id: str,
+    action: Literal["pause", "resume", "cancel"],
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Pause, resume or cancel a background crawl job. A running job stops at
+    its next checkpoint, after the pages in flight are finished.
+    """
+    job = get_job_with_auth(public_id, job_id, db, current_user)
+    
+    control = {"pause": crawl_jobs.pause, "resume": crawl_jobs.resume, "cancel": crawl_jobs.cancel}[action]
+    try:
+        job = control(db, job)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return crawl_jobs.progress(db, job)
+
+@router.get("/{public_id}/scrape/schedules")
+def list_scrape_schedules(
+    public_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Scheduled incremental refreshes of this bot's scraped sites
+    """
+    get_bot_id_with_auth(public_id, db, current_user)
+    
+    return [
+        {
+            "id": s.id,
+            "start_url": s.start_url,
+            "method": s.method,
+            "max_pages": s.max_pages,
+            "max_depth": s.max_depth,
+            "interval_hours": s.interval_hours,
+            "enabled": s.enabled,
+            "last_run_at": s.last_run_at,
+            "next_run_at": s.next_run_at,
+            "last_result": json.loads(s.last_result) if s.last_result else None
+        }
+        for s in crud.list_crawl_schedules(db, public_id)
+    ]
+
+@router.get("/{public_id}/scrape/duplicates")
+def get_duplicate_report(
+    public_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Scraped pages that were not ingested because they nearly duplicate another page
+    """
+    get_bot_id_with_auth(public_id, db, current_user)
+    
+    groups = {}
+    for page in crud.get_duplicate_pages(db, public_id):
+        groups.setdefault(page.duplicate_of, []).append({
+            "url": page.url,
+            "last_crawled_at": page.last_crawled_at
+        })
+    
+    return {
+        "bot_id": public_id,
+        "duplicate_pages": sum(len(copies) for copies in groups.values()),
+        "groups": [
+            {"canonical_url": canonical, "duplicates": copies}
+            for canonical, copies in groups.items()
+        ]
     }
 
+@router.delete("/{public_id}/scrape/schedules/{schedule_id}")
+def delete_scrape_schedule(
+    public_id: str,
+    schedule_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Stop refreshing a site (its knowledge stays)
+    """
+    get_bot_id_with_auth(public_id, db, current_user)
+    
+    if not crud.delete_crawl_schedule(db, public_id, schedule_id):
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    
+    return {"success": True}
+
 @router.get("/{public_id}/scrape/preview")
 def preview_website_scraping(
     public_id: str,
@@ -128,6 +277,10 @@ def preview_website_scraping(
     get_bot_id_with_auth(public_id, db, current_user)
     
     from services.web_scraping_service import RequestsHelper, ContentExtractor
+    from services import robots
+    
+    if not robots.allowed(url):
+        raise HTTPException(status_code=400, detail="URL is disallowed by the site's robots.txt")
     
     session = RequestsHelper.get_session()
     html = RequestsHelper.fetch_url(url, session)
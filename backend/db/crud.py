@@ -1,4 +1,5 @@
 import uuid 
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from . import models, schemas
 
@@ -58,6 +59,7 @@ def delete_bot(db: Session, public_id: str):
     if db_bot:
         db.delete(db_bot)
         db.commit()
+        delete_bot_sources(db, public_id)
         return True
     return False
 
@@ -78,4 +80,313 @@ def get_widget_config(db: Session, public_id: str):
     if not db_bot:
         return None
     
-    return db_bot.widget_config
\ No newline at end of file
+    return db_bot.widget_config
+
+# ===== KNOWLEDGE SOURCE MANIFEST =====
+
+def _get_source(db: Session, bot_public_id: str, source: str):
+    return db.query(models.KnowledgeSource).filter(
+        models.KnowledgeSource.bot_public_id == bot_public_id,
+        models.KnowledgeSource.source == source
+    ).first()
+
+def get_source_chunk_ids(db: Session, bot_public_id: str, source: str):
+    """Vector IDs recorded for a source (empty if unknown)"""
+    row = _get_source(db, bot_public_id, source)
+    if not row:
+        return []
+    return [cid for (cid,) in db.query(models.KnowledgeChunk.chunk_id)
+            .filter(models.KnowledgeChunk.source_id == row.id)]
+
+def record_source(
+    db: Session,
+    bot_public_id: str,
+    source: str,
+    source_type: str,
+    chunk_ids,
+    url: str = None,
+    title: str = None,
+    scraped_at: str = None
+):
+    """
+    Record the chunks a source now has (created on first ingest, replaced on re-ingest).
+    
+    Returns:
+        list: Chunk IDs the source had before but no longer produces (to delete from the collection)
+    """
+    row = _get_source(db, bot_public_id, source)
+    previous = set()
+    
+    if not row:
+        row = models.KnowledgeSource(
+            bot_public_id=bot_public_id,
+            source=source,
+            source_type=source_type
+        )
+        db.add(row)
+        db.flush()
+    else:
+        previous = set(get_source_chunk_ids(db, bot_public_id, source))
+        db.query(models.KnowledgeChunk)\
+            .filter(models.KnowledgeChunk.source_id == row.id)\
+            .delete(synchronize_session=False)
+    
+    chunk_ids = list(dict.fromkeys(chunk_ids))
+    db.bulk_insert_mappings(
+        models.KnowledgeChunk,
+        [{"source_id": row.id, "chunk_id": cid} for cid in chunk_ids]
+    )
+    
+    row.chunk_count = len(chunk_ids)
+    row.source_type = source_type
+    if url:
+        row.url = url
+    if title:
+        row.title = title
+    if scraped_at:
+        row.scraped_at = scraped_at
+    
+    db.commit()
+    return list(previous.difference(chunk_ids))
+
+def delete_source(db: Session, bot_public_id: str, source: str):
+    """Remove a source (and its chunk IDs) from the manifest"""
+    row = _get_source(db, bot_public_id, source)
+    if not row:
+        return False
+    db.query(models.KnowledgeChunk)\
+        .filter(models.KnowledgeChunk.source_id == row.id)\
+        .delete(synchronize_session=False)
+    db.delete(row)
+    db.commit()
+    return True
+
+def list_sources(db: Session, bot_public_id: str, source_type: str = None):
+    query = db.query(models.KnowledgeSource)\
+        .filter(models.KnowledgeSource.bot_public_id == bot_public_id)
+    if source_type:
+        query = query.filter(models.KnowledgeSource.source_type == source_type)
+    return query.order_by(models.KnowledgeSource.created_at).all()
+
+def delete_bot_sources(db: Session, bot_public_id: str):
+    """Drop every manifest row (and chunk ID) for a bot"""
+    source_ids = select(models.KnowledgeSource.id)\
+        .where(models.KnowledgeSource.bot_public_id == bot_public_id)
+    db.query(models.KnowledgeChunk)\
+        .filter(models.KnowledgeChunk.source_id.in_(source_ids))\
+        .delete(synchronize_session=False)
+    deleted = db.query(models.KnowledgeSource)\
+        .filter(models.KnowledgeSource.bot_public_id == bot_public_id)\
+        .delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def get_source_stats(db: Session, bot_public_id: str):
+    """Chunk totals per source type, computed in SQL"""
+    rows = db.query(
+        models.KnowledgeSource.source_type,
+        func.count(models.KnowledgeSource.id),
+        func.coalesce(func.sum(models.KnowledgeSource.chunk_count), 0)
+    )\
+        .filter(models.KnowledgeSource.bot_public_id == bot_public_id)\
+        .group_by(models.KnowledgeSource.source_type)\
+        .all()
+    
+    return {source_type: {"sources": count, "chunks": int(chunks)} for source_type, count, chunks in rows}
+
+# ===== CRAWL STATE =====
+
+def get_crawl_states(db: Session, bot_public_id: str):
+    return db.query(models.CrawlPageState)\
+        .filter(models.CrawlPageState.bot_public_id == bot_public_id)\
+        .all()
+
+def get_duplicate_pages(db: Session, bot_public_id: str):
+    """Scraped pages left out as near-duplicates of another page"""
+    return db.query(models.CrawlPageState).filter(
+        models.CrawlPageState.bot_public_id == bot_public_id,
+        models.CrawlPageState.duplicate_of.isnot(None)
+    ).order_by(models.CrawlPageState.duplicate_of, models.CrawlPageState.url).all()
+
+def forget_crawled_source(db: Session, bot_public_id: str, source: str):
+    """
+    Clear what the crawl state knows about a deleted source's pages (hash,
+    validators), so the next crawl fetches and ingests them again
+    """
+    updated = db.query(models.CrawlPageState).filter(
+        models.CrawlPageState.bot_public_id == bot_public_id,
+        models.CrawlPageState.source == source
+    ).update({
+        models.CrawlPageState.source: None,
+        models.CrawlPageState.content_hash: None,
+        models.CrawlPageState.etag: None,
+        models.CrawlPageState.last_modified: None,
+        models.CrawlPageState.simhash: None,
+    }, synchronize_session=False)
+    db.commit()
+    return updated
+
+def delete_crawl_state(db: Session, bot_public_id: str):
+    """Drop a bot's crawl state, refresh schedules and crawl jobs"""
+    deleted = db.query(models.CrawlPageState)\
+        .filter(models.CrawlPageState.bot_public_id == bot_public_id)\
+        .delete(synchronize_session=False)
+    db.query(models.CrawlSchedule)\
+        .filter(models.CrawlSchedule.bot_public_id == bot_public_id)\
+        .delete(synchronize_session=False)
+    job_ids = [job_id for (job_id,) in db.query(models.CrawlJob.id).filter(models.CrawlJob.bot_public_id == bot_public_id)]
+    if job_ids:
+        db.query(models.CrawlFrontierEntry)\
+            .filter(models.CrawlFrontierEntry.job_id.in_(job_ids))\
+            .delete(synchronize_session=False)
+        db.query(models.CrawlJob)\
+            .filter(models.CrawlJob.id.in_(job_ids))\
+            .delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def get_crawl_schedule(db: Session, bot_public_id: str, start_url: str):
+    return db.query(models.CrawlSchedule).filter(
+        models.CrawlSchedule.bot_public_id == bot_public_id,
+        models.CrawlSchedule.start_url == start_url
+    ).first()
+
+def list_crawl_schedules(db: Session, bot_public_id: str):
+    return db.query(models.CrawlSchedule)\
+        .filter(models.CrawlSchedule.bot_public_id == bot_public_id)\
+        .order_by(models.CrawlSchedule.created_at)\
+        .all()
+
+def upsert_crawl_schedule(
+    db: Session,
+    bot_public_id: str,
+    start_url: str,
+    method: str,
+    max_pages: int,
+    max_depth: int,
+    interval_hours: int,
+    next_run_at
+):
+    """Create or update the refresh schedule of a site (one per bot and start URL)"""
+    row = get_crawl_schedule(db, bot_public_id, start_url)
+    if not row:
+        row = models.CrawlSchedule(bot_public_id=bot_public_id, start_url=start_url)
+        db.add(row)
+    
+    row.method = method
+    row.max_pages = max_pages
+    row.max_depth = max_depth
+    row.interval_hours = interval_hours
+    row.enabled = True
+    row.next_run_at = next_run_at
+    db.commit()
+    db.refresh(row)
+    return row
+
+def delete_crawl_schedule(db: Session, bot_public_id: str, schedule_id: int):
+    deleted = db.query(models.CrawlSchedule).filter(
+        models.CrawlSchedule.bot_public_id == bot_public_id,
+        models.CrawlSchedule.id == schedule_id
+    ).delete(synchronize_session=False)
+    db.commit()
+    return bool(deleted)
+
+def get_due_crawl_schedules(db: Session, now):
+    return db.query(models.CrawlSchedule).filter(
+        models.CrawlSchedule.enabled == True,  # noqa: E712
+        models.CrawlSchedule.next_run_at <= now
+    ).order_by(models.CrawlSchedule.next_run_at).all()
+
+# ===== CRAWL JOBS =====
+
+def create_crawl_job(
+    db: Session,
+    bot_public_id: str,
+    start_url: str,
+    method: str,
+    max_pages: int,
+    max_depth: int,
+    force: bool = False
+):
+    job = models.CrawlJob(
+        id=str(uuid.uuid4()),
+        bot_public_id=bot_public_id,
+        start_url=start_url,
+        method=method,
+        max_pages=max_pages,
+        max_depth=max_depth,
+        force=force,
+        status="queued"
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_crawl_job(db: Session, bot_public_id: str, job_id: str):
+    return db.query(models.CrawlJob).filter(
+        models.CrawlJob.bot_public_id == bot_public_id,
+        models.CrawlJob.id == job_id
+    ).first()
+
+def list_crawl_jobs(db: Session, bot_public_id: str, limit: int = 20):
+    return db.query(models.CrawlJob)\
+        .filter(models.CrawlJob.bot_public_id == bot_public_id)\
+        .order_by(models.CrawlJob.created_at.desc())\
+        .limit(limit)\
+        .all()
+
+def claim_crawl_job(db: Session, job_id: str, worker_id: str, now, stale_before) -> bool:
+    """
+    Atomically take a job that is queued, or running on a worker that stopped
+    sending heartbeats. At most one worker wins (single UPDATE ... WHERE).
+    """
+    claimable = (models.CrawlJob.status == "queued") | (
+        (models.CrawlJob.status == "running") & (models.CrawlJob.heartbeat_at < stale_before)
+    )
+    claimed = db.query(models.CrawlJob)\
+        .filter(models.CrawlJob.id == job_id, claimable)\
+        .update(
+            {"status": "running", "worker_id": worker_id, "heartbeat_at": now, "stop_requested": None},
+            synchronize_session=False
+        )
+    db.commit()
+    return bool(claimed)
+
+def transition_crawl_job(db: Session, job_id: str, from_statuses, values) -> bool:
+    """Update a job only if it is (still) in one of from_statuses"""
+    updated = db.query(models.CrawlJob)\
+        .filter(models.CrawlJob.id == job_id, models.CrawlJob.status.in_(from_statuses))\
+        .update(values, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+def get_claimable_crawl_jobs(db: Session, stale_before, limit: int):
+    return [
+        job_id for (job_id,) in db.query(models.CrawlJob.id).filter(
+            (models.CrawlJob.status == "queued") | (
+                (models.CrawlJob.status == "running") & (models.CrawlJob.heartbeat_at < stale_before)
+            )
+        ).order_by(models.CrawlJob.created_at).limit(limit)
+    ]
+
+def get_crawl_frontier(db: Session, job_id: str):
+    return db.query(models.CrawlFrontierEntry)\
+        .filter(models.CrawlFrontierEntry.job_id == job_id)\
+        .order_by(models.CrawlFrontierEntry.id)\
+        .all()
+
+def count_crawl_frontier(db: Session, job_id: str):
+    """{state: number of URLs} of a job's frontier"""
+    rows = db.query(models.CrawlFrontierEntry.state, func.count(models.CrawlFrontierEntry.id))\
+        .filter(models.CrawlFrontierEntry.job_id == job_id)\
+        .group_by(models.CrawlFrontierEntry.state)\
+        .all()
+    return {state: count for state, count in rows}
+
+def delete_crawl_frontier(db: Session, job_id: str):
+    deleted = db.query(models.CrawlFrontierEntry)\
+        .filter(models.CrawlFrontierEntry.job_id == job_id)\
+        .delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, Boolean, UniqueConstraint
 from sqlalchemy.sql import func
 from db.database import Base  
 from sqlalchemy.orm import relationship
@@ -48,6 +48,10 @@ class Bot(Base):
     # Analytics Counter
     total_queries = Column(Integer, default=0)
     
+    # Vector index profile: "auto" (by collection size), small, medium, large
+    index_profile = Column(String, default="auto")
+    index_params = Column(Text, nullable=True)  # JSON overrides: m, ef_construction, ef_search
+    
     assets = relationship("Asset", back_populates="bot", cascade="all, delete-orphan")
     audit_logs = relationship("BotAuditLog", back_populates="bot", cascade="all, delete-orphan")
     
@@ -85,4 +89,155 @@ class BotAuditLog(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     bot = relationship("Bot", back_populates="audit_logs")
-    
\ No newline at end of file
+
+
+class KnowledgeSource(Base):
+    """
+    Manifest of what is stored in a bot's vector collection.
+    Maintained at ingest/delete time so listing sources never scans chunks.
+    """
+    __tablename__ = "knowledge_sources"
+    __table_args__ = (
+        UniqueConstraint("bot_public_id", "source", name="uq_knowledge_source"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # Collections are keyed by public_id (collection_{public_id})
+    bot_public_id = Column(String, index=True, nullable=False)
+    
+    source = Column(String, nullable=False)
+    source_type = Column(String, default="file", index=True)  # file, web, manual
+    url = Column(String, nullable=True)
+    title = Column(String, nullable=True)
+    scraped_at = Column(String, nullable=True)
+    chunk_count = Column(Integer, default=0)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    chunks = relationship("KnowledgeChunk", back_populates="source_entry", cascade="all, delete-orphan")
+
+
+class KnowledgeChunk(Base):
+    """Vector IDs stored for a source, so it can be replaced / deleted by ID"""
+    __tablename__ = "knowledge_chunks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source_id = Column(Integer, ForeignKey("knowledge_sources.id", ondelete="CASCADE"), index=True, nullable=False)
+    chunk_id = Column(String, nullable=False)
+    
+    source_entry = relationship("KnowledgeSource", back_populates="chunks")
+
+
+class ConversationSession(Base):
+    """Persisted chat memory (used when CONVERSATION_STORE=database)"""
+    __tablename__ = "conversation_sessions"
+    __table_args__ = (
+        UniqueConstraint("bot_public_id", "session_id", name="uq_conversation_session"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bot_public_id = Column(String, index=True, nullable=False)
+    session_id = Column(String, nullable=False)
+    
+    summary = Column(Text, default="")
+    turns = Column(Text, default="[]")  # JSON list of {"role", "content"}
+    retrieval_query = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+
+
+class CrawlPageState(Base):
+    """
+    What the last crawl saw at a URL, so recrawls can send conditional GETs
+    and skip pages whose content did not change. The page's chunk IDs are
+    those of its knowledge source (KnowledgeSource.source == source).
+    """
+    __tablename__ = "crawl_page_states"
+    __table_args__ = (
+        UniqueConstraint("bot_public_id", "url", name="uq_crawl_page_state"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bot_public_id = Column(String, index=True, nullable=False)
+    url = Column(String, nullable=False)
+    source = Column(String, nullable=True)
+    
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True)  # sha256 of the extracted text
+    links = Column(Text, nullable=True)  # JSON list: lets a 304 page still expand the crawl
+    status = Column(Integer, nullable=True)
+    simhash = Column(String, nullable=True)  # 64-bit SimHash of the text, hex (services/dedup.py)
+    duplicate_of = Column(String, nullable=True)  # URL of the page this one nearly duplicates (not ingested)
+    
+    last_crawled_at = Column(DateTime(timezone=True), nullable=True)
+    last_changed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class CrawlSchedule(Base):
+    """Periodic incremental refresh of a scraped site"""
+    __tablename__ = "crawl_schedules"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bot_public_id = Column(String, index=True, nullable=False)
+    start_url = Column(String, nullable=False)
+    method = Column(String, default="sitemap")
+    max_pages = Column(Integer, default=50)
+    max_depth = Column(Integer, default=2)
+    interval_hours = Column(Integer, default=24)
+    enabled = Column(Boolean, default=True)
+    
+    last_run_at = Column(DateTime(timezone=True), nullable=True)
+    next_run_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    last_result = Column(Text, nullable=True)  # JSON summary of the last run
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class CrawlJob(Base):
+    """
+    A website scrape run in the background. Its frontier is persisted
+    (CrawlFrontierEntry), so the job survives restarts and can be paused,
+    resumed or picked up by another worker (services/crawl_jobs.py).
+    """
+    __tablename__ = "crawl_jobs"
+    
+    id = Column(String, primary_key=True, index=True)  # uuid
+    bot_public_id = Column(String, index=True, nullable=False)
+    start_url = Column(String, nullable=False)
+    method = Column(String, default="sitemap")
+    max_pages = Column(Integer, default=50)
+    max_depth = Column(Integer, default=2)
+    force = Column(Boolean, default=False)
+    
+    status = Column(String, default="queued", index=True)  # queued, running, paused, completed, cancelled, failed
+    stop_requested = Column(String, nullable=True)  # "pause" / "cancel", seen by the runner at its next checkpoint
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    
+    pages_ingested = Column(Integer, default=0)
+    pages_unchanged = Column(Integer, default=0)
+    pages_duplicates = Column(Integer, default=0)
+    pages_failed = Column(Integer, default=0)
+    result = Column(Text, nullable=True)  # JSON summary once finished
+    error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class CrawlFrontierEntry(Base):
+    """A URL a crawl job has queued (pending) or visited (fetched / done / failed)"""
+    __tablename__ = "crawl_frontier"
+    __table_args__ = (
+        UniqueConstraint("job_id", "url", name="uq_crawl_frontier_url"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)  # insertion order = BFS order
+    job_id = Column(String, index=True, nullable=False)
+    url = Column(String, nullable=False)
+    depth = Column(Integer, default=0)
+    state = Column(String, default="pending", index=True)
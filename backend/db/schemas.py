@@ -1,7 +1,7 @@
 import uuid 
 from pydantic import BaseModel, ConfigDict
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 class UserBase(BaseModel):
     email: str
@@ -71,10 +71,25 @@ class Bot(BotBase):
     model_config = ConfigDict(from_attributes=True)
                 
         
+class IndexProfileUpdate(BaseModel):
+    profile: str = "auto"  # auto, small, medium, large
+    m: Optional[int] = None
+    ef_construction: Optional[int] = None
+    ef_search: Optional[int] = None
+    
+        
 class ChatRequest(BaseModel):  
     bot_id: str
     message: str
+    session_id: Optional[str] = None  # enables conversation memory
+    
+class BatchChatRequest(BaseModel):
+    bot_id: str
+    questions: List[str]
+    concurrency: Optional[int] = None  # parallel LLM calls (capped server-side)
+    log_gaps: bool = False  # record knowledge gaps in the bot's analytics
     
 class ChatResponse(BaseModel): 
     response: str
-    sources: list = []
\ No newline at end of file
+    sources: list = []
+    session_id: Optional[str] = None
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+# Embedding threads are managed by services/embedding_engine.py (EMBEDDING_THREADS)
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 from fastapi import FastAPI
@@ -12,6 +13,8 @@ from db import models
 from db.database import engine
 
 from api import bot_routes, chat_routes, analytics, knowledge_routes, web_scraping
+from services import object_storage, garbage_collector, index_tuning, crawl_scheduler, crawl_jobs, crawler
+from services.ingestion_engine import get_engine
 
 if not os.path.exists('./data'):
     os.makedirs('./data')
@@ -38,15 +41,50 @@ app.add_middleware(
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Local object storage stand-in serves uploaded files itself
+if object_storage.OBJECT_STORAGE_BACKEND == "local":
+    os.makedirs(object_storage.LOCAL_STORAGE_PATH, exist_ok=True)
+    app.mount(
+        object_storage.LOCAL_STORAGE_URL_PREFIX,
+        StaticFiles(directory=object_storage.LOCAL_STORAGE_PATH),
+        name="storage"
+    )
+
 app.include_router(bot_routes.router)
 app.include_router(chat_routes.router)
 app.include_router(analytics.router)
 app.include_router(knowledge_routes.router)
 app.include_router(web_scraping.router)
 
+@app.on_event("startup")
+def start_background_workers():
+    # Reaps collections / stored files of deleted bots (GC_INTERVAL_SECONDS=0 disables)
+    garbage_collector.start_reaper()
+    # Moves "auto" index profiles along as collections grow (INDEX_RETUNE_INTERVAL_SECONDS=0 disables)
+    index_tuning.start_autotuner()
+    # Incremental refresh of scheduled website scrapes (CRAWL_REFRESH_POLL_SECONDS=0 disables)
+    crawl_scheduler.start_refresher()
+    # Runs background crawl jobs, including ones interrupted by a restart (CRAWL_JOB_POLL_SECONDS=0 disables)
+    crawl_jobs.start_job_worker()
+
 @app.get("/api/v1/health")
 def get_health():
     return {"status": "ok", "service": "backend"}
 
+@app.get("/api/v1/health/ingestion")
+def get_ingestion_stats():
+    """Throughput counters of the shared ingestion engine"""
+    return get_engine().stats.snapshot()
+
+@app.get("/api/v1/health/scraping")
+def get_scraping_stats():
+    """Downloads the scraper aborted (too large / not a page) and bytes it never transferred"""
+    return crawler.download_stats.snapshot()
+
+@app.get("/api/v1/health/gc")
+def get_gc_report():
+    """Result of the last garbage-collection pass"""
+    return garbage_collector.last_report() or {"status": "no pass yet"}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
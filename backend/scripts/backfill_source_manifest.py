@@ -0,0 +1,62 @@
+"""
+Build the knowledge_sources manifest for collections ingested before it existed.
+
+list_bot_files / get_collection_stats backfill lazily on first use; run this
+once after deploying to do every bot up front instead of on the first
+dashboard load.
+
+Usage (from backend/):
+    python scripts/backfill_source_manifest.py
+    python scripts/backfill_source_manifest.py --bot <public_id> --force
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import crud, models
+from db.database import SessionLocal, engine
+from services.data_ingestion import backfill_source_manifest
+
+
+def main(bot_ids, force: bool):
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+
+    print("=" * 70)
+    print("SOURCE MANIFEST BACKFILL")
+    print("=" * 70)
+
+    try:
+        if not bot_ids:
+            bot_ids = [bot.public_id for bot in db.query(models.Bot).all()]
+
+        done, skipped = 0, 0
+        for bot_id in bot_ids:
+            if crud.list_sources(db, bot_id) and not force:
+                print(f"⏭️  {bot_id}: manifest already present")
+                skipped += 1
+                continue
+
+            try:
+                backfill_source_manifest(bot_id, db)
+                done += 1
+            except Exception as e:
+                db.rollback()
+                print(f"❌ {bot_id}: {e}")
+
+        print("=" * 70)
+        print(f"Backfilled {done} bots, skipped {skipped}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the knowledge source manifest")
+    parser.add_argument("--bot", nargs="*", default=[], help="Bot public_ids (default: all bots)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if rows exist")
+    args = parser.parse_args()
+
+    main(args.bot, args.force)
@@ -0,0 +1,120 @@
+"""
+Chunker benchmark.
+
+Splits a large synthetic document (headings, paragraphs, tables, lists)
+with the previous RecursiveCharacterTextSplitter(1200, 250) and with the
+StructuralChunker, and reports throughput, chunk sizes in model tokens,
+chunks over the encoder window, and ID stability across runs.
+
+Usage (from backend/):
+    python scripts/benchmark_chunker.py --mb 5
+    python scripts/benchmark_chunker.py --file path/to/large.md
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from services.chunker import StructuralChunker, default_token_offsets
+from services.document_loaders import load_document
+
+WORDS = (
+    "model training dataset accuracy results pipeline customer support pricing "
+    "refund policy shipping account invoice integration webhook token latency "
+    "retrieval embedding vector search document section table summary"
+).split()
+
+ENCODER_WINDOW = 512
+
+
+def make_document(megabytes: float, seed: int = 7) -> str:
+    """Markdown-like text: headings, paragraphs, pipe tables and bullet lists"""
+    rng = random.Random(seed)
+    parts, size, target = [], 0, int(megabytes * 1024 * 1024)
+
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize() + "."
+
+    while size < target:
+        block = rng.random()
+        if block < 0.08:
+            text = f"{'#' * rng.randint(1, 3)} {sentence()[:-1]}"
+        elif block < 0.2:
+            rows = [" | ".join(rng.choice(WORDS) for _ in range(5)) for _ in range(rng.randint(3, 30))]
+            text = "\n".join(rows)
+        elif block < 0.3:
+            text = "\n".join(f"- {sentence()}" for _ in range(rng.randint(2, 8)))
+        else:
+            text = " ".join(sentence() for _ in range(rng.randint(2, 14)))
+        parts.append(text)
+        size += len(text) + 2
+
+    return "\n\n".join(parts)
+
+
+def report(name, seconds, total_chars, token_counts):
+    over = sum(1 for t in token_counts if t > ENCODER_WINDOW)
+    print(
+        f"{name:<14} {seconds:7.2f}s  {total_chars / seconds / 1e6:6.2f} MB/s  "
+        f"{len(token_counts):7d} chunks  tokens mean {statistics.mean(token_counts):6.1f} "
+        f"max {max(token_counts):5d}  over {ENCODER_WINDOW}: {over}"
+    )
+
+
+def main(megabytes: float, file_path: str):
+    if file_path:
+        documents = list(load_document(file_path))
+    else:
+        documents = [Document(page_content=make_document(megabytes), metadata={})]
+    total_chars = sum(len(d.page_content) for d in documents)
+
+    token_offsets = default_token_offsets()
+
+    def count(text):
+        return len(token_offsets(text))
+
+    print("=" * 70)
+    print("CHUNKER BENCHMARK")
+    print("=" * 70)
+    print(f"Sections: {len(documents)}  Characters: {total_chars:,}")
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1200,
+        chunk_overlap=250,
+        add_start_index=True,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+    start = time.perf_counter()
+    legacy = splitter.split_documents(documents)
+    legacy_seconds = time.perf_counter() - start
+
+    chunker = StructuralChunker(token_offsets=token_offsets)
+    start = time.perf_counter()
+    structural = [c for i, d in enumerate(documents) for c in chunker.chunk(d, "benchmark", i)]
+    structural_seconds = time.perf_counter() - start
+
+    # Token counts are measured outside the timed sections
+    report("recursive", legacy_seconds, total_chars, [count(c.page_content) for c in legacy])
+    report("structural", structural_seconds, total_chars, [count(c.page_content) for c in structural])
+
+    rerun = [c.metadata["chunk_id"] for i, d in enumerate(documents) for c in chunker.chunk(d, "benchmark", i)]
+    ids = [c.metadata["chunk_id"] for c in structural]
+    print(f"\nStable IDs across runs: {'✅' if rerun == ids else '❌'}   unique: {'✅' if len(set(ids)) == len(ids) else '❌'}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the chunker against the character splitter")
+    parser.add_argument("--mb", type=float, default=5.0, help="Size of the synthetic document")
+    parser.add_argument("--file", default=None, help="Benchmark a real file instead")
+    args = parser.parse_args()
+
+    main(args.mb, args.file)
@@ -0,0 +1,207 @@
+"""
+Crawler benchmark (offline).
+
+Serves a generated site from a local fixture server (scripts/fixture_site.py)
+and runs the scraper's crawl modes against it the way scrape_website's fetch
+and extract stages do (WebCrawler + the extraction pool; no embedding):
+
+- crawl:   breadth-first link crawl from /docs/page-0
+- sitemap: robots.txt -> sitemap index -> gzipped sitemaps -> prefetch
+
+Each mode runs in a fresh process (clean caches, own peak RSS) and reports
+pages/sec, bytes fetched, duplicate fetches (crawler- and server-side),
+aborted downloads, coverage and peak memory of the crawler process (the
+extraction pool's workers are not included).
+
+Thresholds turn it into a regression check for CI: the script exits 1 if
+any is missed.
+
+Usage (from backend/):
+    python scripts/benchmark_crawler.py --pages 1000 --fanout 8
+    python scripts/benchmark_crawler.py --modes crawl --slow-every 10 --large-every 25
+    python scripts/benchmark_crawler.py --min-pages-per-second 50 --max-duplicate-fetches 0 --json crawl.json
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import resource
+import multiprocessing
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixture_site import FixtureSite, add_site_arguments, site_config
+
+MODES = ("crawl", "sitemap")
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_mode(mode: str, base_url: str, max_pages: int, max_depth: int, rate: float, results):
+    """Child process: one crawl against the fixture site"""
+    # Before the services are imported: token buckets read these at import time
+    os.environ["CRAWL_RATE_PER_HOST"] = str(rate)
+    os.environ["CRAWL_BURST"] = str(max(1, int(rate)))
+
+    from services import robots
+    from services.scrape_pipeline import get_extract_pool
+    from services.web_scraping_service import ScrapingConfig, WebCrawler, extract_page
+
+    # The API caps sitemap scrapes far below benchmark sizes
+    ScrapingConfig.MAX_URLS_PER_SITEMAP = max_pages
+
+    start_url = f"{base_url}/docs/page-0"
+    pool = get_extract_pool()
+    crawler = WebCrawler(start_url)
+    futures, prepared = [], []
+
+    def on_page(page):
+        if not page.ok:
+            return
+        analysis = crawler.take_analysis(page.url)
+        if analysis is None:
+            futures.append(pool.submit(extract_page, page.url, page.html))
+        else:
+            prepared.append(analysis["page"] is not None)
+
+    start = time.perf_counter()
+    robots.allowed(start_url)
+    if mode == "crawl":
+        crawler.crawl_recursive(start_url, max_depth=max_depth, max_pages=max_pages, on_page=on_page)
+    else:
+        crawler.prefetch(crawler.get_sitemap_urls(limit=max_pages), on_page)
+    extracted = sum(prepared) + sum(1 for future in futures if future.result())
+    seconds = time.perf_counter() - start
+
+    stats = crawler.stats
+    results.put({
+        "mode": mode,
+        "seconds": round(seconds, 2),
+        "pages": stats.pages,
+        "extracted": extracted,
+        "pages_per_second": round(stats.pages / seconds, 1) if seconds else 0.0,
+        "bytes": stats.bytes,
+        "errors": stats.errors,
+        "aborted": stats.aborted,
+        "bytes_saved": stats.bytes_saved,
+        "duplicate_fetches": stats.duplicate_fetches,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    })
+    crawler.close()
+
+
+def benchmark(site: FixtureSite, mode: str, max_pages: int, max_depth: int, rate: float, timeout: float):
+    site.reset_stats()
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_mode, args=(mode, site.base_url, max_pages, max_depth, rate, results))
+    process.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                result = results.get(timeout=1)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(f"{mode} run exited with code {process.exitcode}")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{mode} run timed out after {timeout:g}s")
+    finally:
+        process.join(timeout=30)
+        if process.is_alive():
+            process.kill()
+
+    expected = site.reachable(max_depth) if mode == "crawl" else site.config.pages
+    result.update({
+        "expected_pages": min(expected, max_pages),
+        "server_page_requests": site.page_hits,
+        "server_duplicate_requests": site.duplicate_hits,
+        "robots_violations": site.private_hits,
+    })
+    return result
+
+
+def check(result, args):
+    """Regression thresholds; returns the failures"""
+    failures = []
+    # Pages over the size cap are aborted on purpose: they still count as found
+    found = result["pages"] + result["aborted"]
+    if found < result["expected_pages"]:
+        failures.append(f"found {found} of {result['expected_pages']} pages")
+    if result["robots_violations"]:
+        failures.append(f"{result['robots_violations']} requests to robots.txt-disallowed paths")
+    duplicates = max(result["duplicate_fetches"], result["server_duplicate_requests"])
+    if args.max_duplicate_fetches is not None and duplicates > args.max_duplicate_fetches:
+        failures.append(f"{duplicates} duplicate fetches (max {args.max_duplicate_fetches})")
+    if args.min_pages_per_second and result["pages_per_second"] < args.min_pages_per_second:
+        failures.append(f"{result['pages_per_second']} pages/sec (min {args.min_pages_per_second})")
+    if args.max_peak_rss_mb and result["peak_rss_mb"] > args.max_peak_rss_mb:
+        failures.append(f"peak RSS {result['peak_rss_mb']} MB (max {args.max_peak_rss_mb})")
+    return failures
+
+
+def main(args) -> int:
+    site = FixtureSite(site_config(args))
+    site.start()
+
+    print("=" * 70)
+    print("CRAWLER BENCHMARK")
+    print("=" * 70)
+    print(f"Site: {args.pages} pages, fan-out {args.fanout}, {site.base_url}")
+    print(f"Max pages: {args.max_pages}  Max depth: {args.max_depth}  Rate: {args.rate:g} req/s")
+
+    results, failed = [], False
+    try:
+        for mode in args.modes:
+            print(f"\n▶ {mode}")
+            result = benchmark(site, mode, args.max_pages, args.max_depth, args.rate, args.timeout)
+            results.append(result)
+
+            print(f"   Pages:      {result['pages'] + result['aborted']}/{result['expected_pages']} ({result['extracted']} extracted, {result['errors']} errors)")
+            print(f"   Throughput: {result['pages_per_second']} pages/sec in {result['seconds']}s")
+            print(f"   Bytes:      {result['bytes'] / 1e6:.1f} MB fetched, {result['bytes_saved'] / 1e6:.1f} MB saved by {result['aborted']} aborted downloads")
+            print(f"   Duplicates: {result['duplicate_fetches']} (crawler), {result['server_duplicate_requests']} (server)")
+            print(f"   Peak RSS:   {result['peak_rss_mb']} MB")
+
+            failures = check(result, args)
+            for failure in failures:
+                print(f"   ❌ {failure}")
+            if not failures:
+                print("   ✅ OK")
+            result["failures"] = failures
+            failed = failed or bool(failures)
+    finally:
+        site.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    print("=" * 70)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the crawler against a local fixture site")
+    add_site_arguments(parser)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--max-pages", type=int, default=300, help="Pages per crawl")
+    parser.add_argument("--max-depth", type=int, default=5, help="Crawl depth (crawl mode)")
+    parser.add_argument("--rate", type=float, default=500, help="Per-host request rate (CRAWL_RATE_PER_HOST)")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds allowed per mode")
+    parser.add_argument("--min-pages-per-second", type=float, default=0, help="Fail below this throughput")
+    parser.add_argument("--max-duplicate-fetches", type=int, default=0, help="Fail above this many re-fetches")
+    parser.add_argument("--max-peak-rss-mb", type=float, default=0, help="Fail above this peak memory")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    sys.exit(main(args))
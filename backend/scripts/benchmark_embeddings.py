@@ -0,0 +1,101 @@
+"""
+Embedding throughput benchmark.
+
+Compares docs/sec of the previous path (HuggingFaceEmbeddings in fixed
+batches of 50) with every available EmbeddingEngine backend, and reports
+each backend's compatibility with the vectors in existing collections.
+
+Usage (from backend/):
+    python scripts/benchmark_embeddings.py --docs 500
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from services.embedding_engine import EMBEDDING_MODEL_NAME, EmbeddingEngine, check_compatibility
+
+WORDS = (
+    "model training dataset accuracy results pipeline customer support pricing "
+    "refund policy shipping account invoice integration webhook token latency "
+    "retrieval embedding vector search document section table summary"
+).split()
+
+LEGACY_BATCH_SIZE = 50
+
+
+def make_chunks(count: int, seed: int = 11):
+    """Realistic mix: short FAQ lines, medium paragraphs and full 1200-char chunks"""
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(count):
+        words = rng.choice([8, 40, 120, 200])
+        chunks.append(" ".join(rng.choice(WORDS) for _ in range(words)))
+    return chunks
+
+
+def time_it(fn, chunks):
+    start = time.perf_counter()
+    fn(chunks)
+    return time.perf_counter() - start
+
+
+def legacy_embed(embeddings):
+    def run(chunks):
+        for i in range(0, len(chunks), LEGACY_BATCH_SIZE):
+            embeddings.embed_documents(chunks[i:i + LEGACY_BATCH_SIZE])
+    return run
+
+
+def main(docs: int, backends):
+    chunks = make_chunks(docs)
+
+    print("=" * 70)
+    print("EMBEDDING ENGINE BENCHMARK")
+    print("=" * 70)
+    print(f"Chunks: {len(chunks)}")
+
+    reference = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    reference.embed_query("warmup")
+
+    baseline = time_it(legacy_embed(reference), chunks)
+    print(f"\n{'current (HF, batch 50)':<28} {len(chunks) / baseline:8.1f} docs/s   1.00x")
+
+    for backend in backends:
+        try:
+            engine = EmbeddingEngine(backend)
+        except Exception as e:
+            print(f"{backend:<28} skipped ({e})")
+            continue
+
+        engine.encode(["warmup"])
+        elapsed = time_it(engine.encode, chunks)
+        report = check_compatibility(engine, reference, chunks[:64])
+        padding = engine.stats["tokens"] / max(engine.stats["padded_tokens"], 1)
+
+        print(
+            f"{'engine/' + backend:<28} {len(chunks) / elapsed:8.1f} docs/s "
+            f"{baseline / elapsed:6.2f}x   min cosine {report['min_cosine']:.5f} "
+            f"{'✅' if report['compatible'] else '❌'}   token efficiency {padding:.0%}"
+        )
+
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    args = parser.parse_args()
+
+    main(args.docs, args.backends)
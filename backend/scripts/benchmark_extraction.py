@@ -0,0 +1,160 @@
+"""
+Extraction benchmark.
+
+Runs every saved page through the previous extraction path (BeautifulSoup
+for links, trafilatura.extract, trafilatura.extract_metadata, BeautifulSoup
+again as fallback: up to four parses) and through the single-parse path
+(analyze_page: one lxml tree for links, title/description and content),
+and reports pages/sec, MB/s and how often both paths agree.
+
+Pages are *.html / *.htm files; the URL used to resolve links is the file
+name relative to --base-url. Without --dir a synthetic docs corpus is used.
+
+Usage (from backend/):
+    python scripts/benchmark_extraction.py --dir path/to/saved_pages
+    python scripts/benchmark_extraction.py --pages 300 --repeat 3
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+from urllib.parse import urljoin
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import trafilatura
+from bs4 import BeautifulSoup
+from trafilatura.meta import reset_caches
+
+from services.web_scraping_service import URLValidator, analyze_page
+
+WORDS = (
+    "install configure deploy cluster token webhook request response latency "
+    "retry timeout schema migration index query vector embedding document section"
+).split()
+
+
+def make_pages(count: int, seed: int = 7):
+    """Docs-like pages: nav, sidebar, article with headings/paragraphs/code, footer"""
+    rng = random.Random(seed)
+
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24))).capitalize() + "."
+
+    pages = []
+    for i in range(count):
+        nav = "".join(f'<li><a href="/docs/page-{rng.randrange(count)}">{rng.choice(WORDS)}</a></li>' for _ in range(40))
+        body = "".join(
+            f"<h2>{sentence()[:-1]}</h2><p>{' '.join(sentence() for _ in range(rng.randint(3, 9)))}</p>"
+            f"<pre><code>{rng.choice(WORDS)} --{rng.choice(WORDS)}={rng.randint(1, 99)}</code></pre>"
+            for _ in range(rng.randint(4, 12))
+        )
+        html = (
+            f"<!DOCTYPE html><html><head><title>Page {i}</title>"
+            f'<meta name="description" content="{sentence()}"><script>var x = {i};</script></head>'
+            f"<body><header><nav><ul>{nav}</ul></nav></header>"
+            f'<main><article><h1>Page {i}</h1>{body}<a href="../page-{(i + 1) % count}">Next</a></article></main>'
+            f"<footer>{sentence()}</footer></body></html>"
+        )
+        pages.append((f"https://docs.example.com/docs/page-{i}", html))
+    return pages
+
+
+def load_pages(directory: str, base_url: str):
+    pages = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith((".html", ".htm")):
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    relative = os.path.relpath(path, directory).replace(os.sep, "/")
+                    pages.append((urljoin(base_url, relative), f.read()))
+    return pages
+
+
+def legacy_extract(url: str, html: str):
+    """The previous path: separate parses for links, text, metadata and fallback"""
+    soup = BeautifulSoup(html, "lxml")
+    links = {URLValidator.normalize_url(urljoin(url, a["href"])) for a in soup.find_all("a", href=True)}
+
+    content = trafilatura.extract(
+        html, include_links=False, include_images=False, include_tables=True,
+        favor_precision=True, deduplicate=True
+    )
+    if content and len(content.strip()) >= 100:
+        metadata = trafilatura.extract_metadata(html)
+        return links, {"content": content.strip(), "title": metadata.title if metadata else "Untitled"}
+
+    soup = BeautifulSoup(html, "lxml")
+    for element in soup(["script", "style", "nav", "footer", "header"]):
+        element.decompose()
+    main = soup.select_one("article") or soup.select_one("main") or soup.find("body")
+    text = re.sub(r"\s+", " ", main.get_text(separator=" ", strip=True)).strip() if main else ""
+    return links, ({"content": text, "title": ""} if len(text) >= 100 else None)
+
+
+def single_parse_extract(url: str, html: str):
+    analysis = analyze_page(url, html)
+    return set(analysis["links"]), analysis["page"]
+
+
+def run(name, extract, pages, repeat):
+    # trafilatura's deduplication cache would otherwise carry over between paths
+    reset_caches()
+    results = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [extract(url, html) for url, html in pages]
+    seconds = time.perf_counter() - start
+
+    total = len(pages) * repeat
+    megabytes = sum(len(html) for _, html in pages) * repeat / 1e6
+    extracted = sum(1 for _, page in results if page)
+    print(
+        f"{name:<14} {seconds:7.2f}s  {total / seconds:8.1f} pages/s  "
+        f"{megabytes / seconds:6.2f} MB/s  extracted {extracted}/{len(pages)}"
+    )
+    return results
+
+
+def main(directory: str, base_url: str, count: int, repeat: int):
+    pages = load_pages(directory, base_url) if directory else make_pages(count)
+    if not pages:
+        print(f"❌ No .html files in {directory}")
+        return
+
+    print("=" * 70)
+    print("EXTRACTION BENCHMARK")
+    print("=" * 70)
+    print(f"Pages: {len(pages)}  Size: {sum(len(h) for _, h in pages) / 1e6:.1f} MB  Repeat: {repeat}")
+
+    # Warm-up (imports, trafilatura caches)
+    for url, html in pages[:5]:
+        legacy_extract(url, html)
+        single_parse_extract(url, html)
+
+    legacy = run("legacy", legacy_extract, pages, repeat)
+    single = run("single-parse", single_parse_extract, pages, repeat)
+
+    same_links = sum(1 for (a, _), (b, _) in zip(legacy, single) if a == b)
+    same_content = sum(
+        1 for (_, a), (_, b) in zip(legacy, single)
+        if (a and b and a["content"] == b["content"]) or (not a and not b)
+    )
+    print(f"\nSame links:   {same_links}/{len(pages)}")
+    print(f"Same content: {same_content}/{len(pages)}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark single-parse page extraction against the previous path")
+    parser.add_argument("--dir", default=None, help="Directory of saved .html pages")
+    parser.add_argument("--base-url", default="https://example.com/", help="URL the saved pages were fetched under")
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic pages when --dir is not given")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus")
+    args = parser.parse_args()
+
+    main(args.dir, args.base_url, args.pages, args.repeat)
@@ -0,0 +1,82 @@
+"""
+Ingestion throughput benchmark.
+
+Pushes synthetic documents through the shared IngestionEngine into a
+throwaway collection and reports chunks/sec for a few batch sizes.
+
+Usage (from backend/):
+    python scripts/benchmark_ingestion.py --docs 200 --batch-sizes 16 64 128
+"""
+
+import os
+import sys
+import uuid
+import argparse
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+from langchain_core.documents import Document
+
+from services import vector_store
+from services.ingestion_engine import IngestionEngine
+
+WORDS = (
+    "model training dataset accuracy results pipeline customer support pricing "
+    "refund policy shipping account invoice integration webhook token latency "
+    "retrieval embedding vector search document section table summary"
+).split()
+
+
+def make_documents(count: int, words_per_doc: int, seed: int = 7):
+    rng = random.Random(seed)
+    for i in range(count):
+        paragraphs = []
+        for _ in range(max(1, words_per_doc // 80)):
+            paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(80)) + ".")
+        yield Document(page_content="\n\n".join(paragraphs), metadata={"page": i})
+
+
+def run(docs: int, words_per_doc: int, batch_sizes):
+    print("=" * 70)
+    print("INGESTION ENGINE BENCHMARK")
+    print("=" * 70)
+    print(f"Documents: {docs} x ~{words_per_doc} words")
+
+    # Warm the embedding model so the first run doesn't pay for loading it
+    vector_store.get_embeddings().embed_query("warmup")
+
+    client = chromadb.PersistentClient(path=vector_store.CHROMA_PATH)
+
+    for batch_size in batch_sizes:
+        bot_id = f"bench-{uuid.uuid4()}"
+        engine = IngestionEngine(batch_size=batch_size)
+
+        try:
+            result = engine.ingest_documents(
+                bot_id, make_documents(docs, words_per_doc), "benchmark.txt", "file"
+            )
+            print(
+                f"batch={batch_size:<5} chunks={result.chunks:<6} "
+                f"time={result.seconds:7.2f}s  {result.chunks_per_second:8.1f} chunks/s  "
+                f"{result.documents / result.seconds if result.seconds else 0:6.1f} docs/s"
+            )
+        finally:
+            vector_store.evict_vector_store(bot_id)
+            try:
+                client.delete_collection(vector_store.collection_name(bot_id))
+            except Exception:
+                pass
+
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion engine")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--words", type=int, default=800, help="Words per document")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 64, 128])
+    args = parser.parse_args()
+
+    run(args.docs, args.words, args.batch_sizes)
@@ -0,0 +1,92 @@
+"""
+Export BGE-small to ONNX (fp32 + int8) for the embedding engine.
+
+Writes model.onnx, model_int8.onnx and the tokenizer into EMBEDDING_ONNX_DIR,
+then checks both graphs against the reference HuggingFaceEmbeddings vectors.
+
+Usage (from backend/):
+    python scripts/export_embedding_model.py
+    EMBEDDING_BACKEND=onnx-int8 uvicorn main:app
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch
+from transformers import AutoModel, AutoTokenizer
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from services.embedding_engine import (
+    EMBEDDING_MODEL_NAME, EMBEDDING_ONNX_DIR, ONNX_FILES, EmbeddingEngine, check_compatibility
+)
+
+SAMPLE_TEXTS = [
+    "What is the refund policy?",
+    "The model reached 94.2% accuracy on the held-out test set.",
+    "Shipping usually takes three to five business days within the country, "
+    "while international orders can take up to three weeks depending on customs.",
+    "Results",
+    "To rotate an API token, open Settings, choose Security and click Regenerate. "
+    "Existing integrations must be updated with the new token within 24 hours.",
+]
+
+
+def export():
+    os.makedirs(EMBEDDING_ONNX_DIR, exist_ok=True)
+    fp32_path = os.path.join(EMBEDDING_ONNX_DIR, ONNX_FILES["onnx"])
+    int8_path = os.path.join(EMBEDDING_ONNX_DIR, ONNX_FILES["onnx-int8"])
+
+    print(f"📦 Exporting {EMBEDDING_MODEL_NAME} -> {EMBEDDING_ONNX_DIR}")
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+    model = AutoModel.from_pretrained(EMBEDDING_MODEL_NAME)
+    model.eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    dynamic = {0: "batch", 1: "sequence"}
+
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+        fp32_path,
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={
+            "input_ids": dynamic,
+            "attention_mask": dynamic,
+            "token_type_ids": dynamic,
+            "last_hidden_state": dynamic,
+        },
+        opset_version=17,
+    )
+    tokenizer.save_pretrained(EMBEDDING_ONNX_DIR)
+    print(f"   ✅ fp32 graph: {fp32_path}")
+
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"   ✅ int8 graph: {int8_path}")
+
+
+def verify():
+    print("\n🔍 Checking compatibility with existing collections...")
+    reference = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+    ok = True
+    for backend in ONNX_FILES:
+        report = check_compatibility(EmbeddingEngine(backend), reference, SAMPLE_TEXTS)
+        status = "✅" if report["compatible"] else "❌"
+        print(f"   {status} {backend}: min cosine {report['min_cosine']:.5f} "
+              f"(tolerance {report['tolerance']})")
+        ok = ok and report["compatible"]
+
+    return ok
+
+
+if __name__ == "__main__":
+    export()
+    sys.exit(0 if verify() else 1)
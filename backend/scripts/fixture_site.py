@@ -0,0 +1,278 @@
+"""
+Fixture site.
+
+A generated documentation site served by a local aiohttp server, so the
+crawler can be exercised and benchmarked (scripts/benchmark_crawler.py)
+without network access.
+
+- /docs/page-{i}: docs-like pages with `fanout` links each (the next page
+  plus random ones, some written as trailing-slash / #fragment variants of
+  the same URL, some to /private/)
+- /private/...: disallowed by robots.txt (any request is a compliance bug)
+- /robots.txt with Sitemap: line (and optional Crawl-delay)
+- /sitemap_index.xml -> /sitemaps/sitemap-{k}.xml.gz (gzipped, with lastmod)
+- slow pages (every --slow-every-th page waits --slow-ms) and large pages
+  (every --large-every-th page is --large-kb big)
+
+Requests are counted per path, so duplicate fetches show up server-side.
+
+Usage (from backend/):
+    python scripts/fixture_site.py --pages 2000 --fanout 8 --port 8765
+"""
+
+import gzip
+import random
+import asyncio
+import argparse
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List, Optional
+
+from aiohttp import web
+
+WORDS = (
+    "install configure deploy cluster token webhook request response latency "
+    "retry timeout schema migration index query vector embedding document section "
+    "billing invoice account workspace permission role audit export import backup"
+).split()
+
+
+@dataclass
+class SiteConfig:
+    pages: int = 500
+    fanout: int = 8
+    words: int = 600  # per page
+    slow_every: int = 0  # 0: no slow pages
+    slow_ms: int = 300
+    large_every: int = 0  # 0: no large pages
+    large_kb: int = 2048
+    sitemap_chunk: int = 1000  # URLs per sitemap file
+    crawl_delay: float = 0.0  # robots.txt Crawl-delay (0: none)
+    seed: int = 7
+
+
+class FixtureSite:
+    """The generated site plus request counters; start() serves it on a background thread"""
+
+    def __init__(self, config: Optional[SiteConfig] = None):
+        self.config = config or SiteConfig()
+        self.hits: Counter = Counter()
+        self.bytes_sent = 0
+        self.base_url: Optional[str] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------- content
+    def _rng(self, i: int) -> random.Random:
+        return random.Random(self.config.seed * 1_000_003 + i)
+
+    def links(self, i: int) -> List[str]:
+        """Hrefs on page i (relative, as written in the HTML)"""
+        rng = self._rng(i)
+        hrefs = [f"/docs/page-{(i + 1) % self.config.pages}"]
+        for _ in range(self.config.fanout - 1):
+            target = rng.randrange(self.config.pages)
+            roll = rng.random()
+            if roll < 0.1:
+                hrefs.append(f"/docs/page-{target}/")
+            elif roll < 0.2:
+                hrefs.append(f"/docs/page-{target}#section-{rng.randint(1, 5)}")
+            else:
+                hrefs.append(f"/docs/page-{target}")
+        if i % 10 == 0:
+            hrefs.append(f"/private/page-{i}")
+        return hrefs
+
+    def is_large(self, i: int) -> bool:
+        return bool(self.config.large_every) and i % self.config.large_every == self.config.large_every - 1
+
+    def page_html(self, i: int) -> str:
+        rng = self._rng(i)
+
+        def sentence():
+            return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + f" ({i}-{rng.randrange(10**6)})."
+
+        sections, words = [], 0
+        while words < self.config.words:
+            paragraph = " ".join(sentence() for _ in range(rng.randint(3, 8)))
+            words += len(paragraph.split())
+            sections.append(f"<h2>{sentence()[:-1]}</h2><p>{paragraph}</p>")
+
+        nav = "".join(f'<li><a href="{href}">{rng.choice(WORDS)}</a></li>' for href in self.links(i))
+        padding = ""
+        if self.is_large(i):
+            filler = "<p>" + " ".join(rng.choice(WORDS) for _ in range(200)) + "</p>"
+            padding = filler * (self.config.large_kb * 1024 // len(filler) + 1)
+
+        return (
+            f"<!DOCTYPE html><html><head><title>Page {i}</title>"
+            f'<meta name="description" content="{sentence()}"></head>'
+            f"<body><header><nav><ul>{nav}</ul></nav></header>"
+            f"<main><article><h1>Page {i}</h1>{''.join(sections)}{padding}</article></main>"
+            f'<footer><a href="/assets/diagram.png">Diagram</a></footer></body></html>'
+        )
+
+    def reachable(self, max_depth: int) -> int:
+        """
+        Pages a breadth-first crawl from page 0 can reach within max_depth
+        (large pages count, but a crawler that caps downloads cannot follow their links)
+        """
+        depths = {0: 0}
+        queue = deque([0])
+        while queue:
+            i = queue.popleft()
+            if depths[i] >= max_depth or self.is_large(i):
+                continue
+            for href in self.links(i):
+                if href.startswith("/docs/"):
+                    target = int(href.split("page-")[1].split("/")[0].split("#")[0])
+                    if target not in depths:
+                        depths[target] = depths[i] + 1
+                        queue.append(target)
+        return len(depths)
+
+    # ------------------------------------------------------------- handlers
+    def _count(self, request: web.Request, response: web.Response) -> web.Response:
+        self.hits[request.path] += 1
+        self.bytes_sent += response.content_length or 0
+        return response
+
+    async def _page(self, request: web.Request) -> web.Response:
+        i = int(request.match_info["i"])
+        if i >= self.config.pages:
+            return self._count(request, web.Response(status=404))
+        if self.config.slow_every and i % self.config.slow_every == self.config.slow_every - 1:
+            await asyncio.sleep(self.config.slow_ms / 1000)
+        return self._count(request, web.Response(text=self.page_html(i), content_type="text/html"))
+
+    async def _private(self, request: web.Request) -> web.Response:
+        return self._count(request, web.Response(text="<html><body>private</body></html>", content_type="text/html"))
+
+    async def _robots(self, request: web.Request) -> web.Response:
+        lines = ["User-agent: *", "Disallow: /private/"]
+        if self.config.crawl_delay:
+            lines.append(f"Crawl-delay: {self.config.crawl_delay:g}")
+        lines.append(f"Sitemap: {request.scheme}://{request.host}/sitemap_index.xml")
+        return self._count(request, web.Response(text="\n".join(lines) + "\n", content_type="text/plain"))
+
+    async def _sitemap_index(self, request: web.Request) -> web.Response:
+        files = (self.config.pages + self.config.sitemap_chunk - 1) // self.config.sitemap_chunk
+        entries = "".join(
+            f"<sitemap><loc>{request.scheme}://{request.host}/sitemaps/sitemap-{k}.xml.gz</loc></sitemap>"
+            for k in range(files)
+        )
+        body = f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</sitemapindex>'
+        return self._count(request, web.Response(text=body, content_type="application/xml"))
+
+    async def _sitemap(self, request: web.Request) -> web.Response:
+        k = int(request.match_info["k"])
+        first = k * self.config.sitemap_chunk
+        entries = "".join(
+            f"<url><loc>{request.scheme}://{request.host}/docs/page-{i}</loc>"
+            f"<lastmod>{date(2024, 1, 1) + timedelta(days=i % 365)}</lastmod></url>"
+            for i in range(first, min(first + self.config.sitemap_chunk, self.config.pages))
+        )
+        body = f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+        return self._count(request, web.Response(body=gzip.compress(body.encode("utf-8")), content_type="application/gzip"))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/docs/page-{i:\\d+}", self._page)
+        app.router.add_get("/private/{tail:.*}", self._private)
+        app.router.add_get("/robots.txt", self._robots)
+        app.router.add_get("/sitemap_index.xml", self._sitemap_index)
+        app.router.add_get("/sitemaps/sitemap-{k:\\d+}.xml.gz", self._sitemap)
+        return app
+
+    # ------------------------------------------------------------- stats
+    def reset_stats(self):
+        self.hits.clear()
+        self.bytes_sent = 0
+
+    @property
+    def page_hits(self) -> int:
+        return sum(n for path, n in self.hits.items() if path.startswith("/docs/"))
+
+    @property
+    def duplicate_hits(self) -> int:
+        """Requests for a page beyond its first"""
+        return sum(n - 1 for path, n in self.hits.items() if path.startswith("/docs/") and n > 1)
+
+    @property
+    def private_hits(self) -> int:
+        return sum(n for path, n in self.hits.items() if path.startswith("/private/"))
+
+    # ------------------------------------------------------------- server
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve on a background thread; returns the base URL (port 0 picks a free port)"""
+        started = threading.Event()
+
+        async def serve():
+            self._runner = web.AppRunner(self.app(), access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, host, port).start()
+            self.base_url = f"http://{host}:{self._runner.addresses[0][1]}"
+            started.set()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(serve())
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fixture-site", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+
+def add_site_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--pages", type=int, default=500, help="Pages on the site")
+    parser.add_argument("--fanout", type=int, default=8, help="Links per page")
+    parser.add_argument("--words", type=int, default=600, help="Words per page")
+    parser.add_argument("--slow-every", type=int, default=0, help="Make every Nth page slow (0: none)")
+    parser.add_argument("--slow-ms", type=int, default=300, help="Delay of slow pages")
+    parser.add_argument("--large-every", type=int, default=0, help="Make every Nth page large (0: none)")
+    parser.add_argument("--large-kb", type=int, default=2048, help="Size of large pages")
+    parser.add_argument("--crawl-delay", type=float, default=0.0, help="robots.txt Crawl-delay (0: none)")
+    parser.add_argument("--seed", type=int, default=7)
+
+
+def site_config(args: argparse.Namespace) -> SiteConfig:
+    return SiteConfig(
+        pages=args.pages,
+        fanout=args.fanout,
+        words=args.words,
+        slow_every=args.slow_every,
+        slow_ms=args.slow_ms,
+        large_every=args.large_every,
+        large_kb=args.large_kb,
+        crawl_delay=args.crawl_delay,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a generated documentation site for crawler tests")
+    add_site_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    site = FixtureSite(site_config(args))
+    print("=" * 70)
+    print(f"🌐 Fixture site: {args.pages} pages, fan-out {args.fanout}")
+    print(f"   Start URL: http://{args.host}:{args.port}/docs/page-0")
+    print(f"   Sitemap:   http://{args.host}:{args.port}/sitemap_index.xml")
+    print("=" * 70)
+    web.run_app(site.app(), host=args.host, port=args.port, print=None)
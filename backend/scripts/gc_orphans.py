@@ -0,0 +1,74 @@
+"""
+Reap vector collections and stored files of deleted bots.
+
+Usage (from backend/):
+    python scripts/gc_orphans.py --dry-run     # report only
+    python scripts/gc_orphans.py               # delete + segment cleanup
+    python scripts/gc_orphans.py --vacuum      # ... + VACUUM chroma.sqlite3
+    python scripts/gc_orphans.py --no-compact  # delete only
+
+Stop the API before --vacuum: VACUUM needs exclusive access to chroma.sqlite3.
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.garbage_collector import collect
+
+
+def human(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def main(dry_run: bool, compact: bool, vacuum: bool):
+    print("=" * 70)
+    print(f"ORPHAN GARBAGE COLLECTION{' (DRY RUN)' if dry_run else ''}")
+    print("=" * 70)
+
+    report = collect(dry_run=dry_run, compact=compact, vacuum=vacuum)
+    verb = "Would remove" if dry_run else "Removed"
+
+    print(f"\n📦 {verb} {len(report.collections)} collections")
+    for name in report.collections:
+        print(f"   - {name}")
+    if report.skipped_in_use:
+        print(f"⏭️  Skipped (in use): {', '.join(report.skipped_in_use)}")
+
+    print(f"\n☁️  {verb} {len(report.storage_folders)} storage folders "
+          f"({report.storage_objects} files, {human(report.storage_bytes)})")
+    for folder in report.storage_folders:
+        print(f"   - {folder}")
+
+    print(f"\n🗃️  {verb} {report.asset_rows} asset rows, {report.manifest_rows} manifest rows")
+    if compact:
+        print(f"🧹 {verb} {len(report.segment_dirs)} unreferenced segment directories")
+    if report.vacuumed:
+        print("🧹 VACUUMed chroma.sqlite3")
+
+    print(f"\n💾 Vector store: {human(report.disk_bytes_before)} -> {human(report.disk_bytes_after)} "
+          f"(reclaimed {human(report.disk_bytes_reclaimed)})")
+
+    if report.errors:
+        print("\n❌ Errors:")
+        for error in report.errors:
+            print(f"   - {error}")
+
+    print("=" * 70)
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Garbage-collect orphaned collections and assets")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+    parser.add_argument("--no-compact", action="store_true", help="Skip segment cleanup")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM chroma.sqlite3 (stop the API first)")
+    args = parser.parse_args()
+
+    sys.exit(main(args.dry_run, not args.no_compact, args.vacuum))
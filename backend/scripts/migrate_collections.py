@@ -1,163 +1,93 @@
 """
-Migration script to convert existing collections to use cosine similarity.
-This preserves your existing documents without needing to re-upload.
+Rebuild collections with the current settings (cosine space / index parameters)
+without losing data.
+
+Runs the CollectionMigrator (services/collection_migration.py):
+- stored embeddings are copied when they match the production model
+  (re-embedding only happens for collections built with another model)
+- collections are migrated in parallel and paged, never loaded whole
+- each one is written to a shadow collection and swapped in after verification
+- progress is checkpointed; rerun the same command to resume after a crash
+
+Usage (from backend/):
+    python scripts/migrate_collections.py --plan
+    python scripts/migrate_collections.py --workers 4
+    python scripts/migrate_collections.py --collections collection_<id> --reembed always
+
+A running FastAPI server re-opens swapped collections on its own (within
+CHROMA_HANDLE_CHECK_SECONDS); no restart is needed.
 """
 
 import os
-import tempfile
-import chromadb
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from tqdm import tqdm
-
-CHROMA_PATH = os.path.join(tempfile.gettempdir(), "botblocks_chroma_db")
-
-def migrate_collection_to_cosine(collection_name: str, embeddings):
-    """Migrate a single collection from L2 to cosine similarity"""
-    
-    print(f"\n📦 Migrating: {collection_name}")
-    
-    try:
-        # Step 1: Connect to old collection (L2)
-        old_store = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=embeddings,
-            collection_name=collection_name
-            # No metadata = defaults to L2
-        )
-        
-        doc_count = old_store._collection.count()
-        print(f"   Found {doc_count} documents")
-        
-        if doc_count == 0:
-            print(f"   ⚠️  Empty collection, skipping...")
-            return True
-        
-        # Step 2: Get all documents
-        print(f"   📥 Retrieving all documents...")
-        all_data = old_store._collection.get()
-        
-        documents = all_data['documents']
-        metadatas = all_data['metadatas']
-        ids = all_data['ids']
-        
-        print(f"   ✅ Retrieved {len(documents)} documents")
-        
-        # Step 3: Delete old collection
-        print(f"   🗑️  Deleting old collection...")
-        client = chromadb.PersistentClient(path=CHROMA_PATH)
-        client.delete_collection(collection_name)
-        
-        # Step 4: Create new collection with cosine
-        print(f"   🔨 Creating new collection with cosine similarity...")
-        new_store = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=embeddings,
-            collection_name=collection_name,
-            collection_metadata={"hnsw:space": "cosine"}  # ← KEY FIX
-        )
-        
-        # Step 5: Re-add all documents
-        print(f"   📤 Re-adding documents...")
-        
-        from langchain_core.documents import Document
-        
-        docs_to_add = []
-        for i in range(len(documents)):
-            doc = Document(
-                page_content=documents[i],
-                metadata=metadatas[i] if metadatas else {}
-            )
-            docs_to_add.append(doc)
-        
-        # Add in batches of 100
-        batch_size = 100
-        for i in range(0, len(docs_to_add), batch_size):
-            batch = docs_to_add[i:i+batch_size]
-            new_store.add_documents(batch)
-            print(f"   Added batch {i//batch_size + 1}/{(len(docs_to_add)-1)//batch_size + 1}")
-        
-        # Step 6: Verify
-        final_count = new_store._collection.count()
-        print(f"   ✅ Migration complete! Final count: {final_count}")
-        
-        if final_count != doc_count:
-            print(f"   ⚠️  WARNING: Document count mismatch! (Before: {doc_count}, After: {final_count})")
-            return False
-        
-        return True
-    
-    except Exception as e:
-        print(f"   ❌ Migration failed: {e}")
-        return False
-
-def migrate_all_collections():
-    """Migrate all collections to cosine similarity"""
-    
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import vector_store
+from services.collection_migration import (
+    CollectionMigrator, MigrationPlan, MIGRATION_PAGE_SIZE, MIGRATION_WORKERS, REEMBED_MODES
+)
+
+
+def print_progress(progress):
+    status = {"done": "✅"}.get(progress.state, "❌" if progress.error else "⏸️")
+    mode = "re-embedded" if progress.reembedded else "copied"
+    print(f"   {status} {progress.name}: {progress.copied}/{progress.source_count} {mode} "
+          f"[{progress.state}] {progress.seconds:.1f}s" + (f" - {progress.error}" if progress.error else ""))
+
+
+def main(args) -> int:
     print("=" * 70)
-    print("CHROMADB MIGRATION TO COSINE SIMILARITY")
+    print("CHROMADB COLLECTION MIGRATION")
     print("=" * 70)
-    
-    if not os.path.exists(CHROMA_PATH):
-        print(f"\n❌ ChromaDB path not found: {CHROMA_PATH}")
-        return
-    
-    print(f"\n📂 ChromaDB path: {CHROMA_PATH}")
-    
-    # Initialize embeddings (must match your existing embeddings)
-    print("\n🔄 Loading embeddings model...")
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    
-    # Get all collections
-    client = chromadb.PersistentClient(path=CHROMA_PATH)
-    collections = client.list_collections()
-    
+    print(f"\n📂 ChromaDB path: {vector_store.CHROMA_PATH}")
+
+    plan = MigrationPlan(
+        name=args.name,
+        target_metadata={**vector_store.COLLECTION_METADATA, "hnsw:space": args.space},
+        reembed=args.reembed,
+        keep_retired=args.keep_old,
+        page_size=args.page_size
+    )
+    migrator = CollectionMigrator(plan, workers=args.workers, checkpoint_path=args.checkpoint)
+    collections = args.collections or migrator.bot_collections()
+
     if not collections:
         print("\n✅ No collections found.")
-        return
-    
-    print(f"\n📋 Found {len(collections)} collection(s) to migrate:")
-    for col in collections:
-        print(f"   - {col.name}: {col.count()} documents")
-    
-    # Confirm
-    print("\n" + "=" * 70)
-    print("⚠️  This will recreate all collections with cosine similarity.")
-    print("Your data will be preserved, but this may take a few minutes.")
-    print("=" * 70)
-    
-    confirm = input("\nType 'MIGRATE' to proceed: ")
-    
-    if confirm != "MIGRATE":
-        print("\n❌ Aborted.")
-        return
-    
-    # Migrate each collection
-    print("\n🚀 Starting migration...")
-    
-    success_count = 0
-    fail_count = 0
-    
-    for col in collections:
-        success = migrate_collection_to_cosine(col.name, embeddings)
-        if success:
-            success_count += 1
-        else:
-            fail_count += 1
-    
-    # Summary
+        return 0
+
+    print(f"\n📋 {len(collections)} collection(s), checkpoint: {migrator.checkpoint.path}")
+    for name in collections:
+        progress = migrator.checkpoint.get(name)
+        print(f"   - {name} [{progress.state}]")
+
+    if args.plan:
+        return 0
+
+    print(f"\n🚀 Migrating with {args.workers} workers...")
+    results = migrator.run(collections, on_progress=print_progress)
+
+    done = sum(1 for p in results if p.state == "done")
     print("\n" + "=" * 70)
     print("MIGRATION SUMMARY")
     print("=" * 70)
-    print(f"✅ Successful: {success_count}")
-    print(f"❌ Failed: {fail_count}")
-    print("\n" + "=" * 70)
-    print("NEXT STEPS:")
-    print("=" * 70)
-    print("1. Restart your FastAPI server")
-    print("2. Test queries - they should now work correctly!")
-    print("3. Relevance scores should be 0.0 to 1.0 (not negative)")
+    print(f"✅ Done: {done}")
+    print(f"❌ Incomplete: {len(results) - done} (rerun to resume)")
     print("=" * 70)
+    return 0 if done == len(results) else 1
+
 
 if __name__ == "__main__":
-    migrate_all_collections()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Parallel, resumable collection migration")
+    parser.add_argument("--name", default="cosine", help="Migration name (checkpoint file)")
+    parser.add_argument("--collections", nargs="*", default=None, help="Default: every bot collection")
+    parser.add_argument("--workers", type=int, default=MIGRATION_WORKERS)
+    parser.add_argument("--page-size", type=int, default=MIGRATION_PAGE_SIZE)
+    parser.add_argument("--space", default=vector_store.COLLECTION_METADATA["hnsw:space"])
+    parser.add_argument("--reembed", choices=REEMBED_MODES, default="auto")
+    parser.add_argument("--keep-old", action="store_true", help="Keep retired_* collections after the swap")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file path")
+    parser.add_argument("--plan", action="store_true", help="Show what would be migrated and exit")
+
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,80 @@
+"""
+Export, import and compact bot collections without re-embedding.
+
+Usage (from backend/):
+    python scripts/snapshot_collection.py export <bot_public_id> [--dtype float16] [--out DIR]
+    python scripts/snapshot_collection.py import <snapshot_dir> [--bot <public_id>] [--replace]
+    python scripts/snapshot_collection.py verify <snapshot_dir>
+    python scripts/snapshot_collection.py compact <bot_public_id>
+
+Moving a bot between nodes: export on the source, copy the directory,
+import on the target (vectors are loaded as-is, no model needed).
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import snapshots
+
+
+def main(args) -> int:
+    print("=" * 70)
+    print(f"COLLECTION SNAPSHOT: {args.command.upper()}")
+    print("=" * 70)
+
+    try:
+        if args.command == "export":
+            manifest = snapshots.export_snapshot(args.bot_id, args.out, args.dtype)
+            print(f"✅ {manifest['count']} vectors (dim {manifest['dim']}, {manifest['dtype']}) -> {manifest['path']}")
+
+        elif args.command == "import":
+            result = snapshots.import_snapshot(
+                args.snapshot_dir, args.bot, replace=args.replace,
+                allow_model_mismatch=args.allow_model_mismatch
+            )
+            print(f"✅ Loaded {result['count']} vectors into {result['bot_id']} in {result['seconds']}s")
+
+        elif args.command == "verify":
+            manifest = snapshots.read_manifest(args.snapshot_dir)
+            ok = snapshots.verify_snapshot(args.snapshot_dir)
+            print(f"{'✅' if ok else '❌'} {manifest['bot_id']}: {manifest['count']} vectors, "
+                  f"model {manifest['embedding_model']}, created {manifest['created_at']}")
+            return 0 if ok else 1
+
+        elif args.command == "compact":
+            result = snapshots.compact_collection(args.bot_id)
+            print(f"✅ Rebuilt {result['bot_id']} with {result['count']} vectors in {result['seconds']}s")
+
+    except Exception as e:
+        print(f"❌ {e}")
+        return 1
+
+    print("=" * 70)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collection snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write a bot's collection to a snapshot")
+    export.add_argument("bot_id")
+    export.add_argument("--out", default=None, help="Output directory")
+    export.add_argument("--dtype", choices=sorted(snapshots.DTYPES), default="float32")
+
+    load = commands.add_parser("import", help="Bulk-load a snapshot")
+    load.add_argument("snapshot_dir")
+    load.add_argument("--bot", default=None, help="Target bot public_id (default: original bot)")
+    load.add_argument("--replace", action="store_true", help="Drop the existing collection first")
+    load.add_argument("--allow-model-mismatch", action="store_true")
+
+    verify = commands.add_parser("verify", help="Check snapshot checksums")
+    verify.add_argument("snapshot_dir")
+
+    compact = commands.add_parser("compact", help="Rebuild a collection from a snapshot of itself")
+    compact.add_argument("bot_id")
+
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""
+Sweep HNSW parameters on a bot's own vectors.
+
+Builds throwaway in-memory indexes over (a sample of) the bot's collection
+for every M / ef_construction / ef_search combination and prints recall@k
+against exact search with p50/p95 query latency. The bot's collection is
+only read, unless --apply is given.
+
+Usage (from backend/):
+    python scripts/tune_index.py <bot_public_id>
+    python scripts/tune_index.py <bot_public_id> --ef-search 16 32 64 128 --m 16 24 32 --target-recall 0.98
+    python scripts/tune_index.py <bot_public_id> --apply
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import crud
+from db.database import SessionLocal
+from services.index_profiles import IndexProfile
+from services.index_tuning import sweep, recommend, apply_profile, SWEEP_MAX_VECTORS
+
+
+def main(args) -> int:
+    print("=" * 70)
+    print(f"INDEX TUNING: {args.bot_id}")
+    print("=" * 70)
+
+    points = sweep(
+        args.bot_id,
+        ef_search_values=args.ef_search,
+        m_values=args.m,
+        ef_construction_values=args.ef_construction,
+        queries=args.queries,
+        k=args.k,
+        max_vectors=args.max_vectors
+    )
+
+    print(f"\n{'M':>4} {'efC':>5} {'efS':>5} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}")
+    for p in points:
+        print(f"{p.m:>4} {p.ef_construction:>5} {p.ef_search:>5} {p.recall:>10.4f} "
+              f"{p.p50_ms:>8.2f} {p.p95_ms:>8.2f} {p.build_seconds:>8.1f}")
+
+    best = recommend(points, args.target_recall)
+    print(f"\n🎯 Recommended (recall >= {args.target_recall}): "
+          f"M={best.m} ef_construction={best.ef_construction} ef_search={best.ef_search} "
+          f"(recall {best.recall:.4f}, p95 {best.p95_ms:.2f} ms)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([p.to_dict() for p in points], f, indent=2)
+        print(f"📄 Curve written to {args.json}")
+
+    if args.apply:
+        params = {"m": best.m, "ef_construction": best.ef_construction, "ef_search": best.ef_search}
+        db = SessionLocal()
+        try:
+            bot = crud.get_bot_by_public_id(db, args.bot_id)
+            if not bot:
+                print("❌ Bot not found")
+                return 1
+            bot.index_params = json.dumps(params)
+            db.commit()
+        finally:
+            db.close()
+
+        result = apply_profile(args.bot_id, IndexProfile("tuned", **params))
+        print(f"✅ Applied: {result['action']}")
+
+    print("=" * 70)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency sweep for a bot's index")
+    parser.add_argument("bot_id")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--m", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max-vectors", type=int, default=SWEEP_MAX_VECTORS)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--json", default=None, help="Write the curve to a JSON file")
+    parser.add_argument("--apply", action="store_true", help="Store and apply the recommendation")
+
+    sys.exit(main(parser.parse_args()))
@@ -36,4 +36,12 @@ if __name__ == "__main__":
     add_column(engine, "bots", "initial_message", "TEXT DEFAULT 'Hello! How can I help you today?'")
     add_column(engine, "bots", "bot_avatar", "VARCHAR DEFAULT '🤖'")
     
+    # Per-bot vector index profiles
+    add_column(engine, "bots", "index_profile", "VARCHAR DEFAULT 'auto'")
+    add_column(engine, "bots", "index_params", "TEXT")
+    
+    # Near-duplicate detection for scraped pages
+    add_column(engine, "crawl_page_states", "simhash", "VARCHAR")
+    add_column(engine, "crawl_page_states", "duplicate_of", "VARCHAR")
+    
     print("✨ Schema Update Complete.")
\ No newline at end of file
@@ -1,62 +1,89 @@
 from sqlalchemy.orm import Session
-from fastapi import UploadFile
 from db import models
-import cloudinary.uploader
+from db.database import SessionLocal
+from services.object_storage import get_storage
 
-def upload_asset(db: Session, bot_public_id: str, file: UploadFile):
+# Every bot's files live under {ASSET_ROOT}/{bot_public_id} in object storage
+ASSET_ROOT = "botblocks"
+
+
+def asset_folder(bot_public_id: str) -> str:
+    return f"{ASSET_ROOT}/{bot_public_id}"
+
+def register_asset(db: Session, bot_public_id: str, filename: str, file_size: int):
     """
-    Upload asset and associate with bot
+    Create (or reuse) the asset row for an upload before it reaches storage.
+    
+    The file itself is pushed by store_asset_file once indexing has started,
+    so the row starts without a URL.
     
-    Args:
-        bot_public_id: Bot's public_id (UUID string)
-        file: Uploaded file
+    Returns:
+        (asset, needs_upload) or (None, False) if the bot does not exist
     """
     try:
-        # ✅ First, get the bot to access its integer ID
         bot = db.query(models.Bot).filter(
             models.Bot.public_id == bot_public_id
         ).first()
         
         if not bot:
             print(f"Bot not found: {bot_public_id}")
-            return None
+            return None, False
         
-        # ✅ Use bot.id (integer) instead of bot_public_id (string)
         existing = db.query(models.Asset).filter_by(
-            bot_id=bot.id,  # ✅ Changed from bot_public_id
-            filename=file.filename
+            bot_id=bot.id,
+            filename=filename
         ).first()
         
         if existing:
-            return existing
-        
-        res = cloudinary.uploader.upload(
-            file.file,
-            folder=f"botblocks/{bot_public_id}",  # Keep using public_id for folder name
-            resource_type="raw",
-            use_filename=True,
-            unique_filename=False
-        )
+            return existing, not existing.cloudinary_url
         
         new_asset = models.Asset(
-            bot_id=bot.id,  # ✅ Changed from bot_public_id
-            filename=file.filename,
-            cloudinary_url=res.get("secure_url"),
-            cloudinary_public_id=res.get("public_id"),
-            file_type=file.filename.split('.')[-1],
-            file_size=res.get("bytes")
+            bot_id=bot.id,
+            filename=filename,
+            cloudinary_url=None,
+            cloudinary_public_id=None,
+            file_type=filename.split('.')[-1],
+            file_size=file_size
         )
         
         db.add(new_asset)
         db.commit()
         db.refresh(new_asset)
         
-        return new_asset
+        return new_asset, True
     
     except Exception as e:
-        print(f"Cloudinary Upload Error: {e}")
+        print(f"Asset Register Error: {e}")
         db.rollback()
-        return None
+        return None, False
+
+
+def store_asset_file(asset_id: int, bot_public_id: str, local_path: str) -> bool:
+    """
+    Push a spooled file to object storage and record its URL.
+    Runs in the background, so it opens its own DB session.
+    """
+    db = SessionLocal()
+    try:
+        stored = get_storage().put_file(local_path, folder=asset_folder(bot_public_id))
+        
+        asset = db.query(models.Asset).filter(models.Asset.id == asset_id).first()
+        if not asset:
+            return False
+        
+        asset.cloudinary_url = stored.url
+        asset.cloudinary_public_id = stored.object_id
+        asset.file_size = stored.size
+        db.commit()
+        
+        return True
+    
+    except Exception as e:
+        print(f"Storage Upload Error: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
 
 
 def list_assets(db: Session, bot_public_id: str):
@@ -107,15 +134,12 @@ def delete_asset(db: Session, bot_public_id: str, filename: str):
         if not asset:
             return False
         
-        # Delete from Cloudinary
+        # Delete from object storage
         if asset.cloudinary_public_id:
             try:
-                cloudinary.uploader.destroy(
-                    asset.cloudinary_public_id,
-                    resource_type="raw"
-                )
+                get_storage().delete(asset.cloudinary_public_id)
             except Exception as e:
-                print(f"Cloudinary delete error: {e}")
+                print(f"Storage delete error: {e}")
         
         # Delete from database
         db.delete(asset)
@@ -141,4 +165,10 @@ def get_asset(db: Session, bot_public_id: str, filename: str):
     return db.query(models.Asset).filter(
         models.Asset.bot_id == bot.id,
         models.Asset.filename == filename
-    ).first()
\ No newline at end of file
+    ).first()
+
+
+def get_asset_url(db: Session, bot_public_id: str, filename: str):
+    """Get the stored URL of an asset (None while the upload is pending)"""
+    asset = get_asset(db, bot_public_id, filename)
+    return asset.cloudinary_url if asset else None
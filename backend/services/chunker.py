@@ -0,0 +1,213 @@
+"""
+Structural Chunker
+==================
+Token-aware, structure-aware splitting with deterministic chunk IDs.
+
+Replaces the character-based RecursiveCharacterTextSplitter:
+- Sizes are counted in embedding-model tokens, so every chunk fits the
+  encoder window (no silent truncation of long chunks).
+- Boundaries follow the document's own structure: paragraphs first, then
+  lines (table rows, list items), then sentences, then raw token windows
+  only for text that has no better break.
+- One tokenizer call per section; chunk boundaries are found with offsets
+  and bisection over the token starts, and each chunk's text is sliced
+  exactly once (no repeated string splitting / joining).
+- Overlap is whole units (paragraphs / rows) up to CHUNK_OVERLAP_TOKENS,
+  never half a sentence.
+- Chunks of a sectioned document keep their heading: every chunk after
+  the first is prefixed with it so it stays self-describing.
+
+Chunk IDs are "{source hash}-{section}-{offset}-{content hash}", so the same
+content always gets the same ID: re-ingesting upserts instead of
+duplicating, and a source's chunks can be deleted by ID.
+"""
+
+import os
+import re
+import hashlib
+import logging
+from bisect import bisect_left
+from typing import Callable, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
+
+logger = logging.getLogger("Chunker")
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "60"))
+
+# Coarsest to finest; each piece keeps its trailing separator
+SEPARATORS = (
+    re.compile(r"\n[ \t]*\n\s*"),    # paragraphs / blocks
+    re.compile(r"\n"),               # lines: table rows, list items
+    re.compile(r"(?<=[.!?;])\s+"),   # sentences
+)
+
+APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# text -> start offset of every token, ascending
+TokenOffsets = Callable[[str], List[int]]
+
+
+def approximate_token_offsets(text: str) -> List[int]:
+    """Word/punctuation starts: cheap stand-in when no fast tokenizer is available"""
+    return [m.start() for m in APPROX_TOKEN.finditer(text)]
+
+
+def tokenizer_offsets(tokenizer) -> TokenOffsets:
+    """Token start offsets from a HuggingFace fast tokenizer"""
+    def offsets(text: str) -> List[int]:
+        encoded = tokenizer(
+            text, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+        )
+        return [start for start, end in encoded["offset_mapping"] if end > start]
+    return offsets
+
+
+def default_token_offsets() -> TokenOffsets:
+    """The embedding model's own tokenizer (shared with the embedding engine)"""
+    try:
+        from services.embedding_engine import get_embedding_engine
+
+        tokenizer = get_embedding_engine().tokenizer
+        if getattr(tokenizer, "is_fast", False):
+            return tokenizer_offsets(tokenizer)
+        logger.warning("Embedding tokenizer has no offsets; using approximate token counts")
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable ({e}); using approximate token counts")
+    return approximate_token_offsets
+
+
+def chunk_id(source: str, section: int, offset: int, content: str) -> str:
+    """Deterministic chunk ID: source + position + content hash"""
+    source_hash = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+    content_hash = hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+    return f"{source_hash}-{section}-{offset}-{content_hash}"
+
+
+class StructuralChunker:
+    """Split Documents into token-bounded, structure-aligned chunks"""
+
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        token_offsets: Optional[TokenOffsets] = None
+    ):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self._token_offsets = token_offsets
+
+    @property
+    def token_offsets(self) -> TokenOffsets:
+        # Resolved lazily so importing the chunker never loads a model
+        if self._token_offsets is None:
+            self._token_offsets = default_token_offsets()
+        return self._token_offsets
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.token_offsets(text))
+
+    # ------------------------------------------------------------ splitting
+    @staticmethod
+    def _count(starts: List[int], start: int, end: int) -> int:
+        return bisect_left(starts, end) - bisect_left(starts, start)
+
+    def _units(
+        self, text: str, starts: List[int], start: int, end: int, budget: int, level: int = 0
+    ) -> Iterator[Tuple[int, int, int]]:
+        """Yield (start, end, tokens) spans of at most `budget` tokens, coarsest breaks first"""
+        tokens = self._count(starts, start, end)
+        if tokens <= budget:
+            if tokens:
+                yield start, end, tokens
+            return
+
+        if level == len(SEPARATORS):
+            # No structural break left: fixed token windows
+            first = bisect_left(starts, start)
+            last = bisect_left(starts, end)
+            for i in range(first, last, budget):
+                window_end = starts[i + budget] if i + budget < last else end
+                yield max(start, starts[i]) if i > first else start, window_end, min(budget, last - i)
+            return
+
+        position = start
+        for match in SEPARATORS[level].finditer(text, start, end):
+            if match.end() > position:
+                yield from self._units(text, starts, position, match.end(), budget, level + 1)
+                position = match.end()
+        if position < end:
+            yield from self._units(text, starts, position, end, budget, level + 1)
+
+    def split_text(self, text: str, budget: Optional[int] = None) -> Iterator[Tuple[int, int, int]]:
+        """
+        Pack structural units into chunks.
+
+        Yields:
+            (start, end, tokens) character spans of `text`
+        """
+        budget = budget or self.max_tokens
+        starts = self.token_offsets(text)
+
+        window: List[Tuple[int, int, int]] = []
+        window_tokens = 0
+
+        for unit in self._units(text, starts, 0, len(text), budget):
+            if window and window_tokens + unit[2] > budget:
+                yield window[0][0], window[-1][1], window_tokens
+
+                # Carry trailing units forward as overlap
+                keep, kept_tokens = 0, 0
+                for _, _, tokens in reversed(window):
+                    if kept_tokens + tokens > self.overlap_tokens or kept_tokens + tokens + unit[2] > budget:
+                        break
+                    keep += 1
+                    kept_tokens += tokens
+                window = window[len(window) - keep:] if keep else []
+                window_tokens = kept_tokens
+
+            window.append(unit)
+            window_tokens += unit[2]
+
+        if window:
+            yield window[0][0], window[-1][1], window_tokens
+
+    # ------------------------------------------------------------ documents
+    def chunk(self, document: Document, source: str, section: int = 0) -> Iterator[Document]:
+        """
+        Chunk one loaded section.
+
+        Args:
+            document: Section from a loader (its metadata is copied to every chunk)
+            source: Source identifier (part of the chunk ID)
+            section: Position of the section within the source (part of the chunk ID)
+        """
+        text = document.page_content
+        heading = document.metadata.get("heading")
+        prefix = f"{heading}\n\n" if heading else ""
+        budget = self.max_tokens - (self.count_tokens(prefix) if prefix else 0)
+
+        for index, (start, end, tokens) in enumerate(self.split_text(text, max(budget, self.overlap_tokens + 1))):
+            # Trim whitespace without copying the whole section
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if start == end:
+                continue
+
+            content = text[start:end]
+            if prefix and not content.startswith(heading):
+                content = prefix + content
+
+            metadata = dict(document.metadata)
+            metadata.update({
+                "start_index": start,
+                "chunk_index": index,
+                "token_count": tokens,
+                "chunk_id": chunk_id(source, section, start, content),
+            })
+            yield Document(page_content=content, metadata=metadata)
@@ -0,0 +1,352 @@
+"""
+Collection Migration
+====================
+Parallel, resumable rebuilds of Chroma collections.
+
+Used when a collection's fixed settings change (distance metric, HNSW
+parameters) or its vectors come from another embedding model. Each
+collection goes through:
+
+    pending -> copying -> syncing -> swapping -> done   (or failed)
+
+- copying:  pages through the source (never loaded whole) into a shadow
+            collection, copying stored embeddings when they match the
+            production model and re-embedding the text only when they don't
+- syncing:  catches up with writes made during the copy (missing ids are
+            copied, ids deleted from the source are removed) and verifies counts
+- swapping: with the collection held exclusively (no writer can start), a
+            final sync runs, the source is renamed to retired_*, the shadow
+            takes the original name and cached handles are evicted; the
+            original is never deleted before the copy is verified
+
+Shadows are named per plan (shadow_<plan hash>_<name>) and a leftover
+shadow is dropped before a fresh copy starts, so a stale shadow of an
+earlier, abandoned migration is never swapped in.
+
+Progress (state + page offset per collection) is checkpointed to JSON after
+every page, so rerunning the same migration resumes where it stopped.
+Upserts are idempotent, so replaying the last page after a crash is safe.
+
+Other processes notice the swap within CHROMA_HANDLE_CHECK_SECONDS (see
+services/vector_store.py); records they write to the retired collection in
+that window are copied over before it is dropped.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from services import vector_store
+from services.embedding_engine import COMPATIBILITY_TOLERANCE
+
+logger = logging.getLogger("CollectionMigration")
+
+MIGRATION_DIR = os.getenv("MIGRATION_DIR", os.path.join(".", "data", "migrations"))
+MIGRATION_WORKERS = int(os.getenv("MIGRATION_WORKERS", "4"))
+MIGRATION_PAGE_SIZE = int(os.getenv("MIGRATION_PAGE_SIZE", "1000"))
+COMPATIBILITY_SAMPLE = 16
+
+SHADOW_PREFIX = "shadow_"
+RETIRED_PREFIX = "retired_"
+
+REEMBED_MODES = ("auto", "always", "never")
+
+
+@dataclass
+class CollectionProgress:
+    """Checkpointed state of one collection"""
+    name: str
+    state: str = "pending"  # pending, copying, syncing, swapping, done, failed
+    offset: int = 0
+    copied: int = 0
+    source_count: int = 0
+    reembedded: bool = False
+    shadow: Optional[str] = None
+    retired: Optional[str] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+@dataclass
+class MigrationPlan:
+    """What every collection is migrated to"""
+    name: str
+    target_metadata: Dict[str, Any] = field(default_factory=lambda: dict(vector_store.COLLECTION_METADATA))
+    reembed: str = "auto"  # auto, always, never
+    keep_retired: bool = False
+    page_size: int = MIGRATION_PAGE_SIZE
+
+
+# ============================================================================
+# CHECKPOINT
+# ============================================================================
+class Checkpoint:
+    """JSON checkpoint file, rewritten atomically on every update"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.collections: Dict[str, CollectionProgress] = {}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.collections = {
+                name: CollectionProgress(**progress) for name, progress in data.get("collections", {}).items()
+            }
+
+    def get(self, name: str) -> CollectionProgress:
+        with self._lock:
+            return self.collections.setdefault(name, CollectionProgress(name=name))
+
+    def remove(self):
+        """Delete the checkpoint file (once every collection is done)"""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            data = {
+                "updated_at": time.time(),
+                "collections": {name: vars(p) for name, p in self.collections.items()},
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+# ============================================================================
+# ENGINE
+# ============================================================================
+class CollectionMigrator:
+    """Runs a MigrationPlan over many collections with a worker pool"""
+
+    def __init__(self, plan: MigrationPlan, workers: int = MIGRATION_WORKERS, checkpoint_path: Optional[str] = None):
+        self.plan = plan
+        self.workers = workers
+        self.client = vector_store.get_client()
+        self.checkpoint = Checkpoint(checkpoint_path or os.path.join(MIGRATION_DIR, f"{plan.name}.json"))
+        self._embeddings = None
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = vector_store.get_embeddings()
+        return self._embeddings
+
+    # ----------------------------------------------------------- discovery
+    def bot_collections(self) -> List[str]:
+        return sorted(
+            c.name for c in self.client.list_collections()
+            if vector_store.bot_id_from_collection(c.name)
+        )
+
+    def shadow_name(self, name: str) -> str:
+        plan_hash = hashlib.sha1(self.plan.name.encode("utf-8")).hexdigest()[:8]
+        return f"{SHADOW_PREFIX}{plan_hash}_{name}"[:512]
+
+    def _drop(self, name: str):
+        try:
+            self.client.delete_collection(name)
+        except Exception as e:
+            logger.warning(f"Could not drop {name}: {e}")
+
+    def needs_reembedding(self, collection) -> bool:
+        """Compare stored vectors of a sample against the production model"""
+        if self.plan.reembed != "auto":
+            return self.plan.reembed == "always"
+
+        sample = collection.get(include=["embeddings", "documents"], limit=COMPATIBILITY_SAMPLE)
+        pairs = [(doc, vec) for doc, vec in zip(sample["documents"], sample["embeddings"]) if doc]
+        if not pairs:
+            return False
+
+        stored = np.asarray([vec for _, vec in pairs], dtype=np.float32)
+        fresh = np.asarray(self.embeddings.embed_documents([doc for doc, _ in pairs]), dtype=np.float32)
+        if stored.shape != fresh.shape:
+            return True
+
+        stored /= np.maximum(np.linalg.norm(stored, axis=1, keepdims=True), 1e-12)
+        tolerance = COMPATIBILITY_TOLERANCE.get(self.embeddings.backend.name, 0.99)
+        return float((stored * fresh).sum(axis=1).min()) < tolerance
+
+    # ------------------------------------------------------------- phases
+    def _write(self, shadow, page: Dict[str, Any], reembed: bool):
+        embeddings = page.get("embeddings")
+        if reembed:
+            embeddings = self.embeddings.embed_documents([doc or "" for doc in page["documents"]])
+        shadow.upsert(
+            ids=page["ids"],
+            embeddings=embeddings,
+            documents=page["documents"],
+            metadatas=page["metadatas"]
+        )
+
+    def _copy(self, source, shadow, progress: CollectionProgress):
+        include = ["documents", "metadatas"] if progress.reembedded else ["embeddings", "documents", "metadatas"]
+
+        while True:
+            page = source.get(include=include, limit=self.plan.page_size, offset=progress.offset)
+            if not page["ids"]:
+                return
+            self._write(shadow, page, progress.reembedded)
+
+            progress.offset += len(page["ids"])
+            progress.copied = progress.offset
+            self.checkpoint.save()
+
+    def _ids(self, collection) -> set:
+        return {
+            chunk_id
+            for page in vector_store.iter_collection(collection, include=(), page_size=self.plan.page_size * 5)
+            for chunk_id in page["ids"]
+        }
+
+    def _copy_missing(self, source, target, progress: CollectionProgress, target_ids: set) -> set:
+        """Copy records of source whose ids are not in target_ids; returns the source ids"""
+        source_ids = self._ids(source)
+        missing = list(source_ids - target_ids)
+        include = ["documents", "metadatas"] if progress.reembedded else ["embeddings", "documents", "metadatas"]
+        for i in range(0, len(missing), self.plan.page_size):
+            page = source.get(ids=missing[i:i + self.plan.page_size], include=include)
+            self._write(target, page, progress.reembedded)
+        return source_ids
+
+    def _sync(self, source, shadow, progress: CollectionProgress):
+        """Catch up with writes made to the source while it was being copied"""
+        shadow_ids = self._ids(shadow)
+        source_ids = self._copy_missing(source, shadow, progress, shadow_ids)
+
+        removed = list(shadow_ids - source_ids)
+        for i in range(0, len(removed), self.plan.page_size):
+            shadow.delete(ids=removed[i:i + self.plan.page_size])
+
+        progress.source_count = source.count()
+        if shadow.count() != progress.source_count:
+            raise RuntimeError(
+                f"Shadow has {shadow.count()} records, source has {progress.source_count}"
+            )
+
+    def _swap(self, progress: CollectionProgress):
+        """
+        Final sync, then rename source -> retired_*, shadow -> original name (resumable).
+        Runs with the collection held exclusively; raises CollectionBusy while it is leased.
+        """
+        bot_id = vector_store.bot_id_from_collection(progress.name)
+
+        with vector_store.exclusive(bot_id) if bot_id else nullcontext():
+            names = {c.name for c in self.client.list_collections()}
+
+            if progress.name in names and progress.shadow in names:
+                self._sync(self.client.get_collection(progress.name), self.client.get_collection(progress.shadow), progress)
+                progress.retired = progress.retired or f"{RETIRED_PREFIX}{progress.name}_{int(time.time())}"[:512]
+                self.checkpoint.save()
+                self.client.get_collection(progress.name).modify(name=progress.retired)
+                names.discard(progress.name)
+
+            if progress.shadow in names:
+                self.client.get_collection(progress.shadow).modify(name=progress.name)
+
+        if progress.retired and not self.plan.keep_retired:
+            # Writes through handles other processes had not re-checked yet landed in the retired collection
+            try:
+                current = self.client.get_collection(progress.name)
+                retired = self.client.get_collection(progress.retired)
+                self._copy_missing(retired, current, progress, self._ids(current))
+            except Exception as e:
+                logger.warning(f"Keeping {progress.retired}: late writes not copied ({e})")
+                return
+            self._drop(progress.retired)
+
+    def migrate_collection(self, name: str) -> CollectionProgress:
+        progress = self.checkpoint.get(name)
+        if progress.state == "done":
+            return progress
+
+        if progress.shadow is None and progress.state not in ("pending", "failed"):
+            # Checkpoint written before shadows were named per plan
+            progress.shadow = f"{SHADOW_PREFIX}{name}"[:512]
+
+        start_time = time.time()
+        try:
+            if progress.state in ("pending", "failed"):
+                if progress.state == "failed":
+                    progress.error = None
+                progress.shadow = self.shadow_name(name)
+                progress.offset = progress.copied = 0
+                if progress.shadow in {c.name for c in self.client.list_collections()}:
+                    logger.info(f"{name}: dropping leftover {progress.shadow}")
+                    self._drop(progress.shadow)
+                source = self.client.get_collection(name)
+                progress.source_count = source.count()
+                progress.reembedded = self.needs_reembedding(source)
+                progress.state = "copying"
+                self.checkpoint.save()
+                logger.info(
+                    f"{name}: {progress.source_count} records, "
+                    f"{'re-embedding' if progress.reembedded else 'copying embeddings'}"
+                )
+
+            if progress.state == "copying":
+                source = self.client.get_collection(name)
+                shadow = self.client.get_or_create_collection(progress.shadow, metadata=self.plan.target_metadata)
+                self._copy(source, shadow, progress)
+                progress.state = "syncing"
+                self.checkpoint.save()
+
+            if progress.state == "syncing":
+                source = self.client.get_collection(name)
+                shadow = self.client.get_collection(progress.shadow)
+                self._sync(source, shadow, progress)
+                progress.state = "swapping"
+                self.checkpoint.save()
+
+            if progress.state == "swapping":
+                self._swap(progress)
+                progress.state = "done"
+
+        except Exception as e:
+            logger.error(f"Migration of {name} failed in state {progress.state}: {e}", exc_info=True)
+            # Copy progress is kept: a rerun resumes from the last checkpointed page
+            if progress.state == "pending":
+                progress.state = "failed"
+            progress.error = str(e)
+
+        progress.seconds += time.time() - start_time
+        self.checkpoint.save()
+        return progress
+
+    def run(
+        self,
+        collections: Optional[List[str]] = None,
+        on_progress: Optional[Callable[[CollectionProgress], None]] = None
+    ) -> List[CollectionProgress]:
+        """Migrate collections in parallel (default: every bot collection)"""
+        collections = collections or self.bot_collections()
+        # Resumed migrations: collections mid-swap may only exist under their shadow name
+        collections = sorted(set(collections) | {
+            name for name, p in self.checkpoint.collections.items() if p.state not in ("done", "pending")
+        })
+
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="migrate") as pool:
+            futures = {pool.submit(self.migrate_collection, name): name for name in collections}
+            for future in as_completed(futures):
+                progress = future.result()
+                results.append(progress)
+                if on_progress:
+                    on_progress(progress)
+
+        return sorted(results, key=lambda p: p.name)
@@ -0,0 +1,390 @@
+"""
+Conversation Memory
+===================
+Session-scoped chat history so follow-up questions ("what about the second
+one?") are answered in context.
+
+- Sessions live in a bounded in-memory LRU with TTL eviction
+  (MEMORY_MAX_SESSIONS, MEMORY_TTL_SECONDS). With CONVERSATION_STORE=database
+  they are also written through to the conversation_sessions table and
+  reloaded after eviction or a restart.
+- The prompt gets a rolling summary plus the newest turns that fit in
+  MEMORY_HISTORY_TOKENS. Older turns are folded into the summary (capped at
+  MEMORY_SUMMARY_TOKENS) by compact(), which runs after the response is
+  sent, so prompt size stays constant however long the conversation gets.
+- Retrieval uses a standalone query: follow-ups are prefixed with the
+  previous retrieval query, cached on the session, so no extra LLM call
+  or history scan is needed per turn.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Set, Tuple
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from core.config import settings
+from db import models
+from db.database import SessionLocal
+from services.chunker import approximate_token_offsets
+
+logger = logging.getLogger("ConversationMemory")
+
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "memory")  # memory, database
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "10000"))
+MEMORY_TTL_SECONDS = int(os.getenv("MEMORY_TTL_SECONDS", str(30 * 60)))
+MEMORY_PERSIST_TTL_SECONDS = int(os.getenv("MEMORY_PERSIST_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+MEMORY_HISTORY_TOKENS = int(os.getenv("MEMORY_HISTORY_TOKENS", "600"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "200"))
+MEMORY_SUMMARIZER = os.getenv("MEMORY_SUMMARIZER", "llm")  # llm, extractive
+REWRITE_MAX_TOKENS = 64
+
+FOLLOW_UP = re.compile(
+    r"^(and|also|so|then|what about|how about|why|same)\b"
+    r"|\b(it|its|they|them|their|this|that|these|those|he|she|his|her|one|ones|former|latter|above|previous|more|else)\b",
+    re.IGNORECASE
+)
+
+
+def count_tokens(text: str) -> int:
+    return len(approximate_token_offsets(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cut text to max_tokens approximate tokens, keeping the head or the tail"""
+    offsets = approximate_token_offsets(text)
+    if len(offsets) <= max_tokens:
+        return text
+    if keep == "tail":
+        return text[offsets[-max_tokens]:]
+    return text[:offsets[max_tokens]].rstrip()
+
+
+@dataclass
+class Turn:
+    role: str  # user, assistant
+    content: str
+    tokens: int = 0
+
+    def __post_init__(self):
+        self.tokens = self.tokens or count_tokens(self.content)
+
+
+@dataclass
+class Conversation:
+    bot_id: str
+    session_id: str
+    summary: str = ""
+    turns: List[Turn] = field(default_factory=list)
+    retrieval_query: Optional[str] = None
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.bot_id, self.session_id)
+
+    @property
+    def window_tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+
+# ============================================================================
+# STORES
+# ============================================================================
+class MemoryStore:
+    """Bounded LRU of conversations with idle-time expiry"""
+
+    def __init__(self, max_sessions: int = MEMORY_MAX_SESSIONS, ttl_seconds: int = MEMORY_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[Tuple[str, str], Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[Conversation]:
+        with self._lock:
+            conversation = self._sessions.get(key)
+            if conversation is None:
+                return None
+            if time.time() - conversation.updated_at > self.ttl_seconds:
+                del self._sessions[key]
+                return None
+            self._sessions.move_to_end(key)
+            return conversation
+
+    def put(self, conversation: Conversation):
+        with self._lock:
+            self._sessions[conversation.key] = conversation
+            self._sessions.move_to_end(conversation.key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, key: Tuple[str, str]):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def purge_expired(self) -> int:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [key for key, c in self._sessions.items() if c.updated_at < cutoff]
+            for key in expired:
+                del self._sessions[key]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class DatabaseStore:
+    """conversation_sessions table: survives eviction and restarts"""
+
+    def load(self, key: Tuple[str, str]) -> Optional[Conversation]:
+        db = SessionLocal()
+        try:
+            row = db.query(models.ConversationSession).filter(
+                models.ConversationSession.bot_public_id == key[0],
+                models.ConversationSession.session_id == key[1]
+            ).first()
+            if not row:
+                return None
+            return Conversation(
+                bot_id=row.bot_public_id,
+                session_id=row.session_id,
+                summary=row.summary or "",
+                turns=[Turn(t["role"], t["content"]) for t in json.loads(row.turns or "[]")],
+                retrieval_query=row.retrieval_query,
+            )
+        finally:
+            db.close()
+
+    def save(self, conversation: Conversation):
+        db = SessionLocal()
+        try:
+            row = db.query(models.ConversationSession).filter(
+                models.ConversationSession.bot_public_id == conversation.bot_id,
+                models.ConversationSession.session_id == conversation.session_id
+            ).first()
+            if not row:
+                row = models.ConversationSession(
+                    bot_public_id=conversation.bot_id, session_id=conversation.session_id
+                )
+                db.add(row)
+            row.summary = conversation.summary
+            row.turns = json.dumps([{"role": t.role, "content": t.content} for t in conversation.turns])
+            row.retrieval_query = conversation.retrieval_query
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def delete(self, key: Tuple[str, str]):
+        db = SessionLocal()
+        try:
+            db.query(models.ConversationSession).filter(
+                models.ConversationSession.bot_public_id == key[0],
+                models.ConversationSession.session_id == key[1]
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+# ============================================================================
+# SUMMARIZERS
+# ============================================================================
+def format_turns(turns: List[Turn]) -> str:
+    return "\n".join(f"{'User' if t.role == 'user' else 'Assistant'}: {t.content}" for t in turns)
+
+
+def extractive_summary(summary: str, turns: List[Turn], max_tokens: int) -> str:
+    """No-LLM fallback: keep the first sentence of every folded turn, newest last"""
+    lines = [summary] if summary else []
+    for turn in turns:
+        first = re.split(r"(?<=[.!?])\s", turn.content.strip(), maxsplit=1)[0]
+        lines.append(f"{'User' if turn.role == 'user' else 'Assistant'}: {first}")
+    return truncate_tokens(" ".join(lines), max_tokens, keep="tail")
+
+
+def llm_summary(summary: str, turns: List[Turn], max_tokens: int) -> str:
+    """Rolling summary with the chat model; falls back to extractive on error"""
+    try:
+        llm = ChatGoogleGenerativeAI(
+            model="gemini-2.5-flash",
+            temperature=0.0,
+            google_api_key=settings.GOOGLE_API_KEY,
+            transport="rest"
+        )
+        prompt = (
+            f"Update the running summary of a support conversation in at most {max_tokens} words. "
+            "Keep names, numbers and what the user is asking about. Output only the summary.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\n"
+            f"New turns:\n{format_turns(turns)}"
+        )
+        return truncate_tokens(llm.invoke(prompt).content.strip(), max_tokens)
+    except Exception as e:
+        logger.warning(f"LLM summary failed, using extractive summary: {e}")
+        return extractive_summary(summary, turns, max_tokens)
+
+
+SUMMARIZERS = {"llm": llm_summary, "extractive": extractive_summary}
+
+
+# ============================================================================
+# MEMORY
+# ============================================================================
+class ConversationMemory:
+    def __init__(
+        self,
+        store: Optional[MemoryStore] = None,
+        persistent: Optional[DatabaseStore] = None,
+        history_tokens: int = MEMORY_HISTORY_TOKENS,
+        summary_tokens: int = MEMORY_SUMMARY_TOKENS,
+        summarizer: Optional[Callable[[str, List[Turn], int], str]] = None
+    ):
+        self.store = store or MemoryStore()
+        self.persistent = persistent
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer or SUMMARIZERS.get(MEMORY_SUMMARIZER, extractive_summary)
+        self._lock = threading.RLock()
+        self._compacting: Set[Tuple[str, str]] = set()
+
+    def get(self, bot_id: str, session_id: str) -> Conversation:
+        """The session's conversation; a new one is only stored once record_turn saves it"""
+        key = (bot_id, session_id)
+        conversation = self.store.get(key)
+        if conversation is not None:
+            return conversation
+        if self.persistent:
+            try:
+                conversation = self.persistent.load(key)
+            except Exception as e:
+                logger.warning(f"Could not load session {session_id}: {e}")
+        if conversation is None:
+            return Conversation(bot_id=bot_id, session_id=session_id)
+        self.store.put(conversation)
+        return conversation
+
+    def _save(self, conversation: Conversation):
+        conversation.updated_at = time.time()
+        self.store.put(conversation)
+        if self.persistent:
+            try:
+                self.persistent.save(conversation)
+            except Exception as e:
+                logger.warning(f"Could not persist session {conversation.session_id}: {e}")
+
+    # ------------------------------------------------------------ prompting
+    def history_text(self, conversation: Conversation) -> str:
+        """Summary + newest turns within the token budget (empty for a new session)"""
+        window, used = [], 0
+        for turn in reversed(conversation.turns):
+            if used + turn.tokens > self.history_tokens:
+                break
+            window.append(turn)
+            used += turn.tokens
+        window.reverse()
+
+        parts = []
+        if conversation.summary:
+            parts.append(f"Earlier in this conversation: {conversation.summary}")
+        if window:
+            parts.append(format_turns(window))
+        return "\n".join(parts)
+
+    def retrieval_query(self, conversation: Conversation, message: str) -> str:
+        """Standalone query for retrieval: follow-ups carry the previous topic along"""
+        previous = conversation.retrieval_query
+        if not previous and conversation.turns:
+            previous = next((t.content for t in reversed(conversation.turns) if t.role == "user"), None)
+        if not previous or not FOLLOW_UP.search(message):
+            return message
+
+        budget = max(REWRITE_MAX_TOKENS - count_tokens(message), 0)
+        return f"{truncate_tokens(previous, budget)} {message}".strip() if budget else message
+
+    # ------------------------------------------------------------- updates
+    def record_turn(self, bot_id: str, session_id: str, message: str, answer: str) -> Conversation:
+        with self._lock:
+            conversation = self.get(bot_id, session_id)
+            conversation.retrieval_query = self.retrieval_query(conversation, message)
+            conversation.turns.append(Turn("user", message))
+            conversation.turns.append(Turn("assistant", answer))
+            self._save(conversation)
+            return conversation
+
+    def compact(self, bot_id: str, session_id: str) -> bool:
+        """Fold the oldest turns into the summary until the window fits the budget"""
+        key = (bot_id, session_id)
+        with self._lock:
+            # One compaction per session at a time: a second one would fold the same turns again
+            if key in self._compacting:
+                return False
+            conversation = self.get(bot_id, session_id)
+            folded, tokens = 0, conversation.window_tokens
+            while folded < len(conversation.turns) and tokens > self.history_tokens:
+                tokens -= conversation.turns[folded].tokens
+                folded += 1
+            if not folded:
+                return False
+            turns, summary = conversation.turns[:folded], conversation.summary
+            self._compacting.add(key)
+
+        try:
+            # Summarize outside the lock; turns appended meanwhile stay after the folded ones
+            new_summary = self.summarizer(summary, turns, self.summary_tokens)
+
+            with self._lock:
+                # Forgotten or reloaded meanwhile: the folded turns are no longer this session's
+                if self.store.get(key) is not conversation or conversation.turns[:folded] != turns:
+                    return False
+                conversation.summary = new_summary
+                del conversation.turns[:folded]
+                self._save(conversation)
+            return True
+        finally:
+            with self._lock:
+                self._compacting.discard(key)
+
+    def forget(self, bot_id: str, session_id: str):
+        key = (bot_id, session_id)
+        with self._lock:
+            self.store.delete(key)
+            if self.persistent:
+                self.persistent.delete(key)
+
+    def purge_expired(self) -> int:
+        """Drop idle in-memory sessions and persisted ones past MEMORY_PERSIST_TTL_SECONDS"""
+        removed = self.store.purge_expired()
+        if self.persistent:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=MEMORY_PERSIST_TTL_SECONDS)
+            db = SessionLocal()
+            try:
+                removed += db.query(models.ConversationSession).filter(
+                    models.ConversationSession.updated_at < cutoff
+                ).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+        return removed
+
+
+_memory: Optional[ConversationMemory] = None
+
+
+def get_memory() -> ConversationMemory:
+    """Process-wide memory (persistent store enabled by CONVERSATION_STORE=database)"""
+    global _memory
+    if _memory is None:
+        _memory = ConversationMemory(
+            persistent=DatabaseStore() if CONVERSATION_STORE == "database" else None
+        )
+    return _memory
@@ -0,0 +1,464 @@
+"""
+Crawl Jobs
+==========
+Background website scrapes that survive restarts.
+
+POST /scrape/website/async creates a crawl_jobs row. A runner (this
+process, or any replica polling the table) claims it and runs an ordinary
+scrape_website with a CrawlFrontier:
+
+- Frontier: every URL the job has queued or visited is a crawl_frontier row
+  (pending -> fetched -> done / failed). On start the runner reloads it:
+  pending and fetched-but-unfinished URLs become the crawler's queue (in BFS
+  order) and every known URL its visited set, so a resumed job neither loses
+  nor repeats work.
+- Checkpoints: new URLs and state changes are buffered in memory and written
+  every CRAWL_CHECKPOINT_SECONDS, together with the changed crawl state and the
+  job's counters and heartbeat. A page is only marked done once its chunks are
+  stored, so a crash costs at most a re-fetch of the pages in flight.
+- Control: pause / cancel set stop_requested; the runner sees it at its next
+  checkpoint, lets in-flight pages finish and stops. Resume re-queues the job.
+- Claiming is one UPDATE ... WHERE on queued jobs, or on running jobs whose
+  heartbeat is older than CRAWL_JOB_STALE_SECONDS (their worker died), so a job
+  runs on exactly one worker at a time.
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from db import crud, models
+from db.database import SessionLocal
+from services.crawler import FetchResult
+
+logger = logging.getLogger("CrawlJobs")
+
+CRAWL_JOB_WORKERS = int(os.getenv("CRAWL_JOB_WORKERS", "2"))
+CRAWL_JOB_POLL_SECONDS = int(os.getenv("CRAWL_JOB_POLL_SECONDS", "30"))
+CRAWL_JOB_STALE_SECONDS = int(os.getenv("CRAWL_JOB_STALE_SECONDS", "300"))
+CRAWL_CHECKPOINT_SECONDS = float(os.getenv("CRAWL_CHECKPOINT_SECONDS", "10"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+UPDATE_BATCH = 500
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands back naive datetimes
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# ============================================================================
+# FRONTIER
+# ============================================================================
+class CrawlFrontier:
+    """
+    The persisted queue and visited set of one job.
+
+    record_fetch / settle are crawler and pipeline hooks (any thread); they
+    only touch memory. checkpoint() writes what changed since the last one.
+    """
+
+    def __init__(self, job_id: str, max_pages: int, max_depth: int, worker_id: str = WORKER_ID):
+        self.job_id = job_id
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.worker_id = worker_id
+        self.state = None  # CrawlState of the running scrape, checkpointed along
+        self.queue: List[Tuple[str, int]] = []
+        self.known: Set[str] = set()
+        self.done = 0
+        self.stop_requested: Optional[str] = None  # "pause", "cancel", or "lost" (claimed elsewhere)
+        self._new: List[Tuple[str, int]] = []
+        self._states: Dict[str, str] = {}
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def load(self):
+        db = SessionLocal()
+        try:
+            for row in crud.get_crawl_frontier(db, self.job_id):
+                self.known.add(row.url)
+                if row.state in ("pending", "fetched"):
+                    self.queue.append((row.url, row.depth))
+                elif row.state == "done":
+                    self.done += 1
+        finally:
+            db.close()
+
+    @property
+    def started(self) -> bool:
+        return bool(self.known)
+
+    @property
+    def remaining(self) -> int:
+        """Pages left of the job's max_pages budget"""
+        return max(self.max_pages - self.done, 0)
+
+    def should_stop(self) -> bool:
+        return self.stop_requested is not None
+
+    def seed(self, urls: List[str], max_depth: int):
+        """First run: queue the start URLs (max_depth as the scrape method resolved it)"""
+        self.max_depth = max_depth
+        with self._lock:
+            for url in urls:
+                if url not in self.known:
+                    self.known.add(url)
+                    self.queue.append((url, 0))
+                    self._new.append((url, 0))
+
+    # ------------------------------------------------------------- hooks
+    def record_fetch(self, page: FetchResult):
+        """Crawler callback: page state plus the new URLs it leads to"""
+        with self._lock:
+            if page.ok:
+                self._states[page.url] = "fetched"
+            elif page.not_modified:
+                self._states[page.url] = "done"
+                self._counts["unchanged"] += 1
+            else:
+                self._states[page.url] = "failed"
+                self._counts["failed"] += 1
+
+            if page.depth < self.max_depth:
+                for link in page.links:
+                    if link not in self.known:
+                        self.known.add(link)
+                        self._new.append((link, page.depth + 1))
+
+    def settle(self, url: str, outcome: str):
+        """ScrapePipeline on_settled: the page is finished"""
+        with self._lock:
+            self._states[url] = "failed" if outcome == "failed" else "done"
+            self._counts[outcome] += 1
+
+    # ------------------------------------------------------------- persistence
+    def checkpoint(self):
+        """Write buffered changes, heartbeat, and pick up pause / cancel requests"""
+        with self._write_lock:
+            with self._lock:
+                new, self._new = self._new, []
+                states, self._states = self._states, {}
+                counts, self._counts = self._counts, Counter()
+
+            # Crawl state first: a page must never be "done" without its content hash stored
+            if self.state is not None:
+                self.state.checkpoint()
+
+            db = SessionLocal()
+            try:
+                job = db.query(models.CrawlJob).filter(models.CrawlJob.id == self.job_id).first()
+                if job is None or job.worker_id != self.worker_id:
+                    logger.warning(f"Job {self.job_id} is no longer ours; stopping")
+                    self.stop_requested = "lost"
+                    return
+
+                if new:
+                    db.bulk_insert_mappings(models.CrawlFrontierEntry, [
+                        {"job_id": self.job_id, "url": url, "depth": depth, "state": "pending"}
+                        for url, depth in new
+                    ])
+                by_state = defaultdict(list)
+                for url, state in states.items():
+                    by_state[state].append(url)
+                for state, urls in by_state.items():
+                    for start in range(0, len(urls), UPDATE_BATCH):
+                        db.query(models.CrawlFrontierEntry).filter(
+                            models.CrawlFrontierEntry.job_id == self.job_id,
+                            models.CrawlFrontierEntry.url.in_(urls[start:start + UPDATE_BATCH])
+                        ).update({"state": state}, synchronize_session=False)
+
+                job.pages_ingested += counts["ingested"]
+                job.pages_unchanged += counts["unchanged"]
+                job.pages_duplicates += counts["duplicate"]
+                job.pages_failed += counts["failed"]
+                job.max_depth = self.max_depth
+                job.heartbeat_at = datetime.now(timezone.utc)
+                self.stop_requested = job.stop_requested
+                db.commit()
+
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Checkpoint of job {self.job_id} failed: {e}")
+                # Keep the changes for the next attempt (newer states win)
+                with self._lock:
+                    self._new[:0] = new
+                    self._states = {**states, **self._states}
+                    self._counts.update(counts)
+            finally:
+                db.close()
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+def _summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    summary = {"success": result["success"], "finished_at": datetime.now(timezone.utc).isoformat()}
+    if result["success"]:
+        summary.update({key: result["results"][key] for key in ("successful", "unchanged", "failed")})
+        summary["duplicates"] = len(result["results"]["duplicates"])
+        summary["removed"] = len(result["results"]["removed"])
+        summary["crawl_stats"] = result["results"]["crawl_stats"]
+    else:
+        summary["error"] = result.get("error")
+    return summary
+
+
+def _heartbeat(frontier: CrawlFrontier, stop: threading.Event):
+    while not stop.wait(CRAWL_CHECKPOINT_SECONDS):
+        frontier.checkpoint()
+
+
+def run_job(job_id: str) -> Optional[str]:
+    """
+    Claim and run a job until it finishes, is paused / cancelled, or fails.
+    Returns the job's final status, or None if another worker has it.
+    """
+    from services.web_scraping_service import WebScrapingService
+
+    db = SessionLocal()
+    try:
+        now = datetime.now(timezone.utc)
+        if not crud.claim_crawl_job(db, job_id, WORKER_ID, now, now - timedelta(seconds=CRAWL_JOB_STALE_SECONDS)):
+            return None
+
+        job = db.query(models.CrawlJob).filter(models.CrawlJob.id == job_id).first()
+        job.started_at = now
+        job.error = None
+        db.commit()
+
+        bot = crud.get_bot_by_public_id(db, job.bot_public_id)
+        if not bot:
+            job.status, job.error, job.finished_at = "failed", "Bot not found", now
+            db.commit()
+            return job.status
+
+        frontier = CrawlFrontier(job.id, job.max_pages, job.max_depth)
+        frontier.load()
+        logger.info(f"Running crawl job {job.id} ({len(frontier.queue)} queued, {frontier.done} done)")
+
+        stop = threading.Event()
+        ticker = threading.Thread(target=_heartbeat, args=(frontier, stop), name="crawl-job-heartbeat", daemon=True)
+        ticker.start()
+        try:
+            result = WebScrapingService.scrape_website(
+                bot_id=bot.id,
+                start_url=job.start_url,
+                method=job.method,
+                db=db,
+                max_pages=job.max_pages,
+                max_depth=job.max_depth,
+                force=job.force,
+                frontier=frontier
+            )
+        finally:
+            stop.set()
+            ticker.join()
+        frontier.checkpoint()
+
+        if frontier.stop_requested == "lost":
+            return None
+
+        db.expire_all()
+        job = db.query(models.CrawlJob).filter(models.CrawlJob.id == job_id).first()
+        now = datetime.now(timezone.utc)
+        if frontier.stop_requested == "cancel":
+            job.status = "cancelled"
+        elif frontier.stop_requested == "pause":
+            job.status = "paused"
+        elif result["success"]:
+            job.status = "completed"
+        else:
+            # Frontier kept: resuming continues where the job stopped
+            job.status, job.error = "failed", result.get("error")
+
+        job.result = json.dumps(_summary(result))
+        job.stop_requested = None
+        job.heartbeat_at = now
+        if job.status != "paused":
+            job.finished_at = now
+        db.commit()
+
+        if job.status in ("completed", "cancelled"):
+            crud.delete_crawl_frontier(db, job_id)
+
+        logger.info(f"Crawl job {job_id} {job.status}")
+        return job.status
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Crawl job {job_id} failed: {e}", exc_info=True)
+        job = db.query(models.CrawlJob).filter(models.CrawlJob.id == job_id).first()
+        if job is not None and job.worker_id == WORKER_ID:
+            job.status, job.error = "failed", str(e)
+            job.finished_at = datetime.now(timezone.utc)
+            db.commit()
+        return "failed"
+    finally:
+        db.close()
+
+
+# ============================================================================
+# CONTROL
+# ============================================================================
+def _refreshed(db: Session, job: models.CrawlJob) -> models.CrawlJob:
+    db.refresh(job)
+    return job
+
+
+def pause(db: Session, job: models.CrawlJob) -> models.CrawlJob:
+    # Conditional updates: the job may be claimed or finish between read and write
+    if not (
+        crud.transition_crawl_job(db, job.id, ["running"], {"stop_requested": "pause"})
+        or crud.transition_crawl_job(db, job.id, ["queued"], {"status": "paused"})
+    ):
+        raise ValueError(f"Cannot pause a {_refreshed(db, job).status} job")
+    return _refreshed(db, job)
+
+
+def cancel(db: Session, job: models.CrawlJob) -> models.CrawlJob:
+    if crud.transition_crawl_job(db, job.id, ["running"], {"stop_requested": "cancel"}):
+        return _refreshed(db, job)
+    if not crud.transition_crawl_job(
+        db, job.id, ["queued", "paused", "failed"],
+        {"status": "cancelled", "finished_at": datetime.now(timezone.utc)}
+    ):
+        raise ValueError(f"Cannot cancel a {_refreshed(db, job).status} job")
+    crud.delete_crawl_frontier(db, job.id)
+    return _refreshed(db, job)
+
+
+def resume(db: Session, job: models.CrawlJob) -> models.CrawlJob:
+    # Still running: just withdraw a pending pause / cancel
+    if crud.transition_crawl_job(db, job.id, ["running"], {"stop_requested": None}):
+        return _refreshed(db, job)
+    if not crud.transition_crawl_job(
+        db, job.id, ["paused", "failed"],
+        {"status": "queued", "stop_requested": None, "error": None, "finished_at": None}
+    ):
+        raise ValueError(f"Cannot resume a {_refreshed(db, job).status} job")
+    submit(job.id)
+    return _refreshed(db, job)
+
+
+def progress(db: Session, job: models.CrawlJob) -> Dict[str, Any]:
+    """Progress of a job as the API reports it"""
+    frontier = crud.count_crawl_frontier(db, job.id)
+    done = frontier.get("done", 0)
+    started_at = _utc(job.started_at)
+    end = _utc(job.finished_at) or datetime.now(timezone.utc)
+    if job.status == "completed":
+        percent = 100.0
+    else:
+        percent = round(min(done / job.max_pages, 1.0) * 100, 1) if job.max_pages else 0.0
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "stop_requested": job.stop_requested,
+        "start_url": job.start_url,
+        "method": job.method,
+        "max_pages": job.max_pages,
+        "max_depth": job.max_depth,
+        "pages": {
+            "ingested": job.pages_ingested,
+            "unchanged": job.pages_unchanged,
+            "duplicates": job.pages_duplicates,
+            "failed": job.pages_failed,
+        },
+        "frontier": {
+            "pending": frontier.get("pending", 0) + frontier.get("fetched", 0),
+            "visited": done + frontier.get("failed", 0),
+        },
+        "progress": percent,
+        "worker_id": job.worker_id,
+        "heartbeat_at": job.heartbeat_at,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "elapsed_seconds": round((end - started_at).total_seconds(), 2) if started_at else 0.0,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+    }
+
+
+# ============================================================================
+# WORKERS
+# ============================================================================
+_executor: Optional[ThreadPoolExecutor] = None
+_submitted: Set[str] = set()
+_submit_lock = threading.Lock()
+
+
+def _run_submitted(job_id: str):
+    try:
+        run_job(job_id)
+    finally:
+        with _submit_lock:
+            _submitted.discard(job_id)
+
+
+def submit(job_id: str) -> bool:
+    """Run a job on this process's job workers (a no-op if it is already claimed)"""
+    global _executor
+    with _submit_lock:
+        if job_id in _submitted:
+            return False
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=CRAWL_JOB_WORKERS, thread_name_prefix="crawl-job")
+        _submitted.add(job_id)
+    _executor.submit(_run_submitted, job_id)
+    return True
+
+
+def poll() -> int:
+    """Take queued jobs and jobs of dead workers, up to the free worker slots"""
+    with _submit_lock:
+        free = CRAWL_JOB_WORKERS - len(_submitted)
+    if free <= 0:
+        return 0
+
+    db = SessionLocal()
+    try:
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=CRAWL_JOB_STALE_SECONDS)
+        job_ids = crud.get_claimable_crawl_jobs(db, stale_before, free)
+    finally:
+        db.close()
+    return sum(submit(job_id) for job_id in job_ids)
+
+
+_poller: Optional[threading.Thread] = None
+
+
+def _poller_loop():
+    while True:
+        try:
+            poll()
+        except Exception as e:
+            logger.error(f"Crawl job poll failed: {e}", exc_info=True)
+        time.sleep(CRAWL_JOB_POLL_SECONDS)
+
+
+def start_job_worker() -> bool:
+    """Start polling for crawl jobs (no-op if disabled or already running)"""
+    global _poller
+
+    if CRAWL_JOB_POLL_SECONDS <= 0 or (_poller and _poller.is_alive()):
+        return False
+
+    _poller = threading.Thread(target=_poller_loop, name="crawl-job-poller", daemon=True)
+    _poller.start()
+    logger.info(f"Crawl job worker {WORKER_ID} started (polling every {CRAWL_JOB_POLL_SECONDS}s)")
+    return True
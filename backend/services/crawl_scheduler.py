@@ -0,0 +1,132 @@
+"""
+Crawl Scheduler
+===============
+Keeps scraped sites current.
+
+A website scrape can ask to be repeated every N hours (crawl_schedules).
+A daemon thread wakes every CRAWL_REFRESH_POLL_SECONDS (0 disables it) and
+runs the due schedules one after another. Each run is an ordinary incremental
+scrape (services/crawl_state.py), so a refresh of a large documentation site
+mostly costs conditional GETs: only pages that changed are downloaded,
+extracted and embedded again.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from db import crud, models
+from db.database import SessionLocal
+
+logger = logging.getLogger("CrawlScheduler")
+
+CRAWL_REFRESH_POLL_SECONDS = int(os.getenv("CRAWL_REFRESH_POLL_SECONDS", "300"))
+CRAWL_REFRESH_MIN_HOURS = int(os.getenv("CRAWL_REFRESH_MIN_HOURS", "1"))
+
+
+def schedule_refresh(
+    db: Session,
+    bot_public_id: str,
+    start_url: str,
+    method: str,
+    max_pages: int,
+    max_depth: int,
+    interval_hours: int
+) -> models.CrawlSchedule:
+    """Refresh a site every interval_hours, starting one interval from now"""
+    interval_hours = max(interval_hours, CRAWL_REFRESH_MIN_HOURS)
+    return crud.upsert_crawl_schedule(
+        db, bot_public_id, start_url, method, max_pages, max_depth, interval_hours,
+        next_run_at=datetime.now(timezone.utc) + timedelta(hours=interval_hours)
+    )
+
+
+def run_schedule(db: Session, schedule: models.CrawlSchedule) -> Dict[str, Any]:
+    """Run one refresh and move the schedule to its next slot"""
+    from services.web_scraping_service import WebScrapingService
+
+    bot = crud.get_bot_by_public_id(db, schedule.bot_public_id)
+    if not bot:
+        # Bot deleted since the schedule was made
+        db.delete(schedule)
+        db.commit()
+        return {"success": False, "error": "Bot not found"}
+
+    logger.info(f"Refreshing {schedule.start_url} for {schedule.bot_public_id}")
+    result = WebScrapingService.scrape_website(
+        bot_id=bot.id,
+        start_url=schedule.start_url,
+        method=schedule.method,
+        db=db,
+        max_pages=schedule.max_pages,
+        max_depth=schedule.max_depth
+    )
+
+    now = datetime.now(timezone.utc)
+    summary = {"success": result["success"], "finished_at": now.isoformat()}
+    if result["success"]:
+        summary.update({
+            key: result["results"][key]
+            for key in ("successful", "unchanged", "failed")
+        })
+        summary["duplicates"] = len(result["results"]["duplicates"])
+        summary["removed"] = len(result["results"]["removed"])
+    else:
+        summary["error"] = result.get("error")
+
+    schedule.last_run_at = now
+    schedule.next_run_at = now + timedelta(hours=schedule.interval_hours)
+    schedule.last_result = json.dumps(summary)
+    db.commit()
+    return summary
+
+
+def run_due() -> int:
+    """Run every schedule whose time has come; returns how many ran"""
+    db = SessionLocal()
+    ran = 0
+    try:
+        for schedule in crud.get_due_crawl_schedules(db, datetime.now(timezone.utc)):
+            try:
+                run_schedule(db, schedule)
+                ran += 1
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Refresh of {schedule.start_url} failed: {e}", exc_info=True)
+    finally:
+        db.close()
+    return ran
+
+
+# ============================================================================
+# BACKGROUND THREAD
+# ============================================================================
+_refresher: Optional[threading.Thread] = None
+
+
+def _refresher_loop():
+    while True:
+        time.sleep(CRAWL_REFRESH_POLL_SECONDS)
+        try:
+            run_due()
+        except Exception as e:
+            logger.error(f"Refresh pass failed: {e}", exc_info=True)
+
+
+def start_refresher() -> bool:
+    """Start the periodic refresher (no-op if disabled or already running)"""
+    global _refresher
+
+    if CRAWL_REFRESH_POLL_SECONDS <= 0 or (_refresher and _refresher.is_alive()):
+        return False
+
+    _refresher = threading.Thread(target=_refresher_loop, name="crawl-refresher", daemon=True)
+    _refresher.start()
+    logger.info(f"Crawl refresher started (polling every {CRAWL_REFRESH_POLL_SECONDS}s)")
+    return True
@@ -0,0 +1,302 @@
+"""
+Crawl State
+===========
+Makes website recrawls incremental.
+
+For every URL a bot has scraped, crawl_page_states keeps the validators the
+server sent (ETag / Last-Modified), a hash of the extracted text, the page's
+outgoing links and its knowledge source (whose chunk IDs live in the source
+manifest). A recrawl then:
+
+1. Sends conditional GETs; a 304 page is neither downloaded nor extracted,
+   and its stored links keep the crawl going below it.
+2. Skips pages that came back 200 with the same extracted text (servers
+   without validators, or pages that only changed markup).
+3. Re-ingests changed pages under their old source name, so the manifest
+   replaces exactly that page's chunks. New validators (like the new hash)
+   are only stored once the page is ingested or found unchanged, so a
+   failed re-ingest is retried by the next crawl instead of answered 304.
+4. Drops pages whose text nearly duplicates another page of the bot
+   (SimHash, services/dedup.py) before embedding; if such a page had been
+   ingested earlier, its chunks are deleted.
+5. Deletes the sources of pages that are gone (404 / 410), and the old
+   source of a page re-ingested under a new source name.
+
+State is loaded once per job and written back in one transaction at the end.
+Background crawl jobs also checkpoint() the pages changed so far, so a job
+resumed after a restart does not lose what it already ingested.
+"""
+
+import json
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from db import crud, models
+from db.database import SessionLocal
+from services import dedup
+from services.crawler import FetchResult
+
+logger = logging.getLogger("CrawlState")
+
+GONE_STATUSES = {404, 410}
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class PageState:
+    url: str
+    source: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    links: List[str] = field(default_factory=list)
+    status: Optional[int] = None
+    simhash: Optional[int] = None
+    duplicate_of: Optional[str] = None  # URL of the page this one nearly duplicates
+    last_crawled_at: Optional[datetime] = None
+    last_changed_at: Optional[datetime] = None
+
+
+class CrawlState:
+    """
+    One bot's crawl state for the duration of a scrape job.
+
+    Args:
+        bot_id: Bot public_id
+        force: Ignore stored validators and hashes (full re-scrape), but still record new ones
+    """
+
+    def __init__(self, bot_id: str, force: bool = False):
+        self.bot_id = bot_id
+        self.force = force
+        self.pages: Dict[str, PageState] = {}
+        self.gone: Set[str] = set()
+        self.superseded: Set[str] = set()  # ingested before, now near-duplicates
+        self.renamed: Set[str] = set()  # old sources of pages re-ingested under a new name
+        self.duplicates: List[Dict[str, object]] = []
+        self.index = dedup.NearDuplicateIndex()
+        self._pending: Dict[str, Tuple[str, str, Optional[int]]] = {}  # url -> (source, hash, simhash) awaiting ingestion
+        self._fetched: Dict[str, Tuple[Optional[str], Optional[str]]] = {}  # url -> (etag, last_modified) of a 200 not yet ingested
+        self._dirty: Set[str] = set()  # changed since the last checkpoint
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        db = SessionLocal()
+        try:
+            for row in crud.get_crawl_states(db, self.bot_id):
+                self.pages[row.url] = PageState(
+                    url=row.url,
+                    source=row.source,
+                    etag=row.etag,
+                    last_modified=row.last_modified,
+                    content_hash=row.content_hash,
+                    links=json.loads(row.links) if row.links else [],
+                    status=row.status,
+                    simhash=int(row.simhash, 16) if row.simhash else None,
+                    duplicate_of=row.duplicate_of,
+                    last_crawled_at=row.last_crawled_at,
+                    last_changed_at=row.last_changed_at,
+                )
+                page = self.pages[row.url]
+                if page.simhash is not None and page.source and not page.duplicate_of:
+                    self.index.add(page.url, page.simhash)
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------- crawler hooks
+    def validators(self, url: str) -> Dict[str, str]:
+        """Conditional request headers for a URL"""
+        page = self.pages.get(url)
+        if self.force or page is None or page.content_hash is None:
+            # Never ingested: a 304 would leave the bot without the page
+            return {}
+        headers = {}
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def known_links(self, url: str) -> List[str]:
+        page = self.pages.get(url)
+        return page.links if page else []
+
+    def record_fetch(self, result: FetchResult):
+        """
+        Crawler callback: remember links and status of every fetch. Validators
+        of a 200 wait in _fetched until the page is ingested or found unchanged.
+        """
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            page = self.pages.get(result.url)
+            if result.status in GONE_STATUSES:
+                if page is not None and page.source:
+                    self.gone.add(result.url)
+                return
+            if not (result.ok or result.not_modified):
+                return
+
+            if page is None:
+                page = self.pages[result.url] = PageState(url=result.url)
+            self._dirty.add(result.url)
+            page.status = result.status
+            page.last_crawled_at = now
+            page.links = result.links
+            if result.ok:
+                self._fetched[result.url] = (result.etag, result.last_modified)
+            elif result.etag or result.last_modified:
+                # 304: the stored text is still current
+                page.etag = result.etag or page.etag
+                page.last_modified = result.last_modified or page.last_modified
+
+    # ------------------------------------------------------------- pipeline hooks
+    def skip_reason(self, url: str, source: str, content: str) -> Optional[str]:
+        """
+        ScrapePipeline skip check: "unchanged" if the page's text is what is
+        already ingested, "duplicate" if it nearly duplicates another page.
+        """
+        digest = content_hash(content)
+        with self._lock:
+            page = self.pages.get(url)
+            if not self.force and page and page.content_hash == digest and page.source == source:
+                self._apply_validators(page)
+                return "unchanged"
+
+            fingerprint = dedup.simhash(content) if dedup.SCRAPE_DEDUP else None
+            match = self.index.find(fingerprint, exclude=url) if fingerprint is not None else None
+            if match:
+                canonical, bits = match
+                if page is not None:
+                    page.simhash, page.duplicate_of = fingerprint, canonical
+                    self._dirty.add(url)
+                    if page.source:
+                        self.superseded.add(url)
+                self.index.remove(url)
+                self._fetched.pop(url, None)
+                self.duplicates.append({"url": url, "duplicate_of": canonical, "distance": bits})
+                return "duplicate"
+
+            if fingerprint is not None:
+                # Claimed now, so later copies in this job match this page
+                self.index.add(url, fingerprint)
+            self._pending[url] = (source, digest, fingerprint)
+            return None
+
+    def _apply_validators(self, page: PageState):
+        if page.url in self._fetched:
+            page.etag, page.last_modified = self._fetched.pop(page.url)
+            self._dirty.add(page.url)
+
+    def mark_ingested(self, url: str):
+        """Commit the pending hash and validators of a page once its chunks are in the collection"""
+        with self._lock:
+            pending = self._pending.pop(url, None)
+            page = self.pages.get(url)
+            if pending and page:
+                if page.source and page.source != pending[0]:
+                    self.renamed.add(page.source)
+                page.source, page.content_hash, page.simhash = pending
+                page.duplicate_of = None
+                page.last_changed_at = datetime.now(timezone.utc)
+                self._apply_validators(page)
+                self._dirty.add(url)
+
+    def mark_failed(self, url: str):
+        """Forget what a failed page's fetch brought: the stored hash and validators stay as they were"""
+        with self._lock:
+            self._pending.pop(url, None)
+            self._fetched.pop(url, None)
+
+    # ------------------------------------------------------------- persistence
+    def remove_stale(self) -> List[str]:
+        """
+        Delete the knowledge of pages that no longer exist or turned into
+        near-duplicates; returns their sources
+        """
+        from services import data_ingestion
+
+        removed = []
+        for url in sorted(self.gone):
+            page = self.pages.pop(url)
+            if data_ingestion.delete_bot_source(self.bot_id, page.source):
+                removed.append(page.source)
+        for url in sorted(self.superseded):
+            page = self.pages[url]
+            if data_ingestion.delete_bot_source(self.bot_id, page.source):
+                removed.append(page.source)
+                page.source = page.content_hash = None
+        current = {page.source for page in self.pages.values()}
+        for source in sorted(self.renamed - current):
+            if data_ingestion.delete_bot_source(self.bot_id, source):
+                removed.append(source)
+        return removed
+
+    def _write(self, db, rows: Dict[str, models.CrawlPageState], page: PageState):
+        row = rows.get(page.url)
+        if row is None:
+            row = models.CrawlPageState(bot_public_id=self.bot_id, url=page.url)
+            db.add(row)
+        row.source = page.source
+        row.etag = page.etag
+        row.last_modified = page.last_modified
+        row.content_hash = page.content_hash
+        row.links = json.dumps(page.links)
+        row.status = page.status
+        row.simhash = format(page.simhash, "016x") if page.simhash is not None else None
+        row.duplicate_of = page.duplicate_of
+        row.last_crawled_at = page.last_crawled_at
+        row.last_changed_at = page.last_changed_at
+
+    def checkpoint(self):
+        """Write the pages changed since the last checkpoint"""
+        with self._lock:
+            changed = [replace(self.pages[url]) for url in self._dirty if url in self.pages]
+            self._dirty.clear()
+        if not changed:
+            return
+
+        db = SessionLocal()
+        try:
+            rows = {
+                row.url: row for row in db.query(models.CrawlPageState).filter(
+                    models.CrawlPageState.bot_public_id == self.bot_id,
+                    models.CrawlPageState.url.in_([page.url for page in changed])
+                )
+            }
+            for page in changed:
+                self._write(db, rows, page)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self._dirty.update(page.url for page in changed)
+            logger.error(f"Could not checkpoint crawl state for {self.bot_id}: {e}")
+        finally:
+            db.close()
+
+    def save(self):
+        """Write the state back (one transaction)"""
+        db = SessionLocal()
+        try:
+            rows = {row.url: row for row in crud.get_crawl_states(db, self.bot_id)}
+            for url, row in rows.items():
+                if url not in self.pages:
+                    db.delete(row)
+
+            for page in self.pages.values():
+                self._write(db, rows, page)
+            db.commit()
+            self._dirty.clear()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Could not save crawl state for {self.bot_id}: {e}")
+        finally:
+            db.close()
@@ -0,0 +1,613 @@
+"""
+Async Crawler
+=============
+Concurrent page fetching for the web scraping service.
+
+- One aiohttp session (shared connection pool, DNS cache) per crawl
+- A bounded pool of CRAWL_WORKERS asyncio workers
+- Politeness per host instead of a global sleep: every host has a token
+  bucket (CRAWL_RATE_PER_HOST requests/sec, bursts of CRAWL_BURST) and at
+  most CRAWL_PER_HOST_CONCURRENCY requests in flight. Buckets are shared
+  process-wide, so two crawls of the same site do not double its load,
+  and the blocking RequestsHelper uses the same buckets.
+- Retries 429 / 5xx with exponential backoff (honours Retry-After)
+
+- A per-job PageCache: a page fetched while discovering links is reused
+  for content extraction, so every URL is downloaded once per job
+- Conditional GETs: with `validators`, requests carry If-None-Match /
+  If-Modified-Since; a 304 page is not downloaded and its previously seen
+  links (`known_links`) keep the crawl going
+- Size-capped streaming: bodies are read in chunks and decoded as they
+  arrive; a download stops as soon as it crosses max_bytes, and pages
+  whose Content-Length / Content-Type rule them out are never read
+  (download_stats counts aborts and bytes saved, RequestsHelper included)
+
+Stats report pages/sec as the headline number plus per-host concurrency.
+"""
+
+import os
+import time
+import codecs
+import shutil
+import random
+import hashlib
+import tempfile
+import asyncio
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+logger = logging.getLogger("Crawler")
+
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "4"))
+CRAWL_RATE_PER_HOST = float(os.getenv("CRAWL_RATE_PER_HOST", "4"))
+CRAWL_BURST = int(os.getenv("CRAWL_BURST", "4"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "10"))
+CRAWL_MAX_RETRIES = int(os.getenv("CRAWL_MAX_RETRIES", "3"))
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "BotBlocksBot/1.0 (+https://botblocks.com/bot)")
+CRAWL_CACHE_MEMORY_BYTES = int(os.getenv("CRAWL_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain", ""}  # "": not declared
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+# ============================================================================
+# PER-HOST RATE LIMITING
+# ============================================================================
+class TokenBucket:
+    """
+    Requests/sec limiter with bursts. Callers reserve a token and are told
+    how long to wait for it, so the same bucket serves threads and asyncio.
+    """
+
+    def __init__(self, rate: float = CRAWL_RATE_PER_HOST, capacity: int = CRAWL_BURST):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float, capacity: Optional[int] = None):
+        with self._lock:
+            self.rate = rate
+            if capacity is not None:
+                self.capacity = max(1, capacity)
+                self.tokens = min(self.tokens, self.capacity)
+
+    def reserve(self) -> float:
+        """Take a token; returns the seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate > 0:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0 or self.rate <= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def wait(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def get_bucket(host: str) -> TokenBucket:
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket()
+        return bucket
+
+
+@dataclass
+class HostStats:
+    requests: int = 0  # attempts, retries included
+    errors: int = 0
+    bytes: int = 0
+    in_flight: int = 0
+    peak_concurrency: int = 0
+    wait_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "peak_concurrency": self.peak_concurrency,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+class HostScheduler:
+    """Per-host concurrency caps + token buckets for one crawl"""
+
+    def __init__(self, per_host_concurrency: int = CRAWL_PER_HOST_CONCURRENCY):
+        self.per_host_concurrency = per_host_concurrency
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.hosts: Dict[str, HostStats] = {}
+
+    def stats(self, host: str) -> HostStats:
+        return self.hosts.setdefault(host, HostStats())
+
+    def reset_slots(self):
+        """Semaphores belong to one event loop: fresh ones for every run"""
+        self._semaphores = {}
+
+    async def enter(self, host: str):
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.per_host_concurrency))
+        start = time.monotonic()
+        await semaphore.acquire()
+        await get_bucket(host).acquire()
+
+        stats = self.stats(host)
+        stats.requests += 1
+        stats.wait_seconds += time.monotonic() - start
+        stats.in_flight += 1
+        stats.peak_concurrency = max(stats.peak_concurrency, stats.in_flight)
+
+    def leave(self, host: str):
+        self.stats(host).in_flight -= 1
+        self._semaphores[host].release()
+
+
+# ============================================================================
+# RESULTS
+# ============================================================================
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0
+    html: Optional[str] = None
+    final_url: Optional[str] = None
+    bytes: int = 0
+    seconds: float = 0.0
+    depth: int = 0
+    error: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False
+    links: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.html is not None
+
+
+@dataclass
+class CrawlStats:
+    pages: int = 0
+    errors: int = 0
+    not_modified: int = 0
+    aborted: int = 0
+    bytes: int = 0
+    bytes_saved: int = 0
+    seconds: float = 0.0
+    workers: int = 0
+    cache_hits: int = 0
+    duplicate_fetches: int = 0
+    hosts: Dict[str, HostStats] = field(default_factory=dict)
+    fetched_urls: Set[str] = field(default_factory=set, repr=False)
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pages_per_second": round(self.pages_per_second, 2),
+            "pages": self.pages,
+            "errors": self.errors,
+            "not_modified": self.not_modified,
+            "aborted": self.aborted,
+            "bytes": self.bytes,
+            "bytes_saved": self.bytes_saved,
+            "seconds": round(self.seconds, 2),
+            "workers": self.workers,
+            "cache_hits": self.cache_hits,
+            "duplicate_fetches": self.duplicate_fetches,
+            "hosts": {host: stats.to_dict() for host, stats in self.hosts.items()},
+        }
+
+
+# ============================================================================
+# PAGE CACHE
+# ============================================================================
+class PageCache:
+    """
+    Pages fetched by one job, by URL. HTML is kept in memory up to
+    max_memory_bytes, then spilled to a temp directory removed by close().
+    """
+
+    def __init__(self, max_memory_bytes: int = CRAWL_CACHE_MEMORY_BYTES):
+        self.max_memory_bytes = max_memory_bytes
+        self._pages: Dict[str, FetchResult] = {}
+        self._spilled: Dict[str, str] = {}
+        self._memory = 0
+        self._dir: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def put(self, result: FetchResult):
+        if not result.ok:
+            return
+        with self._lock:
+            size = len(result.html)
+            if self._memory + size > self.max_memory_bytes:
+                self._dir = self._dir or tempfile.mkdtemp(prefix="crawl-cache-")
+                path = os.path.join(self._dir, hashlib.sha1(result.url.encode("utf-8")).hexdigest())
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(result.html)
+                self._spilled[result.url] = path
+                result = replace(result, html=None)
+            else:
+                self._memory += size
+            self._pages[result.url] = result
+            if result.final_url and result.final_url != result.url:
+                self._pages.setdefault(result.final_url, result)
+
+    def get(self, url: str) -> Optional[FetchResult]:
+        with self._lock:
+            result = self._pages.get(url)
+            if result is None or result.html is not None:
+                return result
+            path = self._spilled.get(result.url)
+        if not path:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return replace(result, html=f.read())
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._pages
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def close(self):
+        with self._lock:
+            self._pages.clear()
+            self._spilled.clear()
+            self._memory = 0
+            if self._dir:
+                shutil.rmtree(self._dir, ignore_errors=True)
+                self._dir = None
+
+
+# ============================================================================
+# CRAWLER
+# ============================================================================
+LinkExtractor = Callable[[str, str], Iterable[str]]
+PageCallback = Callable[[FetchResult], None]
+
+
+# ============================================================================
+# SIZE-CAPPED DOWNLOADS
+# ============================================================================
+class DownloadAborted(Exception):
+    """A body was not (fully) read: too large, or not a page"""
+
+    def __init__(self, reason: str, bytes_saved: int = 0):
+        super().__init__(reason)
+        self.reason = reason
+        self.bytes_saved = bytes_saved
+
+
+def precheck(content_type: Optional[str], content_length: Optional[int], max_bytes: Optional[int]):
+    """Raise DownloadAborted before reading a body the headers already rule out"""
+    mimetype = (content_type or "").split(";")[0].strip().lower()
+    if mimetype not in HTML_CONTENT_TYPES:
+        raise DownloadAborted(f"unsupported content type {mimetype}", content_length or 0)
+    if max_bytes and content_length and content_length > max_bytes:
+        raise DownloadAborted("content too large", content_length)
+
+
+class BodyReader:
+    """
+    Decodes a body chunk by chunk, stopping at max_bytes. Only the decoded
+    text is kept, so an aborted download never holds more than the cap.
+    """
+
+    def __init__(self, charset: Optional[str], max_bytes: Optional[int] = None, content_length: Optional[int] = None):
+        try:
+            self.decoder = codecs.getincrementaldecoder(charset or "utf-8")(errors="replace")
+        except LookupError:
+            self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.max_bytes = max_bytes
+        self.content_length = content_length
+        self.bytes = 0
+        self.parts: List[str] = []
+
+    def feed(self, chunk: bytes):
+        if not self.bytes and b"\0" in chunk[:1024]:
+            # Binary served as text/html (or without a type)
+            raise DownloadAborted("binary content", max(0, (self.content_length or 0) - len(chunk)))
+        self.bytes += len(chunk)
+        if self.max_bytes and self.bytes > self.max_bytes:
+            raise DownloadAborted("content too large", max(0, (self.content_length or 0) - self.bytes))
+        self.parts.append(self.decoder.decode(chunk))
+
+    def text(self) -> str:
+        self.parts.append(self.decoder.decode(b"", final=True))
+        return "".join(self.parts)
+
+
+class DownloadStats:
+    """Process-wide abort counters (async crawler and RequestsHelper)"""
+
+    def __init__(self):
+        self.aborted: Dict[str, int] = {}
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, error: DownloadAborted):
+        with self._lock:
+            self.aborted[error.reason] = self.aborted.get(error.reason, 0) + 1
+            self.bytes_saved += error.bytes_saved
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "aborted": sum(self.aborted.values()),
+                "aborted_by_reason": dict(self.aborted),
+                "bytes_saved": self.bytes_saved,
+            }
+
+
+download_stats = DownloadStats()
+
+
+class AsyncCrawler:
+    """Bounded worker pool over one shared aiohttp session"""
+
+    def __init__(
+        self,
+        workers: int = CRAWL_WORKERS,
+        per_host_concurrency: int = CRAWL_PER_HOST_CONCURRENCY,
+        timeout: float = CRAWL_TIMEOUT,
+        max_retries: int = CRAWL_MAX_RETRIES,
+        max_bytes: Optional[int] = None,
+        user_agent: str = CRAWL_USER_AGENT,
+        cache: Optional[PageCache] = None,
+        validators: Optional[Callable[[str], Dict[str, str]]] = None,
+        known_links: Optional[Callable[[str], Iterable[str]]] = None
+    ):
+        self.workers = workers
+        self.per_host_concurrency = per_host_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_bytes = max_bytes
+        self.user_agent = user_agent
+        self.cache = cache
+        self.validators = validators
+        self.known_links = known_links
+        self.stats = CrawlStats(workers=workers)
+        self.scheduler = HostScheduler(per_host_concurrency)
+
+    def _session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.workers,
+            limit_per_host=self.per_host_concurrency,
+            ttl_dns_cache=300
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": self.user_agent}
+        )
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str, depth: int = 0) -> FetchResult:
+        """Download a page, or serve it from the job's PageCache"""
+        cached = self.cache.get(url) if self.cache else None
+        if cached is not None:
+            self.stats.cache_hits += 1
+            return replace(cached, depth=depth)
+
+        if url in self.stats.fetched_urls:
+            self.stats.duplicate_fetches += 1
+        self.stats.fetched_urls.add(url)
+
+        host = host_of(url)
+        result = FetchResult(url=url, depth=depth)
+        headers = self.validators(url) if self.validators else None
+        start_time = time.monotonic()
+
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.enter(host)
+            retry_after = None
+            try:
+                async with session.get(url, headers=headers, allow_redirects=True) as response:
+                    result.status = response.status
+                    result.final_url = str(response.url)
+                    result.etag = response.headers.get("ETag")
+                    result.last_modified = response.headers.get("Last-Modified")
+                    if response.status == 304:
+                        result.not_modified = True
+                        break
+                    if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                        retry_after = response.headers.get("Retry-After")
+                    else:
+                        response.raise_for_status()
+                        precheck(response.headers.get("Content-Type"), response.content_length, self.max_bytes)
+                        reader = BodyReader(response.charset, self.max_bytes, response.content_length)
+                        try:
+                            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                                reader.feed(chunk)
+                        finally:
+                            result.bytes = reader.bytes
+                        result.html = reader.text()
+                        break
+            except DownloadAborted as e:
+                # Leaving the response unread closes its connection: nothing more is transferred
+                result.error = e.reason
+                self.stats.aborted += 1
+                self.stats.bytes_saved += e.bytes_saved
+                download_stats.record(e)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                result.error = str(e) or type(e).__name__
+                if isinstance(e, aiohttp.ClientResponseError) or attempt >= self.max_retries:
+                    break
+            finally:
+                self.scheduler.leave(host)
+
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, 0.25))
+
+        if result.ok:
+            result.error = None
+
+        result.seconds = time.monotonic() - start_time
+        stats = self.scheduler.stats(host)
+        stats.bytes += result.bytes
+        self.stats.bytes += result.bytes
+        if result.ok:
+            self.stats.pages += 1
+            if self.cache is not None:
+                self.cache.put(result)
+        elif result.not_modified:
+            self.stats.not_modified += 1
+        else:
+            stats.errors += 1
+            self.stats.errors += 1
+            logger.error(f"Failed to fetch {url}: {result.error or result.status}")
+        return result
+
+    async def _run(
+        self,
+        seeds: List[Tuple[str, int]],
+        max_pages: int,
+        max_depth: int,
+        link_extractor: Optional[LinkExtractor],
+        on_page: Optional[PageCallback] = None,
+        visited: Iterable[str] = (),
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> List[FetchResult]:
+        queue: Deque[Tuple[str, int]] = deque(seeds)
+        seen: Set[str] = {url for url, _ in seeds}
+        seen.update(visited)
+        results: List[FetchResult] = []
+        wakeup = asyncio.Condition()
+        active = 0
+        self.scheduler.reset_slots()
+        # Host stats accumulate in self.stats over every run (stats may be shared between crawlers)
+        self.scheduler.hosts = self.stats.hosts
+
+        async with self._session() as session:
+
+            async def worker():
+                nonlocal active
+                while True:
+                    async with wakeup:
+                        # Wait for work; stop once the queue is empty and nobody can add more
+                        while not queue and active and len(results) < max_pages:
+                            await wakeup.wait()
+                        if not queue or len(results) + active >= max_pages or (should_stop and should_stop()):
+                            wakeup.notify_all()
+                            return
+                        url, depth = queue.popleft()
+                        active += 1
+
+                    result = await self.fetch(session, url, depth)
+                    if result.ok and link_extractor:
+                        # Parsing is CPU work: keep the event loop free for other fetches
+                        result.links = list(await asyncio.to_thread(link_extractor, result.final_url or url, result.html))
+                    elif result.not_modified and self.known_links:
+                        result.links = list(self.known_links(url))
+                    if on_page:
+                        # May block (bounded pipeline queue): backpressure without stalling the loop
+                        await asyncio.to_thread(on_page, result)
+
+                    async with wakeup:
+                        active -= 1
+                        if result.ok or result.not_modified:
+                            results.append(result)
+                        for link in (result.links if depth < max_depth else ()):
+                            if link not in seen:
+                                seen.add(link)
+                                queue.append((link, depth + 1))
+                        wakeup.notify_all()
+
+            start_time = time.monotonic()
+            await asyncio.gather(*(worker() for _ in range(self.workers)))
+            self.stats.seconds += time.monotonic() - start_time
+
+        return results
+
+    async def crawl(
+        self,
+        start_url: str,
+        max_depth: int,
+        max_pages: int,
+        link_extractor: LinkExtractor,
+        on_page: Optional[PageCallback] = None
+    ) -> List[FetchResult]:
+        """
+        Breadth-first crawl from start_url; returns fetched (or unchanged) pages.
+        on_page is called with every result, failures included, as soon as it is fetched.
+        """
+        return await self._run([(start_url, 0)], max_pages, max_depth, link_extractor, on_page)
+
+    async def resume(
+        self,
+        frontier: List[Tuple[str, int]],
+        visited: Iterable[str],
+        max_depth: int,
+        max_pages: int,
+        link_extractor: LinkExtractor,
+        on_page: Optional[PageCallback] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> List[FetchResult]:
+        """
+        Continue a crawl from a saved frontier of (url, depth). URLs in visited
+        are never queued again. Once should_stop() is true no new fetch starts;
+        pages already in flight still finish (and reach on_page).
+        """
+        return await self._run(frontier, max_pages, max_depth, link_extractor, on_page, visited, should_stop)
+
+    async def fetch_many(self, urls: List[str], on_page: Optional[PageCallback] = None) -> Dict[str, FetchResult]:
+        """Fetch a fixed list of URLs concurrently (no link following)"""
+        results = await self._run([(url, 0) for url in dict.fromkeys(urls)], len(urls), 0, None, on_page)
+        return {result.url: result for result in results}
+
+
+def run_sync(coro):
+    """Run a crawler coroutine from synchronous code (routes, background tasks)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    # Called from inside an event loop: run on a helper thread with its own loop
+    box: Dict[str, Any] = {}
+
+    def target():
+        try:
+            box["result"] = asyncio.run(coro)
+        except BaseException as e:
+            box["error"] = e
+
+    thread = threading.Thread(target=target, name="crawler")
+    thread.start()
+    thread.join()
+    if "error" in box:
+        raise box["error"]
+    return box["result"]
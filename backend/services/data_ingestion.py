@@ -5,152 +5,43 @@ Supports:
 - PDF/TXT file uploads (existing)
 - Web scraping (new)
 - Text content ingestion (new)
+
+All writes go through the shared IngestionEngine (services/ingestion_engine.py).
+Listing and stats read the knowledge_sources manifest it maintains.
 """
 
 import os
-import time
-import requests
-import tempfile
-from typing import Optional, Dict, Any
-from langchain_community.document_loaders import PyMuPDFLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
+from typing import Optional, Dict, Any, Set
 from core.config import settings
+from db import crud
+from db.database import SessionLocal
+from services import vector_store
+from services.ingestion_engine import get_engine
 
-# Use environment variable for path (supports Docker/Vultr) or fallback to temp
-CHROMA_PATH = os.getenv("CHROMA_PATH", os.path.join(tempfile.gettempdir(), "botblocks_chroma_db"))
+CHROMA_PATH = vector_store.CHROMA_PATH
 
 # ============================================================================
 # EXISTING FILE UPLOAD FUNCTIONS (UNCHANGED)
 # ============================================================================
 
-def ingest_from_url(bot_id: str, file_url: str, filename: str):
-    """
-    Downloads file from Cloudinary (or any URL) to a temp file,
-    ingests it, and then cleans up.
-    """
-    print(f"--- DOWNLOADING & INDEXING: {filename} ---")
-    
-    try:
-        res = requests.get(file_url)
-        if res.status_code != 200:
-            print(f"Failed to download file: {file_url}")
-            return False
-        
-        # Create temp file with correct extension
-        suffix = os.path.splitext(filename)[1]
-        if not suffix: 
-            suffix = ".tmp"
-            
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(res.content)
-            temp_path = tmp.name
-            
-    except Exception as e:
-        print(f"Download Error: {e}")
-        return False
-    
-    # Process the temp file
-    success = ingest_file_from_path(temp_path, bot_id, original_filename=filename)
-    
-    # Cleanup the download
-    if os.path.exists(temp_path):
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-        
-    return success
-
 def ingest_file_from_path(file_path: str, bot_id: str, original_filename: str = None):
     """
     Reads a local file, chunks it, and saves vectors to ChromaDB.
+    The file is left in place so it can be read concurrently (e.g. by storage upload).
     """
     if not original_filename:
         original_filename = os.path.basename(file_path)
         
     print(f"--- STARTING INGESTION for Bot {bot_id} ({original_filename}) ---")
-    start_time = time.time()
-    
-    # 1. Load Documents
-    documents = []
-    try:
-        # Check extensions (Case-insensitive)
-        if file_path.lower().endswith(".pdf"):
-            loader = PyMuPDFLoader(file_path)
-            documents.extend(loader.load())
-        elif file_path.lower().endswith(".txt"):
-            loader = TextLoader(file_path)
-            documents.extend(loader.load())
-        else:
-            print(f"Unsupported file type: {file_path}")
-            return False
-        
-        print(f"📖 Loaded {len(documents)} pages in {time.time() - start_time:.2f}s")
-        
-    except Exception as e:
-        print(f"Error loading file: {e}")
-        return False
     
-    # 2. Split Text
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1200,  # ✅ Increased from 1000 for better context
-        chunk_overlap=250,  # ✅ Increased from 200
-        add_start_index=True,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
+    result = get_engine().ingest_file(bot_id, file_path, source=original_filename)
     
-    chunks = text_splitter.split_documents(documents)
-    print(f"Split into {len(chunks)} chunks.")
-    
-    # 3. Add Metadata
-    for doc in chunks:
-        doc.metadata["source"] = original_filename
-        doc.metadata["bot_id"] = bot_id
-        doc.metadata["type"] = "file"  # ✅ New: Distinguish from web content
-
-    # 4. Embed & Store
-    print("Generating embeddings with BGE-small model...")
-    # 4. Embed & Store
-    print("Generating embeddings with BGE-small model...")
-    try:           
-        embeddings = get_embeddings_model()
-        
-        collection_name = f"collection_{bot_id}"
-        
-        vector_store = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=embeddings,
-            collection_name=collection_name,
-            collection_metadata={"hnsw:space": "cosine"}
-        )
-        
-        # Add documents in batches
-        BATCH_SIZE = 50 
-        
-        for i in range(0, len(chunks), BATCH_SIZE):
-            batch = chunks[i : i + BATCH_SIZE]
-            vector_store.add_documents(batch)
-            print(f"Processed batch {i} to {i + len(batch)}")
-            
-    except Exception as e:
-        print(f"❌ ChromaDB Error: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-    # Cleanup
-    if os.path.exists(file_path):
-        try:
-            os.remove(file_path)
-        except: 
-            pass
-        
-    total_time = time.time() - start_time 
-    print(f"🎉 INGESTION COMPLETE in {total_time:.2f}s")
-    return True
+    # Note: the caller owns file_path (upload spool) and cleans it up
+    if result.success:
+        print(f"🎉 INGESTION COMPLETE in {result.seconds:.2f}s ({result.chunks} chunks)")
+    else:
+        print(f"❌ Ingestion Error: {result.error}")
+    return result.success
 
 # ============================================================================
 # NEW: TEXT CONTENT INGESTION (FOR WEB SCRAPING)
@@ -160,7 +51,8 @@ def ingest_text_content(
     bot_id: str,
     content: str,
     source_name: str,
-    metadata: Optional[Dict[str, Any]] = None
+    metadata: Optional[Dict[str, Any]] = None,
+    source_type: str = "web"
 ) -> bool:
     """
     Ingest raw text content (from web scraping or other sources)
@@ -170,72 +62,21 @@ def ingest_text_content(
         content: Raw text content
         source_name: Source identifier (e.g., "web_homepage", "web_about")
         metadata: Additional metadata (url, title, scraped_at, etc.)
+        source_type: "web" (default) or "manual"
     
     Returns:
         bool: Success status
     """
     print(f"--- INGESTING TEXT CONTENT for Bot {bot_id}: {source_name} ---")
-    start_time = time.time()
+    print(f"📄 Content length: {len(content)} characters")
     
-    try:
-        # 1. Create Document
-        doc_metadata = {
-            "source": source_name,
-            "bot_id": bot_id,
-            "type": "web"  # Mark as web-scraped content
-        }
-        
-        # Merge additional metadata
-        if metadata:
-            doc_metadata.update(metadata)
-        
-        raw_doc = Document(
-            page_content=content,
-            metadata=doc_metadata
-        )
-        
-        print(f"📄 Content length: {len(content)} characters")
-        
-        # 2. Split into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1200,
-            chunk_overlap=250,
-            add_start_index=True,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
-        
-        chunks = text_splitter.split_documents([raw_doc])
-        print(f"Split into {len(chunks)} chunks")
-        
-        # 3. Setup embeddings and vector store
-        embeddings = get_embeddings_model()
-        
-        collection_name = f"collection_{bot_id}"
-        
-        vector_store = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=embeddings,
-            collection_name=collection_name,
-            collection_metadata={"hnsw:space": "cosine"}
-        )
-        
-        # 4. Add to vector store in batches
-        BATCH_SIZE = 50
-        
-        for i in range(0, len(chunks), BATCH_SIZE):
-            batch = chunks[i : i + BATCH_SIZE]
-            vector_store.add_documents(batch)
-            print(f"Processed batch {i} to {i + len(batch)}")
-        
-        total_time = time.time() - start_time
-        print(f"🎉 TEXT INGESTION COMPLETE in {total_time:.2f}s")
-        return True
+    result = get_engine().ingest_text(bot_id, content, source_name, source_type, metadata)
     
-    except Exception as e:
-        print(f"❌ Text Ingestion Error: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+    if result.success:
+        print(f"🎉 TEXT INGESTION COMPLETE in {result.seconds:.2f}s ({result.chunks} chunks)")
+    else:
+        print(f"❌ Text Ingestion Error: {result.error}")
+    return result.success
 
 # ============================================================================
 # EXISTING UTILITY FUNCTIONS (ENHANCED)
@@ -243,96 +84,139 @@ def ingest_text_content(
 
 def get_embeddings_model():
     """
-    Centralized embedding model loader with error handling.
-    Fixes 'meta tensor' issues by enforcing CPU safeload.
+    Centralized embedding model loader (shared, loaded once per process).
     """
-    try:
-        # Prevent potential recursion or meta device issues
-        return HuggingFaceEmbeddings(
-            model_name="BAAI/bge-small-en-v1.5",
-            model_kwargs={'device': 'cpu', 'trust_remote_code': True},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-    except Exception as e:
-        print(f"⚠️ Embedding Load Error: {e}. Retrying...")
-        # Fallback if specific kwargs fail
-        return HuggingFaceEmbeddings(model_name="BAAI/bge-small-en-v1.5")
+    return vector_store.get_embeddings()
+
 
+MANIFEST_BACKFILL_PAGE = 5000
 
-def list_bot_files(bot_id: str):
+
+def backfill_source_manifest(bot_id: str, db=None) -> int:
     """
-    Returns unique sources stored in the vector database.
-    Now includes both files and web sources.
+    Rebuild a bot's knowledge_sources rows from its collection.
+    Only needed for collections ingested before the manifest existed;
+    metadata is paged so even large collections are read in bounded memory.
+    
+    Returns:
+        int: Number of sources recorded
     """
+    own_session = db is None
+    db = db or SessionLocal()
+    
     try:
-        embeddings = get_embeddings_model()
-        
-        vector_store = Chroma(
-            persist_directory=CHROMA_PATH, 
-            embedding_function=embeddings, 
-            collection_name=f"collection_{bot_id}",
-            collection_metadata={"hnsw:space": "cosine"}
-        )
+        collection = vector_store.get_vector_store(bot_id)._collection
+        sources: Dict[str, Dict[str, Any]] = {}
+        offset = 0
         
-        # Get metadata
-        data = vector_store.get(include=["metadatas"])
+        for page in vector_store.iter_collection(collection, page_size=MANIFEST_BACKFILL_PAGE):
+            for chunk_id, meta in zip(page["ids"], page["metadatas"]):
+                if not meta or "source" not in meta:
+                    continue
+                entry = sources.setdefault(meta["source"], {"meta": meta, "ids": []})
+                entry["ids"].append(chunk_id)
+            
+            offset += len(page["ids"])
+        
+        for source_name, entry in sources.items():
+            meta = entry["meta"]
+            crud.record_source(
+                db, bot_id, source_name, meta.get("type", "file"), entry["ids"],
+                url=meta.get("url"),
+                title=meta.get("title"),
+                scraped_at=meta.get("scraped_at")
+            )
+        
+        print(f"📇 Manifest backfilled for bot {bot_id}: {len(sources)} sources, {offset} chunks")
+        return len(sources)
+    
+    finally:
+        if own_session:
+            db.close()
+
+
+_manifest_checked: Set[str] = set()  # bots whose manifest was checked against their collection
+
+
+def _ensure_manifest(db, bot_id: str):
+    """
+    Backfill bots whose collection holds chunks the manifest does not know
+    (e.g. ingested before the manifest existed, next to newer sources).
+    Checked once per bot and process; skipped while the collection is in
+    use, since chunk counts are in flux during a write.
+    """
+    if bot_id in _manifest_checked or vector_store.in_use(bot_id):
+        return
+    recorded = sum(t["chunks"] for t in crud.get_source_stats(db, bot_id).values())
+    if vector_store.get_vector_store(bot_id)._collection.count() > recorded:
+        backfill_source_manifest(bot_id, db)
+    _manifest_checked.add(bot_id)
+
+
+def list_bot_files(bot_id: str, source_type: Optional[str] = None):
+    """
+    Returns the sources stored in the bot's knowledge base (files and web pages).
+    Read from the knowledge_sources manifest, not from the collection.
+    """
+    db = SessionLocal()
+    try:
+        _ensure_manifest(db, bot_id)
         
         sources = []
-        seen = set()
-        
-        for meta in data["metadatas"]:
-            if meta and "source" in meta:
-                source_name = meta["source"]
-                
-                # Skip duplicates
-                if source_name in seen:
-                    continue
-                
-                seen.add(source_name)
-                
-                # Build source info
-                source_info = {
-                    "name": source_name,
-                    "type": meta.get("type", "file"),  # "file" or "web"
-                }
-                
-                # Add web-specific metadata
-                if meta.get("type") == "web":
-                    source_info["url"] = meta.get("url", "")
-                    source_info["title"] = meta.get("title", "")
-                    source_info["scraped_at"] = meta.get("scraped_at", "")
-                
-                sources.append(source_info)
+        for row in crud.list_sources(db, bot_id, source_type=source_type):
+            source_info = {
+                "name": row.source,
+                "type": row.source_type,
+                "chunks": row.chunk_count,
+                "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+            }
+            
+            # Add web-specific metadata
+            if row.source_type == "web":
+                source_info["url"] = row.url or ""
+                source_info["title"] = row.title or ""
+                source_info["scraped_at"] = row.scraped_at or ""
+            
+            sources.append(source_info)
         
         return sources
     
     except Exception as e:
         print(f"List Error: {e}")
         return []
+    
+    finally:
+        db.close()
 
 def delete_bot_source(bot_id: str, source_name: str):
     """
-    Deletes all vectors associated with a specific source (file or web page).
-    Renamed from delete_bot_file to be more generic.
+    Deletes all vectors associated with a specific source (file or web page),
+    its manifest entry and, for web pages, the crawl state that would
+    otherwise let a recrawl skip them as unchanged.
     """
+    db = SessionLocal()
     try:
-        embeddings = get_embeddings_model()
-        
-        vector_store = Chroma(
-            persist_directory=CHROMA_PATH, 
-            embedding_function=embeddings, 
-            collection_name=f"collection_{bot_id}",
-            collection_metadata={"hnsw:space": "cosine"}
-        )
+        store = vector_store.get_vector_store(bot_id)
         
         print(f"🗑️ Deleting vectors for source: {source_name}")
         
-        vector_store._collection.delete(where={"source": source_name})
+        chunk_ids = crud.get_source_chunk_ids(db, bot_id, source_name)
+        if chunk_ids:
+            store._collection.delete(ids=chunk_ids)
+        else:
+            # Not in the manifest (e.g. not backfilled yet): fall back to a metadata match
+            store._collection.delete(where={"source": source_name})
+        vector_store.mark_changed(bot_id)
+        crud.delete_source(db, bot_id, source_name)
+        crud.forget_crawled_source(db, bot_id, source_name)
         return True
     
     except Exception as e:
         print(f"Delete Error: {e}")
         return False
+    
+    finally:
+        db.close()
 
 # Backward compatibility alias
 delete_bot_file = delete_bot_source
@@ -343,36 +227,21 @@ delete_bot_file = delete_bot_source
 
 def get_collection_stats(bot_id: str) -> Dict[str, Any]:
     """
-    Get statistics about the bot's knowledge base
+    Get statistics about the bot's knowledge base (one grouped SQL query)
     """
+    db = SessionLocal()
     try:
-        embeddings = get_embeddings_model()
+        _ensure_manifest(db, bot_id)
+        by_type = crud.get_source_stats(db, bot_id)
         
-        vector_store = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=embeddings,
-            collection_name=f"collection_{bot_id}",
-            collection_metadata={"hnsw:space": "cosine"}
-        )
-        
-        data = vector_store.get(include=["metadatas"])
-        
-        total_chunks = len(data["metadatas"])
-        file_count = 0
-        web_count = 0
-        
-        for meta in data["metadatas"]:
-            if meta:
-                if meta.get("type") == "web":
-                    web_count += 1
-                else:
-                    file_count += 1
+        total_chunks = sum(t["chunks"] for t in by_type.values())
+        web_count = by_type.get("web", {}).get("chunks", 0)
         
         return {
             "total_chunks": total_chunks,
-            "file_chunks": file_count,
+            "file_chunks": total_chunks - web_count,
             "web_chunks": web_count,
-            "sources": len(list_bot_files(bot_id))
+            "sources": sum(t["sources"] for t in by_type.values())
         }
     
     except Exception as e:
@@ -382,4 +251,7 @@ def get_collection_stats(bot_id: str) -> Dict[str, Any]:
             "file_chunks": 0,
             "web_chunks": 0,
             "sources": 0
-        }
\ No newline at end of file
+        }
+    
+    finally:
+        db.close()
@@ -0,0 +1,121 @@
+"""
+Near-Duplicate Detection
+========================
+SimHash fingerprints + LSH buckets for scraped pages.
+
+Docs sites serve one text under many URLs (locale variants, paginated
+archives, tag pages). Each copy used to be embedded and stored, and the
+copies then crowded each other out of the retrieval top-k.
+
+- simhash(text): 64-bit fingerprint of the text's word 3-gram shingles
+  (weighted by count). Texts that differ in a few sentences land a few bits
+  apart; unrelated texts ~32 bits apart.
+- NearDuplicateIndex: fingerprints split into DEDUP_BANDS bands. Two
+  fingerprints within DEDUP_MAX_DISTANCE bits share at least one band
+  exactly (pigeonhole, as long as bands > distance), so a lookup only
+  compares against the pages in its own band buckets instead of every page.
+
+services/crawl_state.py keeps one index per bot, built from the stored
+fingerprints of its ingested pages, and drops near-duplicates before they
+reach the embedding model.
+"""
+
+import os
+import re
+import hashlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+SCRAPE_DEDUP = os.getenv("SCRAPE_DEDUP", "true").lower() == "true"
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "4"))
+DEDUP_MIN_SHINGLES = 20  # shorter texts give unstable fingerprints: never deduplicated
+SHINGLE_SIZE = 3
+HASH_BLOCK = 4096
+
+TOKEN = re.compile(r"\w+", re.UNICODE)
+BITS = np.arange(64, dtype=np.uint64)
+
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def shingles(text: str) -> Counter:
+    tokens = TOKEN.findall(text.lower())
+    return Counter(
+        " ".join(tokens[i:i + SHINGLE_SIZE])
+        for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))
+    )
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash of a text, or None if it is too short to fingerprint"""
+    counts = shingles(text)
+    if len(counts) < DEDUP_MIN_SHINGLES:
+        return None
+
+    hashes = np.fromiter((_hash(s) for s in counts), dtype=np.uint64, count=len(counts))
+    weights = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+
+    score = np.zeros(64, dtype=np.int64)
+    for start in range(0, len(hashes), HASH_BLOCK):
+        bits = (hashes[start:start + HASH_BLOCK, np.newaxis] >> BITS) & np.uint64(1)
+        score += (weights[start:start + HASH_BLOCK, np.newaxis] * (2 * bits.astype(np.int64) - 1)).sum(axis=0)
+
+    return sum(1 << int(bit) for bit in np.nonzero(score > 0)[0])
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex:
+    """Keys (page URLs) by fingerprint, with band buckets for near-duplicate lookups"""
+
+    def __init__(self, max_distance: int = DEDUP_MAX_DISTANCE, bands: int = DEDUP_BANDS):
+        if bands <= max_distance:
+            raise ValueError("DEDUP_BANDS must be greater than DEDUP_MAX_DISTANCE")
+        self.max_distance = max_distance
+        self.bands = bands
+        self.width = 64 // bands
+        self.mask = (1 << self.width) - 1
+        self.fingerprints: Dict[str, int] = {}
+        self.buckets: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def _bands(self, fingerprint: int) -> List[Tuple[int, int]]:
+        return [(band, (fingerprint >> (band * self.width)) & self.mask) for band in range(self.bands)]
+
+    def add(self, key: str, fingerprint: int):
+        self.remove(key)
+        self.fingerprints[key] = fingerprint
+        for band in self._bands(fingerprint):
+            self.buckets[band].add(key)
+
+    def remove(self, key: str):
+        fingerprint = self.fingerprints.pop(key, None)
+        if fingerprint is None:
+            return
+        for band in self._bands(fingerprint):
+            bucket = self.buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band]
+
+    def find(self, fingerprint: int, exclude: Optional[str] = None) -> Optional[Tuple[str, int]]:
+        """Closest key within max_distance bits as (key, distance), or None"""
+        best = None
+        for band in self._bands(fingerprint):
+            for key in self.buckets.get(band, ()):
+                if key == exclude:
+                    continue
+                bits = distance(fingerprint, self.fingerprints[key])
+                if bits <= self.max_distance and (best is None or bits < best[1]):
+                    best = (key, bits)
+        return best
@@ -0,0 +1,374 @@
+"""
+Document Loaders
+================
+Format-dispatch registry of streaming loaders.
+
+Every loader is a generator that yields one Document per section, so large
+files are never held in memory as a whole:
+- PDF:      one section per page
+- TXT:      paragraph blocks
+- Markdown: one section per heading
+- HTML:     one section per heading (incremental parser)
+- DOCX:     one section per heading (word/document.xml streamed from the zip)
+- CSV/TSV:  groups of CSV_ROWS_PER_SECTION rows
+
+Structural metadata on every section (all scalar, Chroma-safe):
+    section_type   "page" | "text" | "section" | "rows"
+    section_index  0-based position of the section in the file
+    heading        nearest heading (sections only)
+    heading_path   "Guide > Install > Linux" (sections only)
+    heading_level  1-6 (sections only)
+    page           0-based page number (PDF)
+    row_start/row_end, columns (CSV)
+
+Register a new format with @register_loader(".ext").
+"""
+
+import os
+import re
+import csv
+import zipfile
+import logging
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from lxml import etree
+from langchain_core.documents import Document
+
+logger = logging.getLogger("DocumentLoaders")
+
+SECTION_MAX_CHARS = int(os.getenv("LOADER_SECTION_MAX_CHARS", "8000"))
+CSV_ROWS_PER_SECTION = int(os.getenv("CSV_ROWS_PER_SECTION", "50"))
+READ_BUFFER = 64 * 1024
+
+Loader = Callable[[str], Iterator[Document]]
+LOADERS: Dict[str, Loader] = {}
+
+
+def register_loader(*extensions: str):
+    """Decorator: register a loader for one or more file extensions"""
+    def decorator(fn: Loader) -> Loader:
+        for ext in extensions:
+            LOADERS[ext.lower()] = fn
+        return fn
+    return decorator
+
+
+def supported_extensions() -> Tuple[str, ...]:
+    return tuple(sorted(LOADERS))
+
+
+def load_document(file_path: str) -> Iterator[Document]:
+    """
+    Lazily load a local file with the loader registered for its extension.
+
+    Raises:
+        ValueError: no loader for this extension
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    loader = LOADERS.get(ext)
+    if loader is None:
+        raise ValueError(f"Unsupported file type: {os.path.basename(file_path)}")
+    return loader(file_path)
+
+
+# ============================================================================
+# SECTION BUILDER (shared by heading-aware loaders)
+# ============================================================================
+class SectionBuilder:
+    """Tracks the heading stack and emits one Document per section"""
+
+    def __init__(self):
+        self.headings: List[Tuple[int, str]] = []
+        self.parts: List[str] = []
+        self.size = 0
+        self.index = 0
+
+    def heading(self, level: int, title: str) -> Optional[Document]:
+        """Start a new section; returns the finished previous one (if any)"""
+        finished = self.flush()
+        while self.headings and self.headings[-1][0] >= level:
+            self.headings.pop()
+        self.headings.append((level, title.strip()))
+        return finished
+
+    def text(self, text: str) -> Optional[Document]:
+        """Append text; returns a partial section if it grew past SECTION_MAX_CHARS"""
+        if not text:
+            return None
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= SECTION_MAX_CHARS:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[Document]:
+        content = "".join(self.parts).strip()
+        self.parts, self.size = [], 0
+        if not content:
+            return None
+
+        metadata = {"section_type": "section", "section_index": self.index}
+        if self.headings:
+            level, title = self.headings[-1]
+            metadata.update({
+                "heading": title,
+                "heading_path": " > ".join(t for _, t in self.headings),
+                "heading_level": level,
+            })
+            # Keep the heading with its text so the chunk is self-describing
+            content = f"{title}\n\n{content}" if not content.startswith(title) else content
+
+        self.index += 1
+        return Document(page_content=content, metadata=metadata)
+
+
+# ============================================================================
+# LOADERS
+# ============================================================================
+@register_loader(".pdf")
+def load_pdf(file_path: str) -> Iterator[Document]:
+    """One section per page (pages are read one at a time)"""
+    import fitz
+
+    with fitz.open(file_path) as pdf:
+        total_pages = pdf.page_count
+        for number in range(total_pages):
+            text = pdf.load_page(number).get_text()
+            if text.strip():
+                yield Document(page_content=text, metadata={
+                    "section_type": "page",
+                    "section_index": number,
+                    "page": number,
+                    "total_pages": total_pages,
+                })
+
+
+@register_loader(".txt")
+def load_text(file_path: str) -> Iterator[Document]:
+    """
+    Paragraph blocks of about SECTION_MAX_CHARS. Lines are read at most
+    SECTION_MAX_CHARS characters at a time, so text without newlines stays bounded too.
+    """
+    parts: List[str] = []
+    size = 0
+    index = 0
+
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in iter(lambda: f.readline(SECTION_MAX_CHARS), ""):
+            parts.append(line)
+            size += len(line)
+            # Break on paragraph boundaries (blank lines); text without any is cut at twice the limit
+            if size >= SECTION_MAX_CHARS and not line.strip() or size >= 2 * SECTION_MAX_CHARS:
+                yield Document(page_content="".join(parts), metadata={
+                    "section_type": "text", "section_index": index
+                })
+                parts, size, index = [], 0, index + 1
+
+    if "".join(parts).strip():
+        yield Document(page_content="".join(parts), metadata={
+            "section_type": "text", "section_index": index
+        })
+
+
+MD_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+MD_FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+@register_loader(".md", ".markdown")
+def load_markdown(file_path: str) -> Iterator[Document]:
+    """One section per ATX heading (headings inside code fences are ignored)"""
+    builder = SectionBuilder()
+    in_fence = False
+
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            if MD_FENCE.match(line):
+                in_fence = not in_fence
+
+            match = None if in_fence else MD_HEADING.match(line)
+            section = builder.heading(len(match.group(1)), match.group(2)) if match else builder.text(line)
+            if section:
+                yield section
+
+    section = builder.flush()
+    if section:
+        yield section
+
+
+class _HTMLSectionParser(HTMLParser):
+    """Incremental HTML -> sections on h1-h6"""
+
+    SKIP_TAGS = {"head", "script", "style", "nav", "footer", "header", "noscript", "svg", "template"}
+    BLOCK_TAGS = {"p", "div", "li", "br", "section", "article", "pre", "blockquote", "tr", "table", "ul", "ol"}
+    HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.builder = SectionBuilder()
+        self.ready: List[Document] = []
+        self.skip_depth = 0
+        self.heading_level = 0
+        self.heading_text: List[str] = []
+        self.cells_in_row = 0
+
+    def _emit(self, section: Optional[Document]):
+        if section:
+            self.ready.append(section)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.HEADINGS and not self.skip_depth:
+            self.heading_level = self.HEADINGS[tag]
+            self.heading_text = []
+        elif tag in ("td", "th"):
+            if self.cells_in_row:
+                self._emit(self.builder.text("| "))
+            self.cells_in_row += 1
+        elif tag in self.BLOCK_TAGS:
+            if tag == "tr":
+                self.cells_in_row = 0
+            self._emit(self.builder.text("\n"))
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in self.HEADINGS and self.heading_level:
+            title = " ".join("".join(self.heading_text).split())
+            self.heading_level, level = 0, self.heading_level
+            if title:
+                self._emit(self.builder.heading(level, title))
+        elif tag in self.BLOCK_TAGS:
+            self._emit(self.builder.text("\n"))
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.heading_level:
+            self.heading_text.append(data)
+        elif data.strip():
+            self._emit(self.builder.text(" ".join(data.split()) + " "))
+
+
+@register_loader(".html", ".htm")
+def load_html(file_path: str) -> Iterator[Document]:
+    """One section per h1-h6, parsed incrementally in READ_BUFFER chunks"""
+    parser = _HTMLSectionParser()
+
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            block = f.read(READ_BUFFER)
+            if not block:
+                break
+            parser.feed(block)
+            yield from parser.ready
+            parser.ready = []
+
+    parser.close()
+    yield from parser.ready
+    section = parser.builder.flush()
+    if section:
+        yield section
+
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+DOCX_HEADING = re.compile(r"^(?:Heading|heading)\s*(\d)$|^Title$")
+
+
+def _release(elem) -> None:
+    """Free a handled element and the already-handled siblings before it"""
+    elem.clear()
+    while elem.getprevious() is not None:
+        del elem.getparent()[0]
+
+
+@register_loader(".docx")
+def load_docx(file_path: str) -> Iterator[Document]:
+    """
+    One section per Heading-styled paragraph.
+    word/document.xml is streamed with iterparse and handled elements are
+    released as we go, so very large documents use bounded memory. Tables become "a | b" rows.
+    """
+    builder = SectionBuilder()
+    table_depth = 0
+    row_cells: List[str] = []
+
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open("word/document.xml") as xml:
+            for event, elem in etree.iterparse(xml, events=("start", "end"), resolve_entities=False):
+                tag = elem.tag
+
+                if event == "start":
+                    if tag == W_NS + "tbl":
+                        table_depth += 1
+                    continue
+
+                if tag == W_NS + "p":
+                    text = "".join(t.text or "" for t in elem.iter(W_NS + "t"))
+                    style = elem.find(f"{W_NS}pPr/{W_NS}pStyle")
+                    style_name = style.get(W_NS + "val", "") if style is not None else ""
+                    heading = DOCX_HEADING.match(style_name)
+
+                    if table_depth:
+                        row_cells.append(text)
+                    elif heading and text.strip():
+                        level = int(heading.group(1)) if heading.group(1) else 1
+                        section = builder.heading(level, text)
+                        if section:
+                            yield section
+                    else:
+                        section = builder.text(text + "\n")
+                        if section:
+                            yield section
+                    _release(elem)
+
+                elif tag == W_NS + "tr":
+                    section = builder.text(" | ".join(c.strip() for c in row_cells) + "\n")
+                    row_cells = []
+                    _release(elem)
+                    if section:
+                        yield section
+
+                elif tag == W_NS + "tbl":
+                    table_depth -= 1
+                    _release(elem)
+
+    section = builder.flush()
+    if section:
+        yield section
+
+
+@register_loader(".csv", ".tsv")
+def load_csv(file_path: str) -> Iterator[Document]:
+    """Groups of CSV_ROWS_PER_SECTION rows rendered as "column: value" lines"""
+    delimiter = "\t" if file_path.lower().endswith(".tsv") else ","
+
+    with open(file_path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if not header:
+            return
+        header = [h.strip() or f"column_{i + 1}" for i, h in enumerate(header)]
+        columns = ", ".join(header)
+
+        lines: List[str] = []
+        row_start = 1
+        index = 0
+
+        for row_number, row in enumerate(reader, start=1):
+            if not any(cell.strip() for cell in row):
+                continue
+            lines.append("; ".join(f"{col}: {val.strip()}" for col, val in zip(header, row) if val.strip()))
+
+            if len(lines) >= CSV_ROWS_PER_SECTION:
+                yield Document(page_content="\n".join(lines), metadata={
+                    "section_type": "rows", "section_index": index,
+                    "row_start": row_start, "row_end": row_number, "columns": columns,
+                })
+                lines, row_start, index = [], row_number + 1, index + 1
+
+        if lines:
+            yield Document(page_content="\n".join(lines), metadata={
+                "section_type": "rows", "section_index": index,
+                "row_start": row_start, "row_end": row_number, "columns": columns,
+            })
@@ -0,0 +1,245 @@
+"""
+Embedding Engine
+================
+Fast CPU embeddings for BGE-small, shared by ingestion and queries.
+
+- Dynamic batching: texts are tokenized once, sorted by token length and
+  packed into batches under a token budget, so short chunks are never
+  padded to the length of the longest one.
+- Backends: "torch" (transformers, default), "onnx" (exported fp32 graph)
+  and "onnx-int8" (dynamically quantized graph). Export with
+  scripts/export_embedding_model.py.
+- Thread-pool aware: every forward pass uses EMBEDDING_THREADS intra-op
+  threads and passes are serialized, so ingestion workers and request
+  threads never oversubscribe the CPU. A query waits at most one batch.
+
+Compatibility: vectors are CLS-pooled and L2-normalized exactly like the
+sentence-transformers pipeline behind the existing collections. Each backend
+must stay within COMPATIBILITY_TOLERANCE (minimum cosine similarity against
+the reference HuggingFaceEmbeddings vectors); check_compatibility verifies it.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("EmbeddingEngine")
+
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(".", "data", "models", "bge-small-en-v1.5-onnx"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", str(os.cpu_count() or 1)))
+EMBEDDING_MAX_TOKENS_PER_BATCH = int(os.getenv("EMBEDDING_MAX_TOKENS_PER_BATCH", "8192"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+MAX_SEQ_LENGTH = 512
+
+ONNX_FILES = {
+    "onnx": "model.onnx",
+    "onnx-int8": "model_int8.onnx",
+}
+
+# Minimum cosine similarity vs. the reference vectors stored in existing collections
+COMPATIBILITY_TOLERANCE = {
+    "torch": 0.9999,
+    "onnx": 0.9999,
+    "onnx-int8": 0.99,
+}
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+class TorchBackend:
+    """transformers AutoModel on CPU"""
+
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        import torch
+        from transformers import AutoModel
+
+        torch.set_num_threads(EMBEDDING_THREADS)
+        self._torch = torch
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+
+    def forward(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        torch = self._torch
+        with torch.inference_mode():
+            outputs = self.model(**{k: torch.from_numpy(v) for k, v in inputs.items()})
+        return outputs.last_hidden_state[:, 0].numpy()
+
+
+class OnnxBackend:
+    """onnxruntime session over an exported (optionally int8) graph"""
+
+    def __init__(self, model_dir: str, variant: str):
+        import onnxruntime as ort
+
+        path = os.path.join(model_dir, ONNX_FILES[variant])
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found - run scripts/export_embedding_model.py")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = EMBEDDING_THREADS
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.name = variant
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def forward(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        feed = {k: v for k, v in inputs.items() if k in self.input_names}
+        last_hidden_state = self.session.run(None, feed)[0]
+        return last_hidden_state[:, 0]
+
+
+# ============================================================================
+# ENGINE
+# ============================================================================
+class EmbeddingEngine(Embeddings):
+    """LangChain-compatible embedder with token-length batching"""
+
+    def __init__(self, backend: str = EMBEDDING_BACKEND, model_name: str = EMBEDDING_MODEL_NAME):
+        from transformers import AutoTokenizer
+
+        if backend in ONNX_FILES:
+            self.backend = OnnxBackend(EMBEDDING_ONNX_DIR, backend)
+            tokenizer_source = EMBEDDING_ONNX_DIR
+        else:
+            self.backend = TorchBackend(model_name)
+            tokenizer_source = model_name
+
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_source)
+        self.pad_token_id = self.tokenizer.pad_token_id or 0
+        self._lock = threading.Lock()
+        self.stats = {"texts": 0, "batches": 0, "tokens": 0, "padded_tokens": 0, "seconds": 0.0}
+
+        logger.info(f"Embedding engine ready (backend={self.backend.name}, threads={EMBEDDING_THREADS})")
+
+    # -------------------------------------------------------------- batching
+    @staticmethod
+    def plan_batches(
+        lengths: List[int],
+        max_tokens: int = EMBEDDING_MAX_TOKENS_PER_BATCH,
+        max_batch: int = EMBEDDING_MAX_BATCH
+    ) -> List[List[int]]:
+        """
+        Group text indices into batches of similar length.
+        A batch costs len(batch) * longest token count; it is capped at max_tokens.
+        """
+        order = sorted(range(len(lengths)), key=lengths.__getitem__)
+        batches, current, longest = [], [], 0
+
+        for idx in order:
+            candidate_longest = max(longest, lengths[idx])
+            if current and (
+                len(current) >= max_batch or (len(current) + 1) * candidate_longest > max_tokens
+            ):
+                batches.append(current)
+                current, candidate_longest = [], lengths[idx]
+            current.append(idx)
+            longest = candidate_longest
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def _pad(self, token_ids: List[List[int]]) -> Dict[str, np.ndarray]:
+        width = max(len(ids) for ids in token_ids)
+        input_ids = np.full((len(token_ids), width), self.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(token_ids), width), dtype=np.int64)
+
+        for row, ids in enumerate(token_ids):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+
+        return {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        }
+
+    # ------------------------------------------------------------- embedding
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into an (n, dim) float32 matrix of unit vectors"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        start_time = time.time()
+        token_ids = self.tokenizer(
+            texts, add_special_tokens=True, truncation=True, max_length=MAX_SEQ_LENGTH
+        )["input_ids"]
+        lengths = [len(ids) for ids in token_ids]
+
+        output: Optional[np.ndarray] = None
+        batches = self.plan_batches(lengths)
+
+        for batch in batches:
+            inputs = self._pad([token_ids[i] for i in batch])
+            with self._lock:
+                vectors = self.backend.forward(inputs)
+
+            if output is None:
+                output = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            output[batch] = vectors
+            self.stats["padded_tokens"] += inputs["input_ids"].size
+
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        output /= np.maximum(norms, 1e-12)
+
+        self.stats["texts"] += len(texts)
+        self.stats["batches"] += len(batches)
+        self.stats["tokens"] += sum(lengths)
+        self.stats["seconds"] += time.time() - start_time
+        return output
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+def check_compatibility(engine: EmbeddingEngine, reference: Embeddings, texts: List[str]) -> Dict[str, Any]:
+    """
+    Compare engine vectors with the reference embedder used by existing collections.
+    Passes when every per-text cosine similarity is within the backend's tolerance.
+    """
+    ours = engine.encode(texts)
+    theirs = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    cosines = np.sum(ours * theirs, axis=1)
+
+    tolerance = COMPATIBILITY_TOLERANCE.get(engine.backend.name, 0.99)
+    return {
+        "backend": engine.backend.name,
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "tolerance": tolerance,
+        "compatible": bool(cosines.min() >= tolerance),
+    }
+
+
+_engine: Optional[EmbeddingEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_embedding_engine() -> EmbeddingEngine:
+    """Process-wide embedding engine; falls back to torch if ONNX files are missing"""
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            try:
+                _engine = EmbeddingEngine(EMBEDDING_BACKEND)
+            except Exception as e:
+                if EMBEDDING_BACKEND == "torch":
+                    raise
+                logger.warning(f"Embedding backend '{EMBEDDING_BACKEND}' unavailable ({e}), using torch")
+                _engine = EmbeddingEngine("torch")
+        return _engine
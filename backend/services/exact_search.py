@@ -0,0 +1,348 @@
+"""
+Exact Search
+============
+Brute-force top-k for small collections.
+
+Most bots hold a few hundred chunks. At that size one matrix-vector product
+over every stored vector is faster than an HNSW query through Chroma, and
+it is exact: scores are the true cosine similarities, so the fixed
+relevance thresholds in rag_pipeline.generate_response behave the same for
+every bot.
+
+Each bot's index is a directory under EXACT_SEARCH_DIR in the snapshot
+format (services/snapshots.py) with the vectors normalized in place:
+
+    vectors.npy    (count, dim) float32 unit vectors, np.load(mmap_mode="r")
+    *.bin          ids / documents / metadatas columns
+
+The matrix is memory-mapped, so the page cache is shared between workers
+and an idle bot costs no resident memory. An index is stale when the
+collection's version (vector_store.mark_changed, shared between processes)
+or size no longer matches; stale or missing indexes are rebuilt on a
+background thread while queries go to Chroma (ANN), so no request waits
+for a build. Collections above EXACT_SEARCH_MAX_CHUNKS always go to Chroma.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from services import snapshots, vector_store
+
+logger = logging.getLogger("ExactSearch")
+
+EXACT_SEARCH_DIR = os.getenv("EXACT_SEARCH_DIR", os.path.join(".", "data", "exact"))
+EXACT_SEARCH_MAX_CHUNKS = int(os.getenv("EXACT_SEARCH_MAX_CHUNKS", "5000"))
+NORMALIZE_BATCH = 4096
+
+
+@dataclass
+class ExactIndex:
+    """A bot's memory-mapped unit-vector matrix plus its text columns"""
+    bot_id: str
+    path: str
+    version: str
+    fingerprint: str
+    matrix: np.ndarray
+    documents: "snapshots.ColumnReader"
+    metadatas: "snapshots.ColumnReader"
+
+    @property
+    def count(self) -> int:
+        return self.matrix.shape[0]
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[Tuple[Document, float]]:
+        """Top-k rows by cosine similarity, best first"""
+        return self.search_many(query_vector[np.newaxis, :], k)[0]
+
+    def search_many(self, query_matrix: np.ndarray, k: int) -> List[List[Tuple[Document, float]]]:
+        """Top-k for each row of a (queries, dim) matrix of unit vectors, in one product"""
+        if not self.count or k <= 0:
+            return [[] for _ in range(len(query_matrix))]
+
+        scores = self.matrix @ query_matrix.T  # (count, queries)
+        k = min(k, self.count)
+        if k < self.count:
+            top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        else:
+            top = np.tile(np.arange(self.count)[:, np.newaxis], (1, scores.shape[1]))
+
+        results = []
+        for column in range(scores.shape[1]):
+            rows = top[:, column]
+            rows = rows[np.argsort(-scores[rows, column])]
+            results.append([(self.document(int(row)), float(scores[row, column])) for row in rows])
+        return results
+
+    def document(self, row: int) -> Document:
+        return Document(
+            page_content=self.documents.slice(row, row + 1)[0],
+            metadata=json.loads(self.metadatas.slice(row, row + 1)[0])
+        )
+
+
+# ============================================================================
+# BUILD / LOAD
+# ============================================================================
+_indexes: Dict[str, ExactIndex] = {}
+_build_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+_pending: Set[str] = set()
+_builder: Optional[ThreadPoolExecutor] = None
+
+
+def _bot_lock(bot_id: str) -> threading.Lock:
+    with _locks_lock:
+        return _build_locks.setdefault(bot_id, threading.Lock())
+
+
+def index_path(bot_id: str) -> str:
+    return os.path.join(EXACT_SEARCH_DIR, bot_id)
+
+
+def collection_fingerprint(collection) -> str:
+    """Hash of the sorted chunk ids (ids are content-addressed, see services/chunker.py)"""
+    digest = hashlib.sha1()
+    ids = sorted(
+        chunk_id
+        for page in vector_store.iter_collection(collection, include=())
+        for chunk_id in page["ids"]
+    )
+    for chunk_id in ids:
+        digest.update(chunk_id.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _normalize(path: str):
+    """Scale every row of vectors.npy to unit length, in place"""
+    vectors = np.load(os.path.join(path, snapshots.VECTORS_FILE), mmap_mode="r+")
+    for start in range(0, vectors.shape[0], NORMALIZE_BATCH):
+        block = vectors[start:start + NORMALIZE_BATCH]
+        block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+    vectors.flush()
+    del vectors
+
+
+def _open(bot_id: str, path: str, version: str) -> ExactIndex:
+    manifest = snapshots.read_manifest(path)
+    return ExactIndex(
+        bot_id=bot_id,
+        path=path,
+        version=version,
+        fingerprint=manifest.get("fingerprint", ""),
+        matrix=np.load(os.path.join(path, snapshots.VECTORS_FILE), mmap_mode="r"),
+        documents=snapshots.ColumnReader(path, "documents"),
+        metadatas=snapshots.ColumnReader(path, "metadatas"),
+    )
+
+
+def build_index(bot_id: str) -> ExactIndex:
+    """Export the collection into a fresh index directory and swap it in"""
+    version = vector_store.get_version(bot_id)
+    collection = vector_store.get_vector_store(bot_id)._collection
+    fingerprint = collection_fingerprint(collection)
+
+    final_path = index_path(bot_id)
+    build_path = f"{final_path}.build-{uuid.uuid4().hex[:8]}"
+    try:
+        manifest = snapshots.export_snapshot(bot_id, output_dir=build_path, dtype="float32")
+        if manifest["count"]:
+            _normalize(build_path)
+
+        # Checksums describe the raw export, not the normalized vectors
+        manifest["fingerprint"] = fingerprint
+        manifest["collection_version"] = version
+        manifest.pop("checksums", None)
+        manifest.pop("path", None)
+        with open(os.path.join(build_path, snapshots.MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # Readers of the old index keep their open memmaps; the files go away when they close
+        shutil.rmtree(final_path, ignore_errors=True)
+        os.replace(build_path, final_path)
+    finally:
+        shutil.rmtree(build_path, ignore_errors=True)
+
+    logger.info(f"Built exact index for {bot_id}: {manifest['count']} vectors")
+    return _open(bot_id, final_path, version)
+
+
+def _is_current(index: Optional[ExactIndex], version: str, count: Optional[int]) -> bool:
+    return index is not None and index.version == version and (count is None or index.count == count)
+
+
+def _refresh(bot_id: str):
+    """Background build: reuse the index on disk if its chunk ids still match, else rebuild"""
+    try:
+        with _bot_lock(bot_id):
+            version = vector_store.get_version(bot_id)
+            with vector_store.lease(bot_id):
+                collection = vector_store.get_vector_store(bot_id)._collection
+                count = collection.count()
+                if _is_current(_indexes.get(bot_id), version, count):
+                    return
+
+                index = None
+                if os.path.exists(os.path.join(index_path(bot_id), snapshots.MANIFEST_FILE)):
+                    try:
+                        index = _open(bot_id, index_path(bot_id), version)
+                        if index.count != count or index.fingerprint != collection_fingerprint(collection):
+                            index = None
+                    except Exception as e:
+                        logger.warning(f"Discarding exact index of {bot_id}: {e}")
+                        index = None
+
+                _indexes[bot_id] = index or build_index(bot_id)
+    except Exception as e:
+        logger.warning(f"Exact index build for {bot_id} failed: {e}")
+    finally:
+        with _locks_lock:
+            _pending.discard(bot_id)
+
+
+def _schedule(bot_id: str):
+    global _builder
+
+    with _locks_lock:
+        if bot_id in _pending:
+            return
+        _pending.add(bot_id)
+        if _builder is None:
+            _builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="exact-index")
+    _builder.submit(_refresh, bot_id)
+
+
+def get_index(bot_id: str, count: Optional[int] = None) -> Optional[ExactIndex]:
+    """
+    Current index for a bot, or None while it is built / rebuilt in the background.
+
+    Args:
+        bot_id: Bot public_id
+        count: Collection size, if the caller already knows it
+    """
+    version = vector_store.get_version(bot_id)
+    index = _indexes.get(bot_id)
+
+    if not _is_current(index, version, count):
+        # Index on disk built by another process (or earlier run) for this collection version
+        try:
+            with open(os.path.join(index_path(bot_id), snapshots.MANIFEST_FILE)) as f:
+                built_for = json.load(f).get("collection_version")
+            if built_for == version:
+                index = _indexes[bot_id] = _open(bot_id, index_path(bot_id), version)
+        except (OSError, ValueError):
+            pass
+
+    if _is_current(index, version, count):
+        return index
+    _schedule(bot_id)
+    return None
+
+
+def discard(bot_id: str):
+    """Forget a bot's index (e.g. after the bot was deleted)"""
+    with _bot_lock(bot_id):
+        _indexes.pop(bot_id, None)
+        shutil.rmtree(index_path(bot_id), ignore_errors=True)
+
+
+# ============================================================================
+# SEARCH
+# ============================================================================
+def exact_search(bot_id: str, query: str, k: int = 4, count: Optional[int] = None) -> Optional[List[Tuple[Document, float]]]:
+    """Top-k by exact cosine, or None if the bot's index is not ready yet"""
+    index = get_index(bot_id, count)
+    if index is None:
+        return None
+    query_vector = np.asarray(vector_store.get_embeddings().embed_query(query), dtype=np.float32)
+    query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+    return index.search(query_vector, k)
+
+
+def search_with_relevance_scores(bot_id: str, query: str, k: int = 4, count: Optional[int] = None) -> List[Tuple[Document, float]]:
+    """
+    (Document, relevance) pairs, best first. Exact search up to
+    EXACT_SEARCH_MAX_CHUNKS chunks, Chroma's HNSW index above that.
+    Relevance is cosine similarity on both paths.
+    """
+    # Leased so the collection is not dropped or swapped mid-query
+    with vector_store.lease(bot_id):
+        store = vector_store.get_vector_store(bot_id)
+        count = store._collection.count() if count is None else count
+
+        if 0 < count <= EXACT_SEARCH_MAX_CHUNKS:
+            try:
+                results = exact_search(bot_id, query, k=k, count=count)
+                if results is not None:
+                    return results
+            except Exception as e:
+                logger.warning(f"Exact search failed for {bot_id}, using ANN: {e}")
+
+        return store.similarity_search_with_relevance_scores(query, k=k)
+
+
+def _query_matrix(queries: List[str]) -> np.ndarray:
+    """All queries embedded in one batched forward pass, as unit vectors"""
+    matrix = np.asarray(vector_store.get_embeddings().embed_documents(queries), dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return matrix
+
+
+def batch_search_with_relevance_scores(
+    bot_id: str,
+    queries: List[str],
+    k: int = 4,
+    count: Optional[int] = None
+) -> List[List[Tuple[Document, float]]]:
+    """
+    search_with_relevance_scores for many queries at once: one embedding
+    pass, then one matrix product (exact) or one multi-query Chroma call (ANN).
+    Results are aligned with `queries`.
+    """
+    if not queries:
+        return []
+
+    with vector_store.lease(bot_id):
+        return _batch_search(bot_id, queries, k, count)
+
+
+def _batch_search(bot_id: str, queries: List[str], k: int, count: Optional[int]) -> List[List[Tuple[Document, float]]]:
+    store = vector_store.get_vector_store(bot_id)
+    count = store._collection.count() if count is None else count
+    if not count:
+        return [[] for _ in queries]
+
+    query_matrix = _query_matrix(queries)
+
+    if count <= EXACT_SEARCH_MAX_CHUNKS:
+        try:
+            index = get_index(bot_id, count)
+            if index is not None:
+                return index.search_many(query_matrix, k)
+        except Exception as e:
+            logger.warning(f"Exact batch search failed for {bot_id}, using ANN: {e}")
+
+    found = store._collection.query(
+        query_embeddings=query_matrix.tolist(),
+        n_results=min(k, count),
+        include=["documents", "metadatas", "distances"]
+    )
+    relevance = store._select_relevance_score_fn()
+    return [
+        [
+            (Document(page_content=doc or "", metadata=metadata or {}), relevance(distance))
+            for doc, metadata, distance in zip(docs, metadatas, distances)
+        ]
+        for docs, metadatas, distances in zip(found["documents"], found["metadatas"], found["distances"])
+    ]
@@ -0,0 +1,360 @@
+"""
+Garbage Collector
+=================
+Reaps vector collections and stored files that no live bot owns.
+
+Deleting a bot removes its rows, but its Chroma collection
+(collection_{public_id}) and its object-storage folder
+(botblocks/{public_id}) used to stay behind forever. The reaper:
+
+1. Lists bot collections and storage folders, THEN reads the live bot ids
+   (a bot row always exists before its collection / folder is created, so
+   anything missing from the later read is really orphaned).
+2. Drops orphaned collections that hold no lease (see vector_store.lease);
+   in-use collections are skipped and retried on the next pass.
+3. Deletes orphaned storage folders, asset rows, manifest rows and crawl
+   state, and expired conversation sessions.
+4. Compacts the store: removes segment directories no collection
+   references. VACUUM of chroma.sqlite3 is opt-in (GC_VACUUM=1 or
+   scripts/gc_orphans.py --vacuum with the API stopped) and is skipped
+   while any collection is leased.
+5. Reports what was (or, with dry_run, would be) reclaimed.
+
+Runs every GC_INTERVAL_SECONDS in a daemon thread (0 disables it), after
+each bot deletion for that bot, and from scripts/gc_orphans.py.
+"""
+
+import os
+import time
+import uuid
+import shutil
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import select
+
+from db import crud, models
+from db.database import SessionLocal
+from services import conversation_memory, exact_search, vector_store
+from services.asset_manager import ASSET_ROOT, asset_folder
+from services.object_storage import get_storage
+
+logger = logging.getLogger("GarbageCollector")
+
+GC_INTERVAL_SECONDS = int(os.getenv("GC_INTERVAL_SECONDS", str(6 * 60 * 60)))
+GC_STARTUP_DELAY_SECONDS = int(os.getenv("GC_STARTUP_DELAY_SECONDS", "300"))
+GC_VACUUM = os.getenv("GC_VACUUM", "false").lower() in ("1", "true", "yes")
+
+CHROMA_SQLITE = "chroma.sqlite3"
+
+
+@dataclass
+class GCReport:
+    """What one pass removed (or would remove, in dry-run mode)"""
+    dry_run: bool
+    collections: List[str] = field(default_factory=list)
+    skipped_in_use: List[str] = field(default_factory=list)
+    storage_folders: List[str] = field(default_factory=list)
+    storage_objects: int = 0
+    storage_bytes: int = 0
+    asset_rows: int = 0
+    manifest_rows: int = 0
+    crawl_rows: int = 0
+    conversation_sessions: int = 0
+    segment_dirs: List[str] = field(default_factory=list)
+    vacuumed: bool = False
+    disk_bytes_before: int = 0
+    disk_bytes_after: int = 0
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def disk_bytes_reclaimed(self) -> int:
+        return max(0, self.disk_bytes_before - self.disk_bytes_after)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "dry_run": self.dry_run,
+            "collections": self.collections,
+            "skipped_in_use": self.skipped_in_use,
+            "storage_folders": self.storage_folders,
+            "storage_objects": self.storage_objects,
+            "storage_bytes": self.storage_bytes,
+            "asset_rows": self.asset_rows,
+            "manifest_rows": self.manifest_rows,
+            "crawl_rows": self.crawl_rows,
+            "conversation_sessions": self.conversation_sessions,
+            "segment_dirs": self.segment_dirs,
+            "vacuumed": self.vacuumed,
+            "disk_bytes_before": self.disk_bytes_before,
+            "disk_bytes_after": self.disk_bytes_after,
+            "disk_bytes_reclaimed": self.disk_bytes_reclaimed,
+            "seconds": round(self.seconds, 2),
+            "errors": self.errors,
+        }
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+def directory_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def _live_bot_ids(db) -> Set[str]:
+    return {public_id for (public_id,) in db.query(models.Bot.public_id)}
+
+
+def _orphan_segment_dirs() -> List[str]:
+    """Segment directories (named by segment UUID) that no collection references"""
+    sqlite_path = os.path.join(vector_store.CHROMA_PATH, CHROMA_SQLITE)
+    if not os.path.exists(sqlite_path):
+        return []
+
+    # Directories first: a segment created after this scan is in the table read below
+    candidates = []
+    for entry in os.scandir(vector_store.CHROMA_PATH):
+        if not entry.is_dir():
+            continue
+        try:
+            uuid.UUID(entry.name)
+        except ValueError:
+            continue
+        candidates.append(entry.name)
+
+    conn = sqlite3.connect(sqlite_path, timeout=30)
+    try:
+        segment_ids = {row[0] for row in conn.execute("SELECT id FROM segments")}
+    finally:
+        conn.close()
+
+    return [name for name in candidates if name not in segment_ids]
+
+
+def _vacuum():
+    sqlite_path = os.path.join(vector_store.CHROMA_PATH, CHROMA_SQLITE)
+    if not os.path.exists(sqlite_path):
+        return
+    conn = sqlite3.connect(sqlite_path, timeout=60, isolation_level=None)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+# ============================================================================
+# REAPER
+# ============================================================================
+_run_lock = threading.Lock()
+_last_report: Optional[GCReport] = None
+
+
+def collect(dry_run: bool = False, compact: bool = True, vacuum: bool = GC_VACUUM) -> GCReport:
+    """
+    One full garbage-collection pass.
+
+    Args:
+        dry_run: Only report what would be removed
+        compact: Remove unreferenced segment dirs after deleting
+        vacuum: Also VACUUM chroma.sqlite3 (needs exclusive access: skipped
+                while a collection is leased in this process, and other
+                processes using the store should be stopped)
+    """
+    global _last_report
+
+    report = GCReport(dry_run=dry_run)
+    start_time = time.time()
+
+    with _run_lock:
+        report.disk_bytes_before = directory_size(vector_store.CHROMA_PATH)
+        storage = get_storage()
+
+        # 1. Snapshot what exists before reading who is alive
+        try:
+            collection_bots = {
+                bot_id for bot_id in (
+                    vector_store.bot_id_from_collection(c.name)
+                    for c in vector_store.get_client().list_collections()
+                ) if bot_id
+            }
+        except Exception as e:
+            report.errors.append(f"list collections: {e}")
+            collection_bots = set()
+
+        try:
+            folder_bots = set(storage.list_folders(ASSET_ROOT))
+        except Exception as e:
+            report.errors.append(f"list storage folders: {e}")
+            folder_bots = set()
+
+        db = SessionLocal()
+        try:
+            live = _live_bot_ids(db)
+
+            # 2. Collections
+            for bot_id in sorted(collection_bots - live):
+                name = vector_store.collection_name(bot_id)
+                if vector_store.in_use(bot_id):
+                    report.skipped_in_use.append(name)
+                    continue
+                if dry_run:
+                    report.collections.append(name)
+                    continue
+                try:
+                    if vector_store.drop_collection(bot_id):
+                        report.collections.append(name)
+                    else:
+                        report.skipped_in_use.append(name)
+                except Exception as e:
+                    report.errors.append(f"{name}: {e}")
+
+            # 3. Stored files
+            for bot_id in sorted(folder_bots - live):
+                folder = asset_folder(bot_id)
+                try:
+                    objects, size = storage.folder_usage(folder) if dry_run else storage.delete_folder(folder)
+                    report.storage_folders.append(folder)
+                    report.storage_objects += objects
+                    report.storage_bytes += size
+                except Exception as e:
+                    report.errors.append(f"{folder}: {e}")
+
+            # 4. Rows left behind by deletes that bypassed the ORM cascade
+            orphan_assets = db.query(models.Asset).filter(
+                ~models.Asset.bot_id.in_(select(models.Bot.id))
+            )
+            orphan_sources = db.query(models.KnowledgeSource.bot_public_id).filter(
+                ~models.KnowledgeSource.bot_public_id.in_(select(models.Bot.public_id))
+            ).distinct()
+            orphan_crawls = db.query(models.CrawlPageState.bot_public_id).filter(
+                ~models.CrawlPageState.bot_public_id.in_(select(models.Bot.public_id))
+            ).distinct()
+
+            report.asset_rows = orphan_assets.count()
+            if dry_run:
+                report.manifest_rows = sum(
+                    len(crud.list_sources(db, bot_id)) for (bot_id,) in orphan_sources
+                )
+                report.crawl_rows = sum(
+                    len(crud.get_crawl_states(db, bot_id)) for (bot_id,) in orphan_crawls
+                )
+            else:
+                orphan_assets.delete(synchronize_session=False)
+                db.commit()
+                report.manifest_rows = sum(
+                    crud.delete_bot_sources(db, bot_id) for (bot_id,) in orphan_sources.all()
+                )
+                report.crawl_rows = sum(
+                    crud.delete_crawl_state(db, bot_id) for (bot_id,) in orphan_crawls.all()
+                )
+
+        except Exception as e:
+            db.rollback()
+            report.errors.append(f"database: {e}")
+        finally:
+            db.close()
+
+        if not dry_run:
+            try:
+                report.conversation_sessions = conversation_memory.get_memory().purge_expired()
+            except Exception as e:
+                report.errors.append(f"conversation sessions: {e}")
+
+        # 5. Compaction
+        if compact:
+            try:
+                report.segment_dirs = _orphan_segment_dirs()
+                if not dry_run:
+                    for segment in report.segment_dirs:
+                        shutil.rmtree(os.path.join(vector_store.CHROMA_PATH, segment), ignore_errors=True)
+                    if vacuum and (report.collections or report.segment_dirs):
+                        if vector_store.any_in_use():
+                            logger.info("VACUUM skipped: collections in use")
+                        else:
+                            _vacuum()
+                            report.vacuumed = True
+            except Exception as e:
+                report.errors.append(f"compact: {e}")
+
+        report.disk_bytes_after = directory_size(vector_store.CHROMA_PATH)
+        report.seconds = time.time() - start_time
+        _last_report = report
+
+    logger.info(
+        f"GC {'(dry run) ' if dry_run else ''}collections={len(report.collections)} "
+        f"folders={len(report.storage_folders)} storage_bytes={report.storage_bytes} "
+        f"disk_reclaimed={report.disk_bytes_reclaimed} errors={len(report.errors)}"
+    )
+    return report
+
+
+def collect_bot(bot_public_id: str) -> bool:
+    """
+    Reap one deleted bot right away (called after bot deletion).
+    If its collection is still in use, the periodic reaper picks it up later.
+    """
+    db = SessionLocal()
+    try:
+        if crud.get_bot_by_public_id(db, bot_public_id):
+            return False
+        crud.delete_crawl_state(db, bot_public_id)
+    finally:
+        db.close()
+
+    try:
+        dropped = vector_store.drop_collection(bot_public_id)
+    except Exception as e:
+        logger.warning(f"Could not drop collection for {bot_public_id}: {e}")
+        dropped = False
+
+    exact_search.discard(bot_public_id)
+
+    try:
+        get_storage().delete_folder(asset_folder(bot_public_id))
+    except Exception as e:
+        logger.warning(f"Could not delete stored files for {bot_public_id}: {e}")
+
+    return dropped
+
+
+def last_report() -> Optional[Dict[str, Any]]:
+    return _last_report.to_dict() if _last_report else None
+
+
+# ============================================================================
+# BACKGROUND THREAD
+# ============================================================================
+_reaper: Optional[threading.Thread] = None
+
+
+def _reaper_loop():
+    time.sleep(GC_STARTUP_DELAY_SECONDS)
+    while True:
+        try:
+            collect()
+        except Exception as e:
+            logger.error(f"GC pass failed: {e}", exc_info=True)
+        time.sleep(GC_INTERVAL_SECONDS)
+
+
+def start_reaper() -> bool:
+    """Start the periodic reaper (no-op if disabled or already running)"""
+    global _reaper
+
+    if GC_INTERVAL_SECONDS <= 0 or (_reaper and _reaper.is_alive()):
+        return False
+
+    _reaper = threading.Thread(target=_reaper_loop, name="gc-reaper", daemon=True)
+    _reaper.start()
+    logger.info(f"GC reaper started (every {GC_INTERVAL_SECONDS}s)")
+    return True
@@ -0,0 +1,111 @@
+"""
+Index Profiles
+==============
+HNSW construction / search parameters per bot, chosen by collection size.
+
+    profile   chunks        M    ef_construction   ef_search
+    small     < 5k          16   100               64
+    medium    < 50k         24   200               128
+    large     >= 50k        32   400               200
+
+A bot's profile is "auto" (picked from its current size) unless an
+operator pins one or overrides single parameters (Bot.index_profile /
+Bot.index_params). M and ef_construction are fixed when a collection is
+built, so changing them rebuilds the collection (see
+services/index_tuning.py); ef_search is applied in place.
+"""
+
+import json
+from dataclasses import dataclass, asdict, replace
+from typing import Any, Dict, Optional
+
+AUTO = "auto"
+DEFAULT_SPACE = "cosine"
+
+# What Chroma builds with when a collection's metadata does not say
+CHROMA_DEFAULT_M = 16
+CHROMA_DEFAULT_CONSTRUCTION_EF = 100
+
+
+@dataclass(frozen=True)
+class IndexProfile:
+    name: str
+    m: int
+    ef_construction: int
+    ef_search: int
+    max_chunks: Optional[int] = None  # upper bound for auto selection
+
+    def to_metadata(self, space: str = DEFAULT_SPACE) -> Dict[str, Any]:
+        """Chroma collection metadata for this profile"""
+        return {
+            "hnsw:space": space,
+            "hnsw:M": self.m,
+            "hnsw:construction_ef": self.ef_construction,
+            "hnsw:search_ef": self.ef_search,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def same_construction(self, metadata: Optional[Dict[str, Any]]) -> bool:
+        """
+        True if a collection built with `metadata` already has this M / ef_construction
+        (collections created without them were built with Chroma's defaults)
+        """
+        metadata = metadata or {}
+        return (
+            metadata.get("hnsw:M", CHROMA_DEFAULT_M) == self.m
+            and metadata.get("hnsw:construction_ef", CHROMA_DEFAULT_CONSTRUCTION_EF) == self.ef_construction
+        )
+
+
+PROFILES: Dict[str, IndexProfile] = {
+    "small": IndexProfile("small", m=16, ef_construction=100, ef_search=64, max_chunks=5_000),
+    "medium": IndexProfile("medium", m=24, ef_construction=200, ef_search=128, max_chunks=50_000),
+    "large": IndexProfile("large", m=32, ef_construction=400, ef_search=200),
+}
+
+# New (empty) collections start with the small profile
+DEFAULT_PROFILE = PROFILES["small"]
+
+TUNABLE_PARAMS = ("m", "ef_construction", "ef_search")
+
+
+def profile_for_size(chunks: int) -> IndexProfile:
+    """Smallest profile whose max_chunks covers the collection"""
+    for profile in PROFILES.values():
+        if profile.max_chunks is None or chunks < profile.max_chunks:
+            return profile
+    return PROFILES["large"]
+
+
+def parse_params(raw: Optional[str]) -> Dict[str, int]:
+    """Bot.index_params JSON -> validated overrides"""
+    if not raw:
+        return {}
+    try:
+        params = json.loads(raw)
+    except ValueError:
+        return {}
+    return {k: int(v) for k, v in params.items() if k in TUNABLE_PARAMS and v}
+
+
+def resolve_profile(profile_name: Optional[str], params: Optional[Dict[str, int]], chunks: int) -> IndexProfile:
+    """
+    Effective profile for a bot.
+
+    Args:
+        profile_name: Pinned profile, or None / "auto" to choose by size
+        params: Operator overrides (m, ef_construction, ef_search)
+        chunks: Current collection size
+    """
+    if profile_name and profile_name != AUTO:
+        if profile_name not in PROFILES:
+            raise ValueError(f"Unknown index profile: {profile_name}")
+        profile = PROFILES[profile_name]
+    else:
+        profile = profile_for_size(chunks)
+
+    if params:
+        profile = replace(profile, name=f"{profile.name}+custom", **params)
+    return profile
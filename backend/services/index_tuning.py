@@ -0,0 +1,276 @@
+"""
+Index Tuning
+============
+Applies index profiles (services/index_profiles.py) to bot collections and
+measures recall / latency trade-offs on a bot's own vectors.
+
+- apply_profile: ef_search is changed in place; a different M or
+  ef_construction rebuilds the collection through the CollectionMigrator
+  (shadow copy + swap, stored embeddings reused). A failed rebuild resumes
+  from its checkpoint on the next attempt; a finished one removes it.
+- retune_all: re-picks "auto" profiles as collections grow; runs every
+  INDEX_RETUNE_INTERVAL_SECONDS in a daemon thread (0 disables it). Bots
+  whose collection is in use are skipped until the next pass.
+- sweep: builds throwaway in-memory indexes over a sample of the bot's
+  vectors for every parameter combination and reports recall@k against
+  exact search plus query latency (used by scripts/tune_index.py).
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from dataclasses import dataclass
+from itertools import product
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import chromadb
+
+from db import models
+from db.database import SessionLocal
+from services import vector_store
+from services.collection_migration import CollectionMigrator, MigrationPlan
+from services.index_profiles import IndexProfile, AUTO, parse_params, resolve_profile
+
+logger = logging.getLogger("IndexTuning")
+
+INDEX_RETUNE_INTERVAL_SECONDS = int(os.getenv("INDEX_RETUNE_INTERVAL_SECONDS", "3600"))
+SWEEP_MAX_VECTORS = int(os.getenv("INDEX_SWEEP_MAX_VECTORS", "50000"))
+SWEEP_BUILD_BATCH = 5000
+
+
+# ============================================================================
+# PROFILES ON LIVE COLLECTIONS
+# ============================================================================
+def collection_size(bot_id: str) -> int:
+    return vector_store.get_vector_store(bot_id)._collection.count()
+
+
+def effective_profile(bot: models.Bot, chunks: Optional[int] = None) -> IndexProfile:
+    chunks = collection_size(bot.public_id) if chunks is None else chunks
+    return resolve_profile(bot.index_profile, parse_params(bot.index_params), chunks)
+
+
+def current_search_ef(collection) -> Optional[int]:
+    """ef_search in effect: the collection configuration if available, else its metadata"""
+    try:
+        return collection.configuration_json["hnsw"]["ef_search"]
+    except Exception:
+        return (collection.metadata or {}).get("hnsw:search_ef")
+
+
+def set_search_ef(collection, ef_search: int) -> bool:
+    """Change ef_search without rebuilding (needs Chroma's collection configuration API)"""
+    try:
+        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+        return True
+    except Exception as e:
+        logger.warning(f"ef_search of {collection.name} not updatable in place: {e}")
+        return False
+
+
+def apply_profile(bot_id: str, profile: IndexProfile) -> Dict[str, Any]:
+    """
+    Bring a bot's collection in line with a profile.
+
+    Returns:
+        {"bot_id", "profile", "action": "unchanged" | "search_ef" | "rebuilt" | "failed"}
+    """
+    collection = vector_store.get_vector_store(bot_id)._collection
+    metadata = collection.metadata or {}
+    space = metadata.get("hnsw:space", vector_store.COLLECTION_METADATA["hnsw:space"])
+    result = {"bot_id": bot_id, "profile": profile.to_dict(), "action": "unchanged"}
+
+    if not profile.same_construction(metadata):
+        # Same target -> same plan name, so a failed rebuild resumes from its checkpoint
+        plan = MigrationPlan(
+            name=f"index-{bot_id}-m{profile.m}-ef{profile.ef_construction}",
+            target_metadata=profile.to_metadata(space),
+            reembed="never"
+        )
+        migrator = CollectionMigrator(plan, workers=1)
+        progress = migrator.migrate_collection(collection.name)
+        result["action"] = "rebuilt" if progress.state == "done" else "failed"
+        if progress.state == "done":
+            migrator.checkpoint.remove()
+        if progress.error:
+            result["error"] = progress.error
+
+    elif current_search_ef(collection) != profile.ef_search:
+        result["action"] = "search_ef" if set_search_ef(collection, profile.ef_search) else "failed"
+
+    logger.info(f"Index profile {profile.name} for {bot_id}: {result['action']}")
+    return result
+
+
+def retune_all() -> List[Dict[str, Any]]:
+    """Re-pick the size-based profile of every "auto" bot whose collection changed class"""
+    db = SessionLocal()
+    try:
+        bots = db.query(models.Bot).filter(
+            (models.Bot.index_profile == None) | (models.Bot.index_profile == AUTO)  # noqa: E711
+        ).all()
+        targets = [(bot.public_id, effective_profile(bot)) for bot in bots]
+    finally:
+        db.close()
+
+    results = []
+    for bot_id, profile in targets:
+        if vector_store.in_use(bot_id):
+            logger.info(f"Retune of {bot_id} deferred: collection in use")
+            continue
+        try:
+            result = apply_profile(bot_id, profile)
+            if result["action"] != "unchanged":
+                results.append(result)
+        except Exception as e:
+            logger.error(f"Retune of {bot_id} failed: {e}")
+    return results
+
+
+_tuner: Optional[threading.Thread] = None
+
+
+def _tuner_loop():
+    while True:
+        time.sleep(INDEX_RETUNE_INTERVAL_SECONDS)
+        try:
+            retune_all()
+        except Exception as e:
+            logger.error(f"Index retune pass failed: {e}", exc_info=True)
+
+
+def start_autotuner() -> bool:
+    """Start the periodic retune thread (no-op if disabled or already running)"""
+    global _tuner
+
+    if INDEX_RETUNE_INTERVAL_SECONDS <= 0 or (_tuner and _tuner.is_alive()):
+        return False
+
+    _tuner = threading.Thread(target=_tuner_loop, name="index-tuner", daemon=True)
+    _tuner.start()
+    return True
+
+
+# ============================================================================
+# PARAMETER SWEEP
+# ============================================================================
+@dataclass
+class SweepPoint:
+    m: int
+    ef_construction: int
+    ef_search: int
+    recall: float
+    p50_ms: float
+    p95_ms: float
+    build_seconds: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return vars(self).copy()
+
+
+def load_vectors(bot_id: str, max_vectors: int = SWEEP_MAX_VECTORS):
+    """(ids, normalized float32 matrix) for up to max_vectors records of a bot"""
+    collection = vector_store.get_vector_store(bot_id)._collection
+    ids, chunks = [], []
+
+    for page in vector_store.iter_collection(collection, include=("embeddings",)):
+        ids.extend(page["ids"])
+        chunks.append(np.asarray(page["embeddings"], dtype=np.float32))
+        if len(ids) >= max_vectors:
+            break
+
+    if not chunks:
+        return [], np.zeros((0, 0), dtype=np.float32)
+
+    matrix = np.concatenate(chunks)[:max_vectors]
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return ids[:max_vectors], matrix
+
+
+def exact_neighbours(matrix: np.ndarray, query_rows: np.ndarray, k: int) -> List[set]:
+    """Ground truth top-k by cosine, excluding the query's own row"""
+    scores = matrix[query_rows] @ matrix.T
+    scores[np.arange(len(query_rows)), query_rows] = -np.inf
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def _build(client, ids: List[str], matrix: np.ndarray, profile: IndexProfile):
+    collection = client.create_collection(f"sweep-{uuid.uuid4().hex[:12]}", metadata=profile.to_metadata())
+    for start in range(0, len(ids), SWEEP_BUILD_BATCH):
+        collection.add(ids=ids[start:start + SWEEP_BUILD_BATCH], embeddings=matrix[start:start + SWEEP_BUILD_BATCH])
+    return collection
+
+
+def sweep(
+    bot_id: str,
+    ef_search_values: Sequence[int] = (16, 32, 64, 128, 256),
+    m_values: Sequence[int] = (16, 32),
+    ef_construction_values: Sequence[int] = (100, 200),
+    queries: int = 200,
+    k: int = 10,
+    max_vectors: int = SWEEP_MAX_VECTORS,
+    seed: int = 7
+) -> List[SweepPoint]:
+    """
+    Recall@k vs latency for every (M, ef_construction, ef_search) on the bot's own vectors.
+    Indexes are built in an in-memory client; the bot's collection is only read.
+    """
+    ids, matrix = load_vectors(bot_id, max_vectors)
+    if len(ids) <= k:
+        raise ValueError(f"Collection too small to tune ({len(ids)} vectors)")
+
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(ids), size=min(queries, len(ids)), replace=False)
+    truth = exact_neighbours(matrix, query_rows, k)
+    row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+
+    client = chromadb.EphemeralClient()
+    points: List[SweepPoint] = []
+
+    for m, ef_construction in product(m_values, ef_construction_values):
+        collection, build_seconds = None, 0.0
+
+        for ef_search in ef_search_values:
+            # One build per (M, ef_construction); ef_search is switched in place when supported
+            if collection is None or not set_search_ef(collection, ef_search):
+                if collection is not None:
+                    client.delete_collection(collection.name)
+                profile = IndexProfile("sweep", m=m, ef_construction=ef_construction, ef_search=ef_search)
+                start = time.perf_counter()
+                collection = _build(client, ids, matrix, profile)
+                build_seconds = time.perf_counter() - start
+
+            latencies, hits = [], 0
+            for query_row, expected in zip(query_rows, truth):
+                start = time.perf_counter()
+                found = collection.query(query_embeddings=matrix[query_row:query_row + 1], n_results=k + 1, include=[])
+                latencies.append((time.perf_counter() - start) * 1000)
+                rows = [row_of[i] for i in found["ids"][0] if row_of[i] != query_row][:k]
+                hits += len(expected.intersection(rows))
+
+            points.append(SweepPoint(
+                m=m,
+                ef_construction=ef_construction,
+                ef_search=ef_search,
+                recall=hits / (len(query_rows) * k),
+                p50_ms=float(np.percentile(latencies, 50)),
+                p95_ms=float(np.percentile(latencies, 95)),
+                build_seconds=build_seconds,
+            ))
+            logger.info(f"M={m} efC={ef_construction} efS={ef_search}: recall {points[-1].recall:.3f}")
+
+        client.delete_collection(collection.name)
+
+    return points
+
+
+def recommend(points: List[SweepPoint], target_recall: float = 0.95) -> Optional[SweepPoint]:
+    """Fastest point meeting the recall target (highest recall if none does)"""
+    meeting = [p for p in points if p.recall >= target_recall]
+    if meeting:
+        return min(meeting, key=lambda p: (p.p95_ms, p.build_seconds))
+    return max(points, key=lambda p: p.recall) if points else None
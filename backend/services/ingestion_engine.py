@@ -0,0 +1,531 @@
+"""
+Ingestion Engine
+================
+The single path by which content enters a bot's knowledge base.
+
+Used by:
+- File uploads (both upload endpoints)
+- Web scraping
+- Manual Q&A entries (analytics resolve-gap)
+
+Every chunk carries the same metadata schema:
+    source, bot_id, type ("file" | "web" | "manual"), start_index,
+    chunk_index, token_count, chunk_id, ingested_at
+plus optional source-specific keys (url, title, scraped_at, page, ...).
+
+Chunks are produced by the StructuralChunker (services/chunker.py) and
+stored under their deterministic chunk_id: re-ingesting a source upserts
+its chunks and deletes the IDs it no longer produces.
+
+Documents are consumed as a stream and written in batches of
+INGEST_BATCH_SIZE chunks, so memory stays flat regardless of file size.
+Files are read by the streaming loaders in services/document_loaders.py,
+whose structural metadata (heading_path, page, row_start, ...) is kept on
+every chunk.
+
+Each ingested source is also recorded in the knowledge_sources manifest
+(db/models.py KnowledgeSource), so listing sources and stats are SQL
+queries instead of collection scans.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
+from langchain_core.documents import Document
+
+from db import crud
+from db.database import SessionLocal
+from services import vector_store
+from services.chunker import StructuralChunker
+from services.document_loaders import load_document, supported_extensions
+
+logger = logging.getLogger("IngestionEngine")
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_JOB_TTL_SECONDS = int(os.getenv("INGEST_JOB_TTL_SECONDS", "3600"))
+INGEST_JOB_MAX = int(os.getenv("INGEST_JOB_MAX", "1000"))
+
+SOURCE_TYPES = ("file", "web", "manual")
+SUPPORTED_EXTENSIONS = supported_extensions()
+
+
+# ============================================================================
+# RESULTS & METRICS
+# ============================================================================
+@dataclass
+class IngestionResult:
+    """Outcome of ingesting one source"""
+    bot_id: str
+    source: str
+    source_type: str
+    success: bool = False
+    documents: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+    chunk_ids: List[str] = field(default_factory=list, repr=False)
+    started_at: float = field(default_factory=time.time, repr=False)
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds > 0 else 0.0
+
+    def __bool__(self) -> bool:
+        return self.success
+
+
+@dataclass
+class EngineStats:
+    """Running totals across every ingestion handled by the engine"""
+    sources: int = 0
+    failed: int = 0
+    documents: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, result: IngestionResult):
+        with self._lock:
+            self.sources += 1
+            self.failed += 0 if result.success else 1
+            self.documents += result.documents
+            self.chunks += result.chunks
+            self.seconds += result.seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            data = {
+                "sources": self.sources,
+                "failed": self.failed,
+                "documents": self.documents,
+                "chunks": self.chunks,
+                "seconds": round(self.seconds, 3),
+            }
+        data["chunks_per_second"] = round(data["chunks"] / data["seconds"], 2) if data["seconds"] else 0.0
+        return data
+
+
+def build_metadata(
+    bot_id: str,
+    source: str,
+    source_type: str,
+    extra: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Consistent chunk metadata schema for every ingestion path"""
+    if source_type not in SOURCE_TYPES:
+        raise ValueError(f"Unknown source type: {source_type}")
+
+    metadata = dict(extra or {})
+    metadata.update({
+        "source": source,
+        "bot_id": bot_id,
+        "type": source_type,
+        "ingested_at": datetime.now().isoformat()
+    })
+    return metadata
+
+
+# ============================================================================
+# BULK JOBS
+# ============================================================================
+@dataclass
+class IngestionJob:
+    """Progress of a multi-file ingestion (bulk upload / archive)"""
+    job_id: str
+    bot_id: str
+    total_files: int
+    status: str = "queued"  # queued, running, completed, failed
+    processed_files: int = 0
+    failed_files: int = 0
+    chunks: int = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    files: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def record(self, result: IngestionResult):
+        self.processed_files += 1
+        self.failed_files += 0 if result.success else 1
+        self.chunks += result.chunks
+        self.files.append({
+            "source": result.source,
+            "success": result.success,
+            "chunks": result.chunks,
+            "error": result.error,
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.job_id,
+            "bot_id": self.bot_id,
+            "status": self.status,
+            "total_files": self.total_files,
+            "processed_files": self.processed_files,
+            "failed_files": self.failed_files,
+            "progress": round(self.processed_files / self.total_files * 100, 1) if self.total_files else 100.0,
+            "chunks": self.chunks,
+            "elapsed_seconds": round(elapsed, 2),
+            "chunks_per_second": round(self.chunks / elapsed, 2) if elapsed else 0.0,
+            "files": list(self.files),
+            "error": self.error,
+        }
+
+
+_jobs: Dict[str, IngestionJob] = {}
+_jobs_lock = threading.Lock()
+
+
+def _prune_jobs():
+    """Forget jobs finished more than INGEST_JOB_TTL_SECONDS ago, and the oldest finished ones above INGEST_JOB_MAX"""
+    cutoff = time.time() - INGEST_JOB_TTL_SECONDS
+    finished = sorted(
+        (job for job in _jobs.values() if job.finished_at is not None),
+        key=lambda job: job.finished_at
+    )
+    excess = len(_jobs) - INGEST_JOB_MAX
+    for job in finished:
+        if job.finished_at >= cutoff and excess <= 0:
+            break
+        del _jobs[job.job_id]
+        excess -= 1
+
+
+def create_job(bot_id: str, total_files: int) -> IngestionJob:
+    """Register a new bulk ingestion job (kept in memory for progress polling until it expires)"""
+    job = IngestionJob(job_id=str(uuid.uuid4()), bot_id=bot_id, total_files=total_files)
+    with _jobs_lock:
+        _prune_jobs()
+        _jobs[job.job_id] = job
+    return job
+
+
+def get_job(job_id: str) -> Optional[IngestionJob]:
+    return _jobs.get(job_id)
+
+
+# ============================================================================
+# ENGINE
+# ============================================================================
+class ChunkBatcher:
+    """
+    Buffers chunks from one or more sources and writes them batch_size at a time.
+
+    A source is closed (close()) once its last chunk was added. add(), close()
+    and flush() return the closed sources that are now settled: every chunk
+    written, or failed (success False, error set) because a batch holding
+    some of their chunks could not be written.
+    """
+
+    def __init__(self, store, batch_size: int):
+        self.store = store
+        self.batch_size = batch_size
+        self.pending: List[Document] = []
+        self.owners: List[IngestionResult] = []
+        self.written = 0
+        self._closed: List[IngestionResult] = []
+
+    def add(self, chunk: Document, owner: IngestionResult) -> List[IngestionResult]:
+        self.pending.append(chunk)
+        self.owners.append(owner)
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def close(self, owner: IngestionResult) -> List[IngestionResult]:
+        self._closed.append(owner)
+        return self._settled()
+
+    def flush(self) -> List[IngestionResult]:
+        if self.pending:
+            try:
+                self.store.add_documents(self.pending, ids=[c.metadata["chunk_id"] for c in self.pending])
+                vector_store.mark_changed(self.pending[0].metadata["bot_id"])
+                self.written += len(self.pending)
+            except Exception as e:
+                logger.error(f"Writing a batch of {len(self.pending)} chunks failed: {e}")
+                for owner in {id(o): o for o in self.owners}.values():
+                    owner.success = False
+                    owner.error = owner.error or f"Chunk batch write failed: {e}"
+            self.pending, self.owners = [], []
+        return self._settled()
+
+    def _settled(self) -> List[IngestionResult]:
+        waiting = {id(o) for o in self.owners}
+        settled = [r for r in self._closed if id(r) not in waiting]
+        self._closed = [r for r in self._closed if id(r) in waiting]
+        return settled
+
+
+class IngestionEngine:
+    """Chunk, embed and store documents in batches"""
+
+    def __init__(self, batch_size: int = INGEST_BATCH_SIZE, max_workers: int = INGEST_WORKERS):
+        self.batch_size = batch_size
+        self.stats = EngineStats()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.chunker = StructuralChunker()
+
+    # ------------------------------------------------------------------ core
+    def split(
+        self,
+        result: IngestionResult,
+        documents: Iterable[Document],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Document]:
+        """Lazily turn documents into chunks carrying the shared metadata schema"""
+        base_metadata = build_metadata(result.bot_id, result.source, result.source_type, metadata)
+
+        for section, doc in enumerate(documents):
+            result.documents += 1
+            for chunk in self.chunker.chunk(doc, result.source, section):
+                chunk.metadata.update(base_metadata)
+                result.chunks += 1
+                result.chunk_ids.append(chunk.metadata["chunk_id"])
+                yield chunk
+
+    def _record_source(self, result: IngestionResult, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Record the source's chunk IDs in the knowledge_sources manifest and
+        delete chunks a previous ingest of the same source produced but this one did not.
+        """
+        if not result.chunk_ids:
+            return
+
+        metadata = metadata or {}
+        db = SessionLocal()
+        try:
+            stale = crud.record_source(
+                db, result.bot_id, result.source, result.source_type, result.chunk_ids,
+                url=metadata.get("url"),
+                title=metadata.get("title"),
+                scraped_at=metadata.get("scraped_at")
+            )
+            if stale:
+                vector_store.get_vector_store(result.bot_id)._collection.delete(ids=stale)
+                vector_store.mark_changed(result.bot_id)
+                logger.info(f"Removed {len(stale)} stale chunks of {result.source}")
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Manifest update failed for {result.source}: {e}")
+        finally:
+            db.close()
+
+    def _finish(self, result: IngestionResult) -> IngestionResult:
+        result.seconds = time.time() - result.started_at
+        self.stats.record(result)
+        logger.info(
+            f"Ingested {result.source}: {result.documents} docs -> {result.chunks} chunks "
+            f"in {result.seconds:.2f}s ({result.chunks_per_second:.1f} chunks/s)"
+        )
+        return result
+
+    def ingest_documents(
+        self,
+        bot_id: str,
+        documents: Iterable[Document],
+        source: str,
+        source_type: str = "file",
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> IngestionResult:
+        """
+        Stream documents through the chunker and store chunks in batches.
+
+        Args:
+            bot_id: Bot public_id (UUID string)
+            documents: Any iterable of Documents (consumed lazily)
+            source: Source identifier (filename or web source name)
+            source_type: "file", "web" or "manual"
+            metadata: Extra metadata merged into every chunk
+        """
+        result = IngestionResult(bot_id=bot_id, source=source, source_type=source_type)
+
+        try:
+            with vector_store.lease(bot_id):
+                batcher = ChunkBatcher(vector_store.get_vector_store(bot_id), self.batch_size)
+                for chunk in self.split(result, documents, metadata):
+                    batcher.add(chunk, result)
+                    if result.error:
+                        break
+                batcher.close(result)
+                batcher.flush()
+                result.success = result.error is None
+                if result.success:
+                    self._record_source(result, metadata)
+
+        except Exception as e:
+            logger.error(f"Ingestion failed for {source} (bot {bot_id}): {e}", exc_info=True)
+            result.error = result.error or str(e)
+
+        return self._finish(result)
+
+    def ingest_text(
+        self,
+        bot_id: str,
+        content: str,
+        source: str,
+        source_type: str = "web",
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> IngestionResult:
+        """Ingest a single block of raw text"""
+        return self.ingest_documents(
+            bot_id, [Document(page_content=content)], source, source_type, metadata
+        )
+
+    @staticmethod
+    def load_file(file_path: str) -> Iterable[Document]:
+        """Lazy section loader for a local file (raises ValueError if unsupported)"""
+        return load_document(file_path)
+
+    def ingest_file(self, bot_id: str, file_path: str, source: Optional[str] = None) -> IngestionResult:
+        """Load a local file and ingest it as a "file" source"""
+        source = source or os.path.basename(file_path)
+
+        try:
+            documents = self.load_file(file_path)
+        except ValueError as e:
+            logger.warning(str(e))
+            result = IngestionResult(bot_id=bot_id, source=source, source_type="file", error=str(e))
+            self.stats.record(result)
+            return result
+
+        return self.ingest_documents(bot_id, documents, source, "file")
+
+    def ingest_files(self, job: IngestionJob, files: List[Tuple[str, str]]) -> IngestionJob:
+        """
+        Ingest many local files as one job.
+        All files share one collection handle, one embedder and one chunk
+        batcher, so small files are embedded together instead of one call each.
+        A file is recorded in the job (and the manifest) once all its chunks
+        are written, so a failed batch write marks its files failed.
+
+        Args:
+            job: Job created with create_job (progress is updated in place)
+            files: (file_path, source) pairs
+        """
+        job.status = "running"
+        job.started_at = time.time()
+
+        try:
+            with vector_store.lease(job.bot_id):
+                batcher = ChunkBatcher(vector_store.get_vector_store(job.bot_id), self.batch_size)
+
+                def settle(settled: List[IngestionResult]):
+                    for result in settled:
+                        # Manifest rows only once every chunk is actually in the collection
+                        if result.success:
+                            self._record_source(result)
+                        job.record(self._finish(result))
+
+                for file_path, source in files:
+                    result = IngestionResult(bot_id=job.bot_id, source=source, source_type="file")
+                    try:
+                        for chunk in self.split(result, self.load_file(file_path)):
+                            settle(batcher.add(chunk, result))
+                            if result.error:
+                                break
+                        result.success = result.error is None
+                    except Exception as e:
+                        logger.error(f"Bulk ingestion failed for {source}: {e}")
+                        result.success = False
+                        result.error = result.error or str(e)
+
+                    settle(batcher.close(result))
+
+                settle(batcher.flush())
+                job.status = "completed"
+
+        except Exception as e:
+            logger.error(f"Bulk ingestion job {job.job_id} failed: {e}", exc_info=True)
+            job.status = "failed"
+            job.error = str(e)
+
+        job.finished_at = time.time()
+        return job
+
+    def ingest_stream(
+        self,
+        bot_id: str,
+        items: Iterable[Tuple[str, str, Optional[Dict[str, Any]]]],
+        source_type: str = "web",
+        on_result=None
+    ) -> List[IngestionResult]:
+        """
+        Ingest a stream of (source, content, metadata) texts, e.g. scraped pages
+        arriving from a pipeline. Like ingest_files, every source shares one
+        collection handle and chunk batcher, so chunks of many small pages are
+        embedded together. Items are consumed as they arrive.
+
+        Args:
+            on_result: Called with each source's IngestionResult once it is
+                settled: all its chunks written and its manifest row recorded
+                (or failed)
+        """
+        results: List[IngestionResult] = []
+
+        with vector_store.lease(bot_id):
+            batcher = ChunkBatcher(vector_store.get_vector_store(bot_id), self.batch_size)
+            metadata_by_source: Dict[str, Optional[Dict[str, Any]]] = {}
+
+            def settle(settled: List[IngestionResult]):
+                for result in settled:
+                    metadata = metadata_by_source.pop(result.source, None)
+                    # Manifest rows only once every chunk is actually in the collection
+                    if result.success:
+                        self._record_source(result, metadata)
+                    self._finish(result)
+                    if on_result:
+                        on_result(result)
+
+            for source, content, metadata in items:
+                result = IngestionResult(bot_id=bot_id, source=source, source_type=source_type)
+                results.append(result)
+                metadata_by_source[source] = metadata
+                try:
+                    for chunk in self.split(result, [Document(page_content=content)], metadata):
+                        settle(batcher.add(chunk, result))
+                        if result.error:
+                            break
+                    result.success = result.error is None
+                except Exception as e:
+                    logger.error(f"Stream ingestion failed for {source}: {e}")
+                    result.success = False
+                    result.error = result.error or str(e)
+
+                settle(batcher.close(result))
+
+            settle(batcher.flush())
+
+        return results
+
+    # ----------------------------------------------------------------- async
+    def submit(self, method: str, *args, **kwargs) -> Future:
+        """Run an engine method on the ingestion pool (fire-and-forget friendly)"""
+        return self._executor.submit(getattr(self, method), *args, **kwargs)
+
+    async def run_async(self, method: str, *args, **kwargs) -> IngestionResult:
+        """Await an engine method without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(method, *args, **kwargs))
+
+
+_engine: Optional[IngestionEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> IngestionEngine:
+    """Process-wide ingestion engine"""
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = IngestionEngine()
+        return _engine
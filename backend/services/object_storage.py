@@ -0,0 +1,214 @@
+"""
+Object Storage
+==============
+Pluggable storage for uploaded knowledge files.
+
+Backends:
+- cloudinary (default): raw uploads under botblocks/{bot_public_id}
+- local: plain files under OBJECT_STORAGE_PATH, served from /storage
+
+Select the backend with OBJECT_STORAGE_BACKEND=cloudinary|local
+"""
+
+import os
+import shutil
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger("ObjectStorage")
+
+OBJECT_STORAGE_BACKEND = os.getenv("OBJECT_STORAGE_BACKEND", "cloudinary").lower()
+LOCAL_STORAGE_PATH = os.getenv("OBJECT_STORAGE_PATH", os.path.join(".", "data", "storage"))
+LOCAL_STORAGE_URL_PREFIX = "/storage"
+
+
+@dataclass
+class StoredObject:
+    """Result of a successful upload"""
+    url: str
+    object_id: str
+    size: int
+
+
+# ============================================================================
+# INTERFACE
+# ============================================================================
+class ObjectStorage:
+    """Interface every storage backend implements"""
+
+    name = "base"
+
+    def put_file(self, local_path: str, folder: str) -> StoredObject:
+        """Upload a local file into folder, keeping its filename"""
+        raise NotImplementedError
+
+    def delete(self, object_id: str) -> bool:
+        """Delete a stored object by the id returned from put_file"""
+        raise NotImplementedError
+
+    def list_folders(self, root: str) -> List[str]:
+        """Names of the immediate subfolders of root"""
+        raise NotImplementedError
+
+    def folder_usage(self, folder: str) -> Tuple[int, int]:
+        """(objects, bytes) stored under folder"""
+        raise NotImplementedError
+
+    def delete_folder(self, folder: str) -> Tuple[int, int]:
+        """Delete everything under folder; returns the (objects, bytes) removed"""
+        raise NotImplementedError
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+class CloudinaryStorage(ObjectStorage):
+    """Cloudinary raw uploads (production)"""
+
+    name = "cloudinary"
+
+    def put_file(self, local_path: str, folder: str) -> StoredObject:
+        import cloudinary.uploader
+
+        res = cloudinary.uploader.upload(
+            local_path,
+            folder=folder,
+            resource_type="raw",
+            use_filename=True,
+            unique_filename=False
+        )
+        return StoredObject(
+            url=res.get("secure_url"),
+            object_id=res.get("public_id"),
+            size=res.get("bytes") or os.path.getsize(local_path)
+        )
+
+    def delete(self, object_id: str) -> bool:
+        import cloudinary.uploader
+
+        res = cloudinary.uploader.destroy(object_id, resource_type="raw")
+        return res.get("result") == "ok"
+
+    def list_folders(self, root: str) -> List[str]:
+        import cloudinary.api
+
+        names, cursor = [], None
+        while True:
+            options = {"max_results": 500}
+            if cursor:
+                options["next_cursor"] = cursor
+            try:
+                res = cloudinary.api.subfolders(root, **options)
+            except cloudinary.api.NotFound:
+                return names
+            names.extend(folder["name"] for folder in res.get("folders", []))
+            cursor = res.get("next_cursor")
+            if not cursor:
+                return names
+
+    def folder_usage(self, folder: str) -> Tuple[int, int]:
+        import cloudinary.api
+
+        objects, size, cursor = 0, 0, None
+        while True:
+            options = {"type": "upload", "resource_type": "raw", "prefix": f"{folder}/", "max_results": 500}
+            if cursor:
+                options["next_cursor"] = cursor
+            res = cloudinary.api.resources(**options)
+            for resource in res.get("resources", []):
+                objects += 1
+                size += resource.get("bytes", 0)
+            cursor = res.get("next_cursor")
+            if not cursor:
+                return objects, size
+
+    def delete_folder(self, folder: str) -> Tuple[int, int]:
+        import cloudinary.api
+
+        usage = self.folder_usage(folder)
+        # delete_resources_by_prefix removes up to 1000 per call and reports "partial"
+        while True:
+            res = cloudinary.api.delete_resources_by_prefix(f"{folder}/", resource_type="raw")
+            if not res.get("partial"):
+                break
+        try:
+            cloudinary.api.delete_folder(folder)
+        except Exception as e:
+            logger.warning(f"Could not remove empty folder {folder}: {e}")
+        return usage
+
+
+class LocalStorage(ObjectStorage):
+    """Local filesystem stand-in for development and tests"""
+
+    name = "local"
+
+    def __init__(self, root: str = LOCAL_STORAGE_PATH):
+        self.root = root
+
+    def _path(self, object_id: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, object_id))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Object id escapes storage root: {object_id}")
+        return path
+
+    def put_file(self, local_path: str, folder: str) -> StoredObject:
+        object_id = f"{folder}/{os.path.basename(local_path)}"
+        target = self._path(object_id)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(local_path, target)
+
+        return StoredObject(
+            url=f"{LOCAL_STORAGE_URL_PREFIX}/{object_id}",
+            object_id=object_id,
+            size=os.path.getsize(target)
+        )
+
+    def delete(self, object_id: str) -> bool:
+        path = self._path(object_id)
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        return True
+
+    def list_folders(self, root: str) -> List[str]:
+        path = self._path(root)
+        if not os.path.isdir(path):
+            return []
+        return [entry.name for entry in os.scandir(path) if entry.is_dir()]
+
+    def folder_usage(self, folder: str) -> Tuple[int, int]:
+        objects, size = 0, 0
+        for dirpath, _, filenames in os.walk(self._path(folder)):
+            for filename in filenames:
+                objects += 1
+                size += os.path.getsize(os.path.join(dirpath, filename))
+        return objects, size
+
+    def delete_folder(self, folder: str) -> Tuple[int, int]:
+        usage = self.folder_usage(folder)
+        shutil.rmtree(self._path(folder), ignore_errors=True)
+        return usage
+
+
+BACKENDS = {
+    CloudinaryStorage.name: CloudinaryStorage,
+    LocalStorage.name: LocalStorage,
+}
+
+_storage: Optional[ObjectStorage] = None
+
+
+def get_storage() -> ObjectStorage:
+    """Return the configured storage backend (created once per process)"""
+    global _storage
+
+    if _storage is None:
+        backend = BACKENDS.get(OBJECT_STORAGE_BACKEND)
+        if backend is None:
+            logger.warning(f"Unknown OBJECT_STORAGE_BACKEND '{OBJECT_STORAGE_BACKEND}', using local")
+            backend = LocalStorage
+        _storage = backend()
+
+    return _storage
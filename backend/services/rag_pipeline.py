@@ -1,24 +1,26 @@
 from sqlalchemy.orm import Session
-from langchain_chroma import Chroma
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_huggingface import HuggingFaceEmbeddings 
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from core.config import settings
 from db import models
+from db.database import SessionLocal
+from services import vector_store as vector_stores
+from services import conversation_memory, data_ingestion, exact_search
+from services.ingestion_engine import get_engine
 import os
-import tempfile
 import json
 import logging
 import re
-from typing import Tuple, Dict, Any
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("RAG_Pipeline")
 
-CHROMA_PATH = os.path.join(tempfile.gettempdir(), "botblocks_chroma_db")
+CHROMA_PATH = vector_stores.CHROMA_PATH
+BATCH_CHAT_CONCURRENCY = int(os.getenv("BATCH_CHAT_CONCURRENCY", "8"))
 
 # ============================================================================
 # SEMANTIC ROUTER - Save tokens on simple queries
@@ -173,11 +175,117 @@ def get_adaptive_k(query: str) -> int:
         return 9  # Increased from 7
 
 
+def build_context(docs) -> str:
+    """Join retrieved chunks, labelling each with its structural location when known"""
+    parts = []
+    for d in docs:
+        location = d.metadata.get("heading_path")
+        if not location and d.metadata.get("row_start") is not None:
+            location = f"rows {d.metadata['row_start']}-{d.metadata.get('row_end')}"
+        if location:
+            parts.append(f"[{d.metadata.get('source', 'document')} | {location}]\n{d.page_content}")
+        else:
+            parts.append(d.page_content)
+    return "\n\n".join(parts)
+
+
+def routed_reply(bot: models.Bot, message: str, route_type: str) -> str:
+    """Answer greetings / identity questions without retrieval"""
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        temperature=0.7,
+        google_api_key=settings.GOOGLE_API_KEY,
+        transport="rest"
+    )
+    
+    if route_type == 'greeting':
+        prompt = f"{bot.system_prompt}\n\nUser said: {message}\n\nRespond warmly and briefly."
+    else:
+        prompt = f"{bot.system_prompt}\n\nUser asked: {message}\n\nIntroduce yourself based on your role."
+    
+    return llm.invoke(prompt).content
+
+
+def relevance_threshold(best_score: float) -> float:
+    """Lower bar when even the best chunk is only moderately relevant (general questions)"""
+    return 0.30 if best_score < 0.50 else 0.35
+
+
+def build_answer_chain(bot: models.Bot, with_history: bool = False):
+    """Prompt | LLM for grounded JSON answers; returns (chain, system_instructions)"""
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        temperature=0.1,
+        google_api_key=settings.GOOGLE_API_KEY,
+        transport="rest"
+    )
+    
+    # ✅ SIMPLIFIED PROMPT - Minimal tokens, maximum clarity
+    system_instructions = f"""You are: {bot.system_prompt}
+
+Answer using ONLY the Context below.
+
+Rules:
+- If Context has the answer (even partial): Give it, confidence 0.5-1.0
+- If question is unrelated to your purpose: confidence 0.0, out_of_scope true
+- If relevant but Context truly has nothing: confidence 0.0, out_of_scope false
+
+Note: "results" = "accuracy" = "metrics" = "performance" (same meaning)
+
+JSON format:
+{{"response": "answer", "confidence": 0.0-1.0, "out_of_scope": true/false}}"""
+    
+    # Conversation memory: summary + recent turns (bounded, see conversation_memory)
+    history_section = "\nConversation so far:\n{history}\n" if with_history else ""
+    prompt = ChatPromptTemplate.from_template("""
+{system_instructions}
+
+Context:
+{context}
+""" + history_section + """
+Question: {question}
+
+Respond with valid JSON only.
+""")
+    return prompt | llm, system_instructions
+
+
+def batch_retrieve(bot_id: str, queries: List[str], k: Optional[int] = None) -> List[List[Tuple[Any, float]]]:
+    """
+    Retrieve for many queries in one go (evaluation, gap re-checks, batch chat).
+
+    Queries are embedded in one forward pass and searched in one vectorized
+    call. k defaults to the per-query adaptive k used by generate_response.
+
+    Returns:
+        One ranked [(Document, relevance)] list per query, in input order
+    """
+    if not queries:
+        return []
+
+    per_query_k = [k or min(get_adaptive_k(q) + 3, 10) for q in queries]
+    results = exact_search.batch_search_with_relevance_scores(bot_id, queries, k=max(per_query_k))
+    return [ranked[:query_k] for ranked, query_k in zip(results, per_query_k)]
+
+
 # MAIN RAG FUNCTION - OPTIMIZED
-def generate_response(message: str, bot: models.Bot, db: Session) -> str:
-    """Main RAG pipeline with selective audit logging"""
+def generate_response(message: str, bot: models.Bot, db: Session, session_id: Optional[str] = None) -> str:
+    """
+    Main RAG pipeline with selective audit logging.
+    With a session_id, retrieval and the prompt use the session's conversation
+    memory (the caller records the turn afterwards).
+    """
     logger.info(f"RAG START: Processing message for bot {bot.public_id}")
     
+    history_text, retrieval_query = "", message
+    if session_id:
+        memory = conversation_memory.get_memory()
+        conversation = memory.get(bot.public_id, session_id)
+        history_text = memory.history_text(conversation)
+        retrieval_query = memory.retrieval_query(conversation, message)
+        if retrieval_query != message:
+            logger.info(f"🧠 Follow-up rewritten for retrieval: {retrieval_query!r}")
+    
     # ✅ METRICS: Increment total queries count for accurate analytics
     try:
         if bot:
@@ -193,42 +301,14 @@ def generate_response(message: str, bot: models.Bot, db: Session) -> str:
         
         if should_skip:
             logger.info(f"ROUTER: Skipping RAG for {route_type} query (token savings)")
-            
-            llm = ChatGoogleGenerativeAI(
-                model="gemini-2.5-flash",
-                temperature=0.7,
-                google_api_key=settings.GOOGLE_API_KEY,
-                transport="rest"
-            )
-            
-            if route_type == 'greeting':
-                prompt = f"{bot.system_prompt}\n\nUser said: {message}\n\nRespond warmly and briefly."
-            else:
-                prompt = f"{bot.system_prompt}\n\nUser asked: {message}\n\nIntroduce yourself based on your role."
-            
-            response = llm.invoke(prompt).content
             # ✅ NO LOGGING - These are normal conversations
-            return response
-        
-        # STEP 2: SETUP EMBEDDINGS & VECTOR STORE
-        embeddings = HuggingFaceEmbeddings(
-            model_name="BAAI/bge-small-en-v1.5",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+            return routed_reply(bot, message, route_type)
         
-        collection_name = f"collection_{bot.public_id}"
+        # STEP 2: SHARED EMBEDDINGS & VECTOR STORE HANDLE
+        collection_name = vector_stores.collection_name(bot.public_id)
         logger.info(f"📦 Using collection: {collection_name}")
         
-        if not os.path.exists(CHROMA_PATH):
-            os.makedirs(CHROMA_PATH, exist_ok=True)
-        
-        vector_store = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=embeddings,
-            collection_name=collection_name,
-            collection_metadata={"hnsw:space": "cosine"}
-        )
+        vector_store = vector_stores.get_vector_store(bot.public_id)
         
         # STEP 3: CHECK FOR DOCUMENTS
         try:
@@ -253,7 +333,8 @@ def generate_response(message: str, bot: models.Bot, db: Session) -> str:
         k = get_adaptive_k(message)
         # Retrieve more docs to ensure we get both methodology AND results sections
         k = min(k + 3, 10)  # Add 3 more docs, cap at 10
-        docs_with_scores = vector_store.similarity_search_with_relevance_scores(message, k=k)
+        # Exact cosine scores for small collections, HNSW above EXACT_SEARCH_MAX_CHUNKS
+        docs_with_scores = exact_search.search_with_relevance_scores(bot.public_id, retrieval_query, k=k, count=doc_count)
         
         if not docs_with_scores:
             logger.warning("KNOWLEDGE GAP: No documents found")
@@ -272,7 +353,7 @@ def generate_response(message: str, bot: models.Bot, db: Session) -> str:
         
         # ADAPTIVE THRESHOLD: Lower for general questions that need multiple chunks
         # Questions like "results" or "outcome" need context from multiple sections
-        threshold = 0.30 if best_score < 0.50 else 0.35
+        threshold = relevance_threshold(best_score)
         
         # SMART THRESHOLD: Distinguish between "low relevance" and "missing knowledge"
         if best_score < threshold:
@@ -299,50 +380,19 @@ def generate_response(message: str, bot: models.Bot, db: Session) -> str:
             return gap_response
         
         # STEP 5: BUILD CONTEXT
-        context_text = "\n\n".join([d.page_content for d in docs])
+        context_text = build_context(docs)
         logger.info(f"📄 Context length: {len(context_text)} characters")
         
         # STEP 6: SETUP LLM WITH IMPROVED PROMPT
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.1,
-            google_api_key=settings.GOOGLE_API_KEY,
-            transport="rest"
-        )
-        
-        # ✅ SIMPLIFIED PROMPT - Minimal tokens, maximum clarity
-        cached_system_instructions = f"""You are: {bot.system_prompt}
-
-Answer using ONLY the Context below.
-
-Rules:
-- If Context has the answer (even partial): Give it, confidence 0.5-1.0
-- If question is unrelated to your purpose: confidence 0.0, out_of_scope true
-- If relevant but Context truly has nothing: confidence 0.0, out_of_scope false
-
-Note: "results" = "accuracy" = "metrics" = "performance" (same meaning)
-
-JSON format:
-{{"response": "answer", "confidence": 0.0-1.0, "out_of_scope": true/false}}"""
-        
-        prompt = ChatPromptTemplate.from_template("""
-{system_instructions}
-
-Context:
-{context}
-
-Question: {question}
-
-Respond with valid JSON only.
-""")
+        chain, cached_system_instructions = build_answer_chain(bot, with_history=bool(history_text))
         
         # STEP 7: GENERATE RESPONSE
         logger.info("Generating LLM response...")
-        chain = prompt | llm
         
         raw_response = chain.invoke({
             "system_instructions": cached_system_instructions,
             "context": context_text,
+            "history": history_text,
             "question": message
         })
         
@@ -363,80 +413,134 @@ Respond with valid JSON only.
         
         return f"I encountered an internal error. Please try again later."
 
+# ============================================================================
+# BATCH CHAT - Many questions, one retrieval pass
+# ============================================================================
+def generate_batch_responses(
+    questions: List[str],
+    bot: models.Bot,
+    concurrency: int = BATCH_CHAT_CONCURRENCY,
+    log_gaps: bool = False
+) -> Iterator[Dict[str, Any]]:
+    """
+    Answer many questions for one bot, yielding each result as it completes.
+    
+    Shared across the batch: one collection handle and size check, one
+    embedding pass + vectorized search (batch_retrieve), one prompt chain.
+    LLM calls run on at most `concurrency` threads. Batches are test runs:
+    knowledge gaps are only flagged in the results, and logged to the bot's
+    analytics (as in generate_response) only with log_gaps.
+    
+    Yields:
+        {"index", "question", "route", "response", "confidence", "best_score",
+         "sources", "flagged_as_gap", "seconds"} or {"index", "question", "error"}
+    """
+    if not questions:
+        return
+    
+    bot_id = bot.public_id
+    logger.info(f"BATCH START: {len(questions)} questions for bot {bot_id}")
+    
+    routes = [SemanticRouter.should_skip_rag(q) for q in questions]
+    rag_rows = [i for i, (skip, _) in enumerate(routes) if not skip]
+    doc_count = vector_stores.get_vector_store(bot_id)._collection.count()
+    
+    retrieved: Dict[int, List[Tuple[Any, float]]] = {}
+    if rag_rows and doc_count:
+        ranked = batch_retrieve(bot_id, [questions[i] for i in rag_rows])
+        retrieved = dict(zip(rag_rows, ranked))
+    
+    chain, system_instructions = build_answer_chain(bot)
+    guard = HallucinationGuard()
+    
+    def answer(index: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        question = questions[index]
+        skip, route_type = routes[index]
+        start_time = time.time()
+        result = {"index": index, "question": question, "route": route_type}
+        metadata: Dict[str, Any] = {}
+        
+        if skip:
+            result["response"] = routed_reply(bot, question, route_type)
+        elif not doc_count:
+            result["response"] = "I haven't been trained with any documents yet. Please upload training materials first."
+            metadata = {"confidence": 0.0, "flagged_as_gap": True, "gap_type": "missing_knowledge"}
+        else:
+            docs_with_scores = retrieved.get(index, [])
+            best_score = docs_with_scores[0][1] if docs_with_scores else 0.0
+            threshold = relevance_threshold(best_score)
+            docs = [doc for doc, score in docs_with_scores if score >= threshold]
+            result["best_score"] = round(best_score, 4)
+            
+            if not docs:
+                result["response"] = "I don't see that in the report."
+                metadata = {"confidence": 0.0, "flagged_as_gap": True, "gap_type": "missing_knowledge"}
+            else:
+                context_text = build_context(docs)
+                raw_response = chain.invoke({
+                    "system_instructions": system_instructions,
+                    "context": context_text,
+                    "question": question
+                })
+                _, result["response"], metadata = guard.validate(context_text, raw_response.content)
+                result["sources"] = list(dict.fromkeys(d.metadata.get("source") for d in docs if d.metadata.get("source")))
+        
+        result["confidence"] = metadata.get("confidence")
+        result["flagged_as_gap"] = bool(metadata.get("flagged_as_gap"))
+        result["seconds"] = round(time.time() - start_time, 3)
+        return result, metadata
+    
+    # Own session: the request's session is closed before a streamed body finishes
+    db = SessionLocal()
+    workers = max(1, concurrency)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-chat")
+    # At most `workers` questions in flight: a client that disconnects stops the batch
+    pending: Dict[Any, int] = {}
+    next_index = 0
+    try:
+        while pending or next_index < len(questions):
+            while next_index < len(questions) and len(pending) < workers:
+                pending[pool.submit(answer, next_index)] = next_index
+                next_index += 1
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    result, metadata = future.result()
+                except Exception as e:
+                    logger.error(f"Batch question {index} failed: {e}")
+                    yield {"index": index, "question": questions[index], "error": str(e)}
+                    continue
+                
+                if log_gaps:
+                    log_knowledge_gap(bot, result["question"], result["response"], metadata, db)
+                yield result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        db.close()
+    
+    logger.info(f"BATCH DONE: {len(questions)} questions for bot {bot_id}")
+
+
 # ============================================================================
 # KNOWLEDGE BASE MANAGEMENT
 # ============================================================================
-def add_document_to_knowledge_base(bot_id: str, file_content: str, source_filename: str) -> bool:
-    """Add document to knowledge base with improved chunking"""
+def add_document_to_knowledge_base(bot_id: str, file_content: str, source_filename: str, source_type: str = "file") -> bool:
+    """Add document to knowledge base through the shared ingestion engine"""
     logger.info(f"RAG: Training bot {bot_id} with file: {source_filename}")
     
-    try:
-        embeddings = HuggingFaceEmbeddings(
-            model_name="BAAI/bge-small-en-v1.5",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        
-        collection_name = f"collection_{bot_id}"
-        
-        vector_store = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=embeddings,
-            collection_name=collection_name,
-            collection_metadata={"hnsw:space": "cosine"}
-        )
-        
-        raw_doc = Document(
-            page_content=file_content,
-            metadata={"source": source_filename}
-        )
-        
-        # Improved chunking: Larger chunks with more overlap to keep related info together
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1200,  # Increased from 800 to keep results + methodology together
-            chunk_overlap=250,  # Increased from 150 to ensure context continuity
-            separators=["\n\n", "\n", ". ", " ", ""]  # Smart splitting
-        )
-        
-        chunks = text_splitter.split_documents([raw_doc])
-        logger.info(f"Created {len(chunks)} chunks from {source_filename}")
-        
-        vector_store.add_documents(chunks)
-        logger.info(f"RAG: Training complete for {source_filename}")
-        
-        return True
+    result = get_engine().ingest_text(bot_id, file_content, source_filename, source_type)
+    if result.success:
+        logger.info(f"RAG: Training complete for {source_filename} ({result.chunks} chunks)")
     
-    except Exception as e:
-        logger.error(f"RAG Training Error: {e}", exc_info=True)
-        return False
+    return result.success
 
 def remove_document_from_knowledge_base(bot_id: str, source_filename: str) -> bool:
-    """Remove a document from the bot's knowledge base"""
+    """Remove a document (vectors and manifest entry) from the bot's knowledge base"""
     logger.info(f"RAG: Removing {source_filename} from bot {bot_id}")
     
-    try:
-        embeddings = HuggingFaceEmbeddings(
-            model_name="BAAI/bge-small-en-v1.5",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        
-        collection_name = f"collection_{bot_id}"
-        
-        vector_store = Chroma(
-            persist_directory=CHROMA_PATH,
-            embedding_function=embeddings,
-            collection_name=collection_name,
-            collection_metadata={"hnsw:space": "cosine"}
-        )
-        
-        vector_store._collection.delete(
-            where={"source": source_filename}
-        )
-        
+    removed = data_ingestion.delete_bot_source(bot_id, source_filename)
+    if removed:
         logger.info(f"RAG: Removed knowledge from {source_filename}")
-        return True
-    
-    except Exception as e:
-        logger.error(f"RAG Delete Error: {e}", exc_info=True)
-        return False
\ No newline at end of file
+    return removed
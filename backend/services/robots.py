@@ -0,0 +1,163 @@
+"""
+Robots
+======
+robots.txt compliance for the scraper.
+
+Each host's robots.txt is fetched once and cached for ROBOTS_CACHE_TTL_SECONDS
+(up to ROBOTS_CACHE_HOSTS hosts, least recently used evicted). A policy:
+
+- answers allowed(url) for our user agent (falling back to "*");
+- feeds Crawl-delay / Request-rate into the host's token bucket
+  (services/crawler.py), so both the async crawler and RequestsHelper slow
+  down to what the site asks for (capped at ROBOTS_MAX_CRAWL_DELAY);
+- lists the site's Sitemap: lines for services/sitemaps.py.
+
+Fetch outcomes follow RFC 9309: a 4xx means no rules (everything allowed);
+a 5xx or network error means the site is unreachable and nothing is allowed
+until a retry ROBOTS_RETRY_SECONDS later. RESPECT_ROBOTS_TXT=false turns the
+checks off (crawl-delay is then ignored as well).
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+from services import crawler
+
+logger = logging.getLogger("Robots")
+
+RESPECT_ROBOTS_TXT = os.getenv("RESPECT_ROBOTS_TXT", "true").lower() == "true"
+ROBOTS_CACHE_TTL_SECONDS = int(os.getenv("ROBOTS_CACHE_TTL_SECONDS", "3600"))
+ROBOTS_RETRY_SECONDS = int(os.getenv("ROBOTS_RETRY_SECONDS", "300"))
+ROBOTS_CACHE_HOSTS = int(os.getenv("ROBOTS_CACHE_HOSTS", "1024"))
+ROBOTS_MAX_CRAWL_DELAY = float(os.getenv("ROBOTS_MAX_CRAWL_DELAY", "30"))
+ROBOTS_MAX_BYTES = 500 * 1024  # RFC 9309: parse at least 500 KiB
+
+# Token used to match groups in robots.txt ("BotBlocksBot/1.0 (...)" -> "BotBlocksBot")
+AGENT_TOKEN = crawler.CRAWL_USER_AGENT.split("/")[0].split()[0]
+
+
+@dataclass
+class RobotsPolicy:
+    host: str
+    parser: Optional[RobotFileParser] = None  # None: no rules
+    allow_all: bool = True
+    crawl_delay: Optional[float] = None
+    sitemaps: List[str] = field(default_factory=list)
+    expires_at: float = 0.0
+
+    def allowed(self, url: str) -> bool:
+        if self.parser is None:
+            return self.allow_all
+        return self.parser.can_fetch(AGENT_TOKEN, url)
+
+
+def _parse(host: str, text: str, ttl: float) -> RobotsPolicy:
+    parser = RobotFileParser()
+    parser.parse(text.splitlines())
+
+    delay = parser.crawl_delay(AGENT_TOKEN)
+    rate = parser.request_rate(AGENT_TOKEN)
+    if delay is None and rate is not None and rate.requests:
+        delay = rate.seconds / rate.requests
+
+    return RobotsPolicy(
+        host=host,
+        parser=parser,
+        crawl_delay=min(float(delay), ROBOTS_MAX_CRAWL_DELAY) if delay else None,
+        sitemaps=list(parser.site_maps() or []),
+        expires_at=time.monotonic() + ttl,
+    )
+
+
+def fetch_policy(base_url: str) -> RobotsPolicy:
+    """Download and parse robots.txt for the host of base_url"""
+    parsed = urlparse(base_url)
+    host = parsed.netloc.lower()
+    robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+
+    try:
+        crawler.get_bucket(host).wait()
+        response = requests.get(
+            robots_url,
+            headers={"User-Agent": crawler.CRAWL_USER_AGENT},
+            timeout=crawler.CRAWL_TIMEOUT,
+            stream=True
+        )
+        with response:
+            if response.status_code >= 500:
+                raise requests.HTTPError(f"HTTP {response.status_code}")
+            if response.status_code >= 400:
+                return RobotsPolicy(host=host, expires_at=time.monotonic() + ROBOTS_CACHE_TTL_SECONDS)
+            body = response.raw.read(ROBOTS_MAX_BYTES, decode_content=True)
+        text = body.decode(response.encoding or "utf-8", errors="replace")
+        return _parse(host, text, ROBOTS_CACHE_TTL_SECONDS)
+
+    except requests.RequestException as e:
+        logger.warning(f"robots.txt unreachable for {host} ({e}); disallowing for {ROBOTS_RETRY_SECONDS}s")
+        return RobotsPolicy(host=host, allow_all=False, expires_at=time.monotonic() + ROBOTS_RETRY_SECONDS)
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+_policies: "OrderedDict[str, RobotsPolicy]" = OrderedDict()
+_host_locks: dict = {}
+_cache_lock = threading.Lock()
+
+
+def _host_lock(host: str) -> threading.Lock:
+    with _cache_lock:
+        return _host_locks.setdefault(host, threading.Lock())
+
+
+def _apply_crawl_delay(policy: RobotsPolicy):
+    bucket = crawler.get_bucket(policy.host)
+    if policy.crawl_delay:
+        bucket.set_rate(1.0 / policy.crawl_delay, capacity=1)
+        logger.info(f"{policy.host}: Crawl-delay {policy.crawl_delay}s")
+    else:
+        bucket.set_rate(crawler.CRAWL_RATE_PER_HOST, capacity=crawler.CRAWL_BURST)
+
+
+def get_policy(url: str) -> RobotsPolicy:
+    """Cached policy for the host of url (fetched on first use / after expiry)"""
+    host = urlparse(url).netloc.lower()
+    if not RESPECT_ROBOTS_TXT:
+        return RobotsPolicy(host=host)
+
+    with _cache_lock:
+        policy = _policies.get(host)
+        if policy is not None and policy.expires_at > time.monotonic():
+            _policies.move_to_end(host)
+            return policy
+
+    # One fetch per host even when many workers ask at once
+    with _host_lock(host):
+        with _cache_lock:
+            policy = _policies.get(host)
+            if policy is not None and policy.expires_at > time.monotonic():
+                return policy
+
+        policy = fetch_policy(url)
+        _apply_crawl_delay(policy)
+
+        with _cache_lock:
+            _policies[host] = policy
+            _policies.move_to_end(host)
+            while len(_policies) > ROBOTS_CACHE_HOSTS:
+                evicted, _ = _policies.popitem(last=False)
+                _host_locks.pop(evicted, None)
+        return policy
+
+
+def allowed(url: str) -> bool:
+    return get_policy(url).allowed(url)
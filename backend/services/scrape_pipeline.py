@@ -0,0 +1,286 @@
+"""
+Scrape Pipeline
+===============
+Streams scraped pages through three overlapping stages:
+
+    fetch (asyncio crawler) --pages--> extract (process pool) --texts--> embed + upsert
+              |                 bounded queue            bounded queue         |
+        network bound                  CPU bound                     one ChunkBatcher
+
+- Fetch: the crawler's workers hand every page over as soon as it arrives;
+  a full queue blocks them (backpressure), so memory stays bounded.
+- Extract: HTML -> text runs in SCRAPE_EXTRACT_PROCESSES worker processes
+  (parsing holds the GIL; threads would not overlap it). 0 uses threads.
+  Pages the crawler already extracted while discovering links (same
+  parse, see `prepared`) skip the pool.
+- Embed: one IngestionEngine.ingest_stream call for the whole job, so chunks
+  of many pages share embedding batches and one collection handle instead
+  of one ingest (and one embedding call) per page.
+
+An optional `skip` hook sees each page's text before it is embedded and
+may name a reason to leave it out: "unchanged" (same text as last crawl) or
+"duplicate" (near-duplicate of another page). Skipped pages never reach the
+embedding model. `on_settled` hears the outcome of every page once it has
+left the pipeline; an ingested page only settles after the batch holding
+its last chunk was written and its manifest row recorded (crawl jobs
+checkpoint on it, so a crash never marks unwritten pages done).
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import (
+    Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+)
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from services.crawler import FetchResult, PageCallback
+from services.ingestion_engine import IngestionResult, get_engine
+
+logger = logging.getLogger("ScrapePipeline")
+
+SCRAPE_EXTRACT_PROCESSES = int(os.getenv("SCRAPE_EXTRACT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+SCRAPE_QUEUE_SIZE = int(os.getenv("SCRAPE_QUEUE_SIZE", "32"))
+
+_DONE = object()
+
+# (url, html) -> extracted page dict ({"content", "title", ...}) or None
+Extractor = Callable[[str, str], Optional[Dict[str, Any]]]
+# (url, extracted) -> (source, content, metadata)
+Describer = Callable[[str, Dict[str, Any]], Tuple[str, str, Dict[str, Any]]]
+# url -> {"page": extracted or None} if the page was already extracted, else None
+Prepared = Callable[[str], Optional[Dict[str, Any]]]
+# (url, source, content) -> reason to leave the page out of ingestion ("unchanged" / "duplicate"), or None
+SkipCheck = Callable[[str, str, str], Optional[str]]
+# (url, outcome): "ingested", "unchanged", "duplicate" or "failed"
+Settled = Callable[[str, str], None]
+
+
+@dataclass
+class PipelineReport:
+    fetched: int = 0
+    extracted: int = 0
+    extract_failed: int = 0
+    unchanged: int = 0
+    duplicates: int = 0
+    ingested: int = 0
+    ingest_failed: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    pages: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.ingested / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fetched": self.fetched,
+            "extracted": self.extracted,
+            "extract_failed": self.extract_failed,
+            "unchanged": self.unchanged,
+            "duplicates": self.duplicates,
+            "ingested": self.ingested,
+            "ingest_failed": self.ingest_failed,
+            "chunks": self.chunks,
+            "seconds": round(self.seconds, 2),
+            "pages_per_second": round(self.pages_per_second, 2),
+        }
+
+
+_pool: Optional[Executor] = None
+_pool_lock = threading.Lock()
+
+
+def get_extract_pool() -> Executor:
+    """Process-wide extraction pool (started on first use)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if SCRAPE_EXTRACT_PROCESSES > 0:
+                _pool = ProcessPoolExecutor(max_workers=SCRAPE_EXTRACT_PROCESSES)
+            else:
+                _pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="extract")
+        return _pool
+
+
+class ScrapePipeline:
+    """One scrape job: run(fetch_stage) drives fetch, extraction and ingestion concurrently"""
+
+    def __init__(
+        self,
+        bot_id: str,
+        extractor: Extractor,
+        describe: Describer,
+        queue_size: int = SCRAPE_QUEUE_SIZE,
+        pool: Optional[Executor] = None,
+        skip: Optional[SkipCheck] = None,
+        prepared: Optional[Prepared] = None,
+        on_settled: Optional[Settled] = None
+    ):
+        self.bot_id = bot_id
+        self.extractor = extractor
+        self.describe = describe
+        self.skip = skip
+        self.prepared = prepared
+        self.on_settled = on_settled
+        self.pages: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.texts: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.pool = pool or get_extract_pool()
+        self.max_in_flight = queue_size
+        self.report = PipelineReport()
+        self._seen: Set[str] = set()
+        self._urls: Dict[Future, str] = {}
+        self._by_source: Dict[str, Dict[str, Any]] = {}
+        self._seen_lock = threading.Lock()
+        self._errors: List[BaseException] = []
+
+    def _settle(self, url: str, outcome: str):
+        if self.on_settled:
+            self.on_settled(url, outcome)
+
+    # ------------------------------------------------------------- stage 1
+    def on_page(self, page: FetchResult):
+        """Crawler callback: blocks while the extract stage is behind"""
+        if not page.ok:
+            return
+        with self._seen_lock:
+            if page.url in self._seen:
+                return
+            self._seen.add(page.url)
+            self.report.fetched += 1
+        self.pages.put((page.url, page.html))
+
+    def _fetch(self, fetch_stage: Callable[[PageCallback], Any]):
+        try:
+            fetch_stage(self.on_page)
+        except BaseException as e:
+            logger.error(f"Fetch stage failed: {e}", exc_info=True)
+            self._errors.append(e)
+        finally:
+            self.pages.put(_DONE)
+
+    # ------------------------------------------------------------- stage 2
+    def _emit(self, url: str, extracted: Optional[Dict[str, Any]]):
+        if extracted:
+            self.report.extracted += 1
+            self.texts.put((url, extracted))
+        else:
+            self.report.extract_failed += 1
+            self._settle(url, "failed")
+
+    def _forward(self, futures: Set[Future]):
+        for future in futures:
+            url = self._urls.pop(future)
+            try:
+                extracted = future.result()
+            except Exception as e:
+                logger.error(f"Extraction failed for {url}: {e}")
+                extracted = None
+            self._emit(url, extracted)
+
+    def _extract(self):
+        in_flight: Set[Future] = set()
+        input_done = False
+        try:
+            while not input_done or in_flight:
+                # Keep at most max_in_flight pages in the pool
+                while not input_done and len(in_flight) < self.max_in_flight:
+                    try:
+                        item = self.pages.get(timeout=0.05 if in_flight else None)
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        input_done = True
+                        break
+                    analysis = self.prepared(item[0]) if self.prepared else None
+                    if analysis is not None:
+                        self._emit(item[0], analysis["page"])
+                        continue
+                    future = self.pool.submit(self.extractor, *item)
+                    self._urls[future] = item[0]
+                    in_flight.add(future)
+
+                if in_flight:
+                    done, in_flight = wait(in_flight, timeout=None if input_done else 0.05, return_when=FIRST_COMPLETED)
+                    self._forward(done)
+        except BaseException as e:
+            logger.error(f"Extract stage failed: {e}", exc_info=True)
+            self._errors.append(e)
+            # Drain so the fetch stage is never left blocked on a full queue
+            while not input_done:
+                input_done = self.pages.get() is _DONE
+        finally:
+            self.texts.put(_DONE)
+
+    # ------------------------------------------------------------- stage 3
+    def _texts(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        for url, extracted in iter(self.texts.get, _DONE):
+            source, content, metadata = self.describe(url, extracted)
+            reason = self.skip(url, source, content) if self.skip else None
+            if reason == "duplicate":
+                self.report.duplicates += 1
+                self._settle(url, "duplicate")
+                continue
+            if reason:
+                self.report.unchanged += 1
+                self._settle(url, "unchanged")
+                continue
+            page = {
+                "url": url,
+                "source": source,
+                "title": extracted.get("title"),
+                "content_length": len(content),
+                "ingested": False,
+            }
+            self.report.pages.append(page)
+            self._by_source[source] = page
+            yield source, content, metadata
+
+    def _on_result(self, result: IngestionResult):
+        page = self._by_source.get(result.source)
+        if page is not None:
+            page["ingested"] = result.success
+            self._settle(page["url"], "ingested" if result.success else "failed")
+        if result.success:
+            self.report.ingested += 1
+            self.report.chunks += result.chunks
+        else:
+            self.report.ingest_failed += 1
+
+    def run(self, fetch_stage: Callable[[PageCallback], Any]) -> PipelineReport:
+        """
+        Args:
+            fetch_stage: Runs the crawl, calling the given callback once per fetched page
+        """
+        start_time = time.time()
+        threads = [
+            threading.Thread(target=self._fetch, args=(fetch_stage,), name="scrape-fetch", daemon=True),
+            threading.Thread(target=self._extract, name="scrape-extract", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        texts = self._texts()
+        try:
+            get_engine().ingest_stream(self.bot_id, texts, source_type="web", on_result=self._on_result)
+        finally:
+            # Keep consuming if ingestion stopped early, so upstream stages can finish
+            for _ in texts:
+                pass
+            for thread in threads:
+                thread.join()
+
+        self.report.seconds = time.time() - start_time
+        if self._errors:
+            raise self._errors[0]
+
+        logger.info(
+            f"Scrape pipeline for {self.bot_id}: {self.report.ingested}/{self.report.fetched} pages, "
+            f"{self.report.chunks} chunks in {self.report.seconds:.1f}s "
+            f"({self.report.pages_per_second:.1f} pages/sec)"
+        )
+        return self.report
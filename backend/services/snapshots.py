@@ -0,0 +1,415 @@
+"""
+Collection Snapshots
+====================
+Export / import a bot's collection without re-embedding.
+
+A snapshot is a directory:
+
+    manifest.json            format, bot, model, dim, dtype, count, checksums
+    vectors.npy              (count, dim) float32 or float16, np.load(mmap_mode="r")
+    ids.bin                  \\
+    documents.bin             > one UTF-8 column each, rows back to back
+    metadatas.bin            /  (metadatas as one JSON object per row)
+    ids.offsets.npy          \\
+    documents.offsets.npy     > int64 row boundaries: row i = bin[off[i]:off[i+1]]
+    metadatas.offsets.npy    /
+
+Export pages through the collection and writes straight into the memmap;
+import memory-maps the snapshot and upserts precomputed embeddings in
+batches, so moving or restoring a knowledge base is bounded by disk I/O,
+not by the embedding model.
+
+Replacing imports (and compaction) load into a staging collection created
+with the snapshot's metadata (HNSW profile included) and swap it in while
+holding the bot's collection exclusively (vector_store.exclusive), so the
+live collection is never dropped under a running writer.
+"""
+
+import os
+import json
+import time
+import shutil
+import uuid
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from services import data_ingestion, vector_store
+from services.embedding_engine import EMBEDDING_MODEL_NAME
+
+logger = logging.getLogger("Snapshots")
+
+SNAPSHOT_FORMAT = "botblocks-snapshot"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(".", "data", "snapshots"))
+SNAPSHOT_IMPORT_BATCH = int(os.getenv("SNAPSHOT_IMPORT_BATCH", "2000"))
+
+DTYPES = {"float32": np.float32, "float16": np.float16}
+COLUMNS = ("ids", "documents", "metadatas")
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+STAGING_PREFIX = "staging_"
+
+
+# ============================================================================
+# COLUMN FILES
+# ============================================================================
+class ColumnWriter:
+    """Appends UTF-8 rows to {name}.bin and records their offsets"""
+
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self.file = open(os.path.join(directory, f"{name}.bin"), "wb")
+        self.offsets = [0]
+
+    def append(self, value: str):
+        data = value.encode("utf-8")
+        self.file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self):
+        self.file.close()
+        np.save(os.path.join(self.directory, f"{self.name}.offsets.npy"), np.asarray(self.offsets, dtype=np.int64))
+
+
+class ColumnReader:
+    """Random access to a column written by ColumnWriter (memory-mapped)"""
+
+    def __init__(self, directory: str, name: str):
+        self.offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+        path = os.path.join(directory, f"{name}.bin")
+        # np.memmap cannot map an empty file
+        self.data = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.zeros(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def slice(self, start: int, end: int) -> List[str]:
+        bounds = self.offsets[start:end + 1]
+        return [
+            self.data[bounds[i]:bounds[i + 1]].tobytes().decode("utf-8")
+            for i in range(len(bounds) - 1)
+        ]
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+def export_snapshot(bot_id: str, output_dir: Optional[str] = None, dtype: str = "float32") -> Dict[str, Any]:
+    """
+    Write a bot's collection to a snapshot directory.
+
+    Args:
+        bot_id: Bot public_id
+        output_dir: Target directory (default SNAPSHOT_DIR/{bot_id}-{timestamp})
+        dtype: "float32" (exact) or "float16" (half the size, ~1e-3 error)
+
+    Returns:
+        The snapshot manifest
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+
+    output_dir = output_dir or os.path.join(
+        SNAPSHOT_DIR, f"{bot_id}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    )
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = time.time()
+
+    with vector_store.lease(bot_id):
+        collection = vector_store.get_vector_store(bot_id)._collection
+        count = collection.count()
+        vectors = None
+        writers = {name: ColumnWriter(output_dir, name) for name in COLUMNS}
+        written = 0
+
+        try:
+            for page in vector_store.iter_collection(collection, include=("embeddings", "documents", "metadatas")):
+                embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(
+                        os.path.join(output_dir, VECTORS_FILE), mode="w+",
+                        dtype=DTYPES[dtype], shape=(count, embeddings.shape[1])
+                    )
+                # Collection grew during export: the manifest records what was written
+                rows = min(len(embeddings), count - written)
+                if rows <= 0:
+                    break
+
+                vectors[written:written + rows] = embeddings[:rows]
+                for i in range(rows):
+                    writers["ids"].append(page["ids"][i])
+                    writers["documents"].append(page["documents"][i] or "")
+                    writers["metadatas"].append(json.dumps(page["metadatas"][i] or {}, ensure_ascii=False))
+                written += rows
+
+            if vectors is None:
+                # Empty collection (a zero-byte array cannot be memory-mapped)
+                np.save(os.path.join(output_dir, VECTORS_FILE), np.zeros((0, 0), dtype=DTYPES[dtype]))
+                dim = 0
+            else:
+                vectors.flush()
+                dim = vectors.shape[1]
+                del vectors
+
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+    if written < count:
+        # Rows deleted during export: shrink the vector file to what was written
+        _truncate_vectors(output_dir, written, dim, dtype)
+
+    files = [VECTORS_FILE] + [f"{c}.bin" for c in COLUMNS] + [f"{c}.offsets.npy" for c in COLUMNS]
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "bot_id": bot_id,
+        "collection": vector_store.collection_name(bot_id),
+        "collection_metadata": collection.metadata or vector_store.COLLECTION_METADATA,
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "count": written,
+        "dim": dim,
+        "dtype": dtype,
+        "created_at": datetime.now().isoformat(),
+        "checksums": {name: _sha256(os.path.join(output_dir, name)) for name in files},
+    }
+
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    size = sum(os.path.getsize(os.path.join(output_dir, name)) for name in files)
+    logger.info(
+        f"Exported {bot_id}: {written} vectors ({dtype}) -> {output_dir} "
+        f"[{size / 1024 / 1024:.1f} MB in {time.time() - start_time:.1f}s]"
+    )
+    manifest["path"] = output_dir
+    return manifest
+
+
+def _truncate_vectors(directory: str, rows: int, dim: int, dtype: str):
+    path = os.path.join(directory, VECTORS_FILE)
+    if not rows:
+        np.save(path, np.zeros((0, dim), dtype=DTYPES[dtype]))
+        return
+
+    source = np.load(path, mmap_mode="r")
+    tmp_path = path + ".tmp"
+    target = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=DTYPES[dtype], shape=(rows, dim))
+    target[:] = source[:rows]
+    target.flush()
+    del target, source
+    os.replace(tmp_path, path)
+
+
+# ============================================================================
+# IMPORT
+# ============================================================================
+def read_manifest(snapshot_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Not a snapshot: {snapshot_dir}")
+    if manifest.get("version", 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {manifest['version']} is newer than supported ({SNAPSHOT_VERSION})")
+    return manifest
+
+
+def verify_snapshot(snapshot_dir: str) -> bool:
+    """Check every file against the manifest checksums"""
+    manifest = read_manifest(snapshot_dir)
+    for name, expected in manifest["checksums"].items():
+        if _sha256(os.path.join(snapshot_dir, name)) != expected:
+            logger.error(f"Checksum mismatch: {name}")
+            return False
+    return True
+
+
+def iter_snapshot(snapshot_dir: str, batch_size: int = SNAPSHOT_IMPORT_BATCH) -> Iterator[Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]]:
+    """
+    Stream a snapshot in batches (vectors are memory-mapped, never fully loaded).
+
+    Yields:
+        (ids, float32 vectors, documents, metadatas)
+    """
+    manifest = read_manifest(snapshot_dir)
+    if not manifest["count"]:
+        return
+
+    vectors = np.load(os.path.join(snapshot_dir, VECTORS_FILE), mmap_mode="r")
+    columns = {name: ColumnReader(snapshot_dir, name) for name in COLUMNS}
+
+    for start in range(0, manifest["count"], batch_size):
+        end = min(start + batch_size, manifest["count"])
+        yield (
+            columns["ids"].slice(start, end),
+            np.asarray(vectors[start:end], dtype=np.float32),
+            columns["documents"].slice(start, end),
+            [json.loads(m) for m in columns["metadatas"].slice(start, end)],
+        )
+
+
+def import_snapshot(
+    snapshot_dir: str,
+    bot_id: Optional[str] = None,
+    replace: bool = False,
+    verify: bool = True,
+    allow_model_mismatch: bool = False,
+    collection=None,
+    rebuild_manifest: bool = True
+) -> Dict[str, Any]:
+    """
+    Bulk-load a snapshot into a bot's collection (no embedding calls).
+
+    Args:
+        snapshot_dir: Directory written by export_snapshot
+        bot_id: Target bot public_id (default: the snapshot's own bot)
+        replace: Drop the existing collection first (otherwise upsert into it)
+        verify: Check file checksums before loading
+        allow_model_mismatch: Load vectors from a different embedding model anyway
+        collection: Load into this raw collection instead (e.g. a shadow collection)
+        rebuild_manifest: Rebuild the bot's knowledge_sources rows afterwards
+
+    Returns:
+        {"bot_id", "count", "seconds"}
+    """
+    manifest = read_manifest(snapshot_dir)
+    bot_id = bot_id or manifest["bot_id"]
+
+    if manifest["embedding_model"] != EMBEDDING_MODEL_NAME and not allow_model_mismatch:
+        raise ValueError(
+            f"Snapshot was embedded with {manifest['embedding_model']}, "
+            f"this deployment uses {EMBEDDING_MODEL_NAME}"
+        )
+    if verify and not verify_snapshot(snapshot_dir):
+        raise ValueError(f"Snapshot failed checksum verification: {snapshot_dir}")
+
+    start_time = time.time()
+
+    if collection is None and replace:
+        loaded = _replace_from_snapshot(snapshot_dir, manifest, bot_id, catch_up=False)
+    else:
+        with vector_store.lease(bot_id):
+            if collection is None:
+                collection = vector_store.get_vector_store(bot_id)._collection
+            loaded = _load(snapshot_dir, collection, bot_id)
+
+    if rebuild_manifest and (collection is None or collection.name == vector_store.collection_name(bot_id)):
+        data_ingestion.backfill_source_manifest(bot_id)
+
+    seconds = time.time() - start_time
+    logger.info(f"Imported {loaded} vectors into {bot_id} in {seconds:.1f}s")
+    return {"bot_id": bot_id, "count": loaded, "seconds": round(seconds, 2)}
+
+
+def _load(snapshot_dir: str, collection, bot_id: str) -> int:
+    loaded = 0
+    for ids, vectors, documents, metadatas in iter_snapshot(snapshot_dir):
+        # Chroma rejects empty metadata dicts; every ingested chunk has at least bot_id
+        collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=documents,
+            metadatas=[m or {"bot_id": bot_id} for m in metadatas]
+        )
+        loaded += len(ids)
+        if collection.name == vector_store.collection_name(bot_id):
+            vector_store.mark_changed(bot_id)
+    return loaded
+
+
+def _catch_up(live, staging):
+    """Apply writes made to the live collection since its snapshot was taken"""
+    live_ids = {i for page in vector_store.iter_collection(live, include=()) for i in page["ids"]}
+    staged_ids = {i for page in vector_store.iter_collection(staging, include=()) for i in page["ids"]}
+
+    missing = list(live_ids - staged_ids)
+    for start in range(0, len(missing), SNAPSHOT_IMPORT_BATCH):
+        page = live.get(ids=missing[start:start + SNAPSHOT_IMPORT_BATCH], include=["embeddings", "documents", "metadatas"])
+        staging.upsert(ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"], metadatas=page["metadatas"])
+
+    removed = list(staged_ids - live_ids)
+    for start in range(0, len(removed), SNAPSHOT_IMPORT_BATCH):
+        staging.delete(ids=removed[start:start + SNAPSHOT_IMPORT_BATCH])
+
+
+def _replace_from_snapshot(snapshot_dir: str, manifest: Dict[str, Any], bot_id: str, catch_up: bool) -> int:
+    """
+    Load a snapshot into a staging collection and swap it in under the bot's name.
+
+    Args:
+        catch_up: Carry over writes made to the live collection during the load
+                  (compaction); otherwise the snapshot replaces it as-is
+
+    Raises:
+        CollectionBusy: if the collection is in use (before loading, or at swap time)
+    """
+    if vector_store.in_use(bot_id):
+        raise vector_store.CollectionBusy(f"{vector_store.collection_name(bot_id)} is in use")
+
+    client = vector_store.get_client()
+    name = vector_store.collection_name(bot_id)
+    staging = client.create_collection(
+        f"{STAGING_PREFIX}{uuid.uuid4().hex[:8]}_{name}"[:512],
+        metadata=manifest.get("collection_metadata") or vector_store.COLLECTION_METADATA
+    )
+
+    try:
+        loaded = _load(snapshot_dir, staging, bot_id)
+        with vector_store.exclusive(bot_id):
+            if name in {c.name for c in client.list_collections()}:
+                if catch_up:
+                    _catch_up(client.get_collection(name), staging)
+                client.delete_collection(name)
+            staging.modify(name=name)
+    except Exception:
+        try:
+            client.delete_collection(staging.name)
+        except Exception:
+            pass  # already swapped in or never written
+        raise
+
+    return loaded
+
+
+# ============================================================================
+# COMPACTION
+# ============================================================================
+def compact_collection(bot_id: str) -> Dict[str, Any]:
+    """
+    Rebuild a collection from a snapshot of itself.
+    Drops deleted-vector tombstones and index fragmentation left by many
+    re-ingests. The collection keeps its metadata (HNSW profile), writes
+    made while it is rebuilt are carried over at the swap, and the live
+    collection is untouched if loading fails. Refused (CollectionBusy)
+    while the collection is in use.
+    """
+    if vector_store.in_use(bot_id):
+        raise vector_store.CollectionBusy(f"{vector_store.collection_name(bot_id)} is in use")
+
+    snapshot_dir = tempfile.mkdtemp(prefix=f"compact-{bot_id}-", dir=SNAPSHOT_DIR if os.path.isdir(SNAPSHOT_DIR) else None)
+    start_time = time.time()
+
+    try:
+        manifest = export_snapshot(bot_id, snapshot_dir)
+        loaded = _replace_from_snapshot(snapshot_dir, manifest, bot_id, catch_up=True)
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    seconds = time.time() - start_time
+    logger.info(f"Compacted {bot_id}: {loaded} vectors in {seconds:.1f}s")
+    return {"bot_id": bot_id, "count": loaded, "seconds": round(seconds, 2)}
@@ -0,0 +1,201 @@
+"""
+Upload Pipeline
+===============
+Spool once, index and store concurrently.
+
+An upload is written to local disk exactly once. Indexing reads that spool
+file straight away while the same file is pushed to object storage on a
+second thread, so there is no storage -> download round trip before the
+bot can learn from it.
+"""
+
+import os
+import uuid
+import shutil
+import zipfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple, BinaryIO
+from fastapi import UploadFile
+
+from services import asset_manager
+from services.ingestion_engine import get_engine, IngestionJob
+
+logger = logging.getLogger("UploadPipeline")
+
+SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(".", "data", "temp"))
+SPOOL_COPY_BUFFER = 1024 * 1024  # 1MB
+
+# Bulk upload limits (per request, after archive extraction)
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "500"))
+BULK_MAX_UNCOMPRESSED_BYTES = int(os.getenv("BULK_MAX_UNCOMPRESSED_BYTES", str(1024 * 1024 * 1024)))  # 1GB
+STORAGE_UPLOAD_WORKERS = int(os.getenv("STORAGE_UPLOAD_WORKERS", "4"))
+
+# ingest_fn(file_path, bot_public_id, original_filename) -> bool
+IngestFn = Callable[[str, str, str], bool]
+
+
+def spool_stream(stream: BinaryIO, filename: str) -> str:
+    """
+    Copy a stream to its own spool directory.
+    The original filename is kept so loaders and storage see the right extension.
+    """
+    spool_dir = os.path.join(SPOOL_DIR, str(uuid.uuid4()))
+    os.makedirs(spool_dir, exist_ok=True)
+
+    spool_path = os.path.join(spool_dir, os.path.basename(filename))
+    with open(spool_path, "wb") as out:
+        shutil.copyfileobj(stream, out, SPOOL_COPY_BUFFER)
+
+    return spool_path
+
+
+def unique_filename(path: str, taken: Set[str]) -> str:
+    """
+    Filename for `path` that no other file of the same upload uses (it becomes
+    the source name, so two files with one name would share chunk IDs).
+    Tries the basename, then the flattened path ("docs_a_readme.md"), then
+    numbered variants ("readme-2.md"); the result is added to `taken`.
+    """
+    name = os.path.basename(path)
+    stem, ext = os.path.splitext(name)
+    flattened = "_".join(part for part in path.replace("\\", "/").split("/") if part not in ("", ".", ".."))
+
+    candidate, n = name, 1
+    while candidate.lower() in taken:
+        n += 1
+        candidate = flattened if n == 2 and flattened and flattened != name else f"{stem}-{n}{ext}"
+    taken.add(candidate.lower())
+    return candidate
+
+
+def spool_upload(file: UploadFile, taken: Optional[Set[str]] = None) -> str:
+    """Write an uploaded file to the spool (renamed if `taken` already holds its name)"""
+    filename = unique_filename(file.filename, taken) if taken is not None else file.filename
+    return spool_stream(file.file, filename)
+
+
+def spool_archive(file: UploadFile, allowed_extensions: Tuple[str, ...], taken: Optional[Set[str]] = None) -> List[str]:
+    """
+    Extract a ZIP upload member by member into the spool.
+    Members are streamed straight from the archive (never fully held in memory);
+    folders, hidden files and unsupported types are skipped. Members that
+    share a filename (same name in different folders, or with other files of
+    the upload in `taken`) are spooled under unique names.
+
+    Raises:
+        ValueError: not a ZIP file, or the archive exceeds the bulk limits
+    """
+    spooled: List[str] = []
+    total_bytes = 0
+    taken = set() if taken is None else taken
+
+    try:
+        with zipfile.ZipFile(file.file) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+
+                if info.is_dir() or not name or name.startswith(".") or "__MACOSX" in info.filename:
+                    continue
+                if not name.lower().endswith(allowed_extensions):
+                    logger.info(f"Skipping unsupported archive member: {info.filename}")
+                    continue
+
+                total_bytes += info.file_size
+                if len(spooled) >= BULK_MAX_FILES or total_bytes > BULK_MAX_UNCOMPRESSED_BYTES:
+                    raise ValueError("Archive exceeds bulk upload limits")
+
+                with archive.open(info) as member:
+                    spooled.append(spool_stream(member, unique_filename(info.filename, taken)))
+
+    except zipfile.BadZipFile:
+        raise ValueError(f"{file.filename} is not a valid ZIP archive")
+    except Exception:
+        for path in spooled:
+            cleanup_spool(path)
+        raise
+
+    return spooled
+
+
+def cleanup_spool(spool_path: str):
+    """Remove a spool file and its directory"""
+    shutil.rmtree(os.path.dirname(spool_path), ignore_errors=True)
+
+
+def process_spooled_upload(
+    spool_path: str,
+    bot_public_id: str,
+    asset_id: int,
+    ingest_fn: IngestFn,
+    upload_to_storage: bool = True
+) -> Dict[str, Any]:
+    """
+    Index a spooled upload and push it to object storage at the same time.
+    The spool is removed once both sides are done.
+
+    Returns:
+        {"indexed": bool, "stored": bool}
+    """
+    filename = os.path.basename(spool_path)
+    logger.info(f"Processing upload {filename} for bot {bot_public_id}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            storage_future = None
+            if upload_to_storage:
+                storage_future = pool.submit(
+                    asset_manager.store_asset_file, asset_id, bot_public_id, spool_path
+                )
+
+            ingest_future = pool.submit(ingest_fn, spool_path, bot_public_id, filename)
+
+            indexed = bool(ingest_future.result())
+            stored = storage_future.result() if storage_future else True
+
+    except Exception as e:
+        logger.error(f"Upload pipeline failed for {filename}: {e}", exc_info=True)
+        indexed, stored = False, False
+
+    finally:
+        cleanup_spool(spool_path)
+
+    if not stored:
+        logger.warning(f"Object storage upload failed for {filename}")
+
+    return {"indexed": indexed, "stored": stored}
+
+
+def process_bulk_upload(job: IngestionJob, uploads: List[Dict[str, Any]]) -> IngestionJob:
+    """
+    Run a bulk upload as one ingestion job.
+    Storage uploads run on a small pool while the engine indexes every file
+    through a single embedder / collection handle.
+
+    Args:
+        job: Job created with ingestion_engine.create_job
+        uploads: [{"spool_path", "asset_id", "needs_upload"}, ...]
+    """
+    bot_public_id = job.bot_id
+    logger.info(f"Bulk job {job.job_id}: {len(uploads)} files for bot {bot_public_id}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=STORAGE_UPLOAD_WORKERS) as pool:
+            storage_futures = [
+                pool.submit(asset_manager.store_asset_file, u["asset_id"], bot_public_id, u["spool_path"])
+                for u in uploads if u["needs_upload"]
+            ]
+
+            get_engine().ingest_files(
+                job, [(u["spool_path"], os.path.basename(u["spool_path"])) for u in uploads]
+            )
+
+            failed_uploads = sum(1 for f in storage_futures if not f.result())
+            if failed_uploads:
+                logger.warning(f"Bulk job {job.job_id}: {failed_uploads} storage uploads failed")
+
+    finally:
+        for u in uploads:
+            cleanup_spool(u["spool_path"])
+
+    return job
@@ -0,0 +1,246 @@
+"""
+Vector Store Access
+===================
+One place to open bot collections.
+
+Handles are cached per collection so ingestion, retrieval and listing
+share a single embedding model and Chroma handle instead of rebuilding
+both on every call.
+
+Writers and searches hold a lease on the collection (see lease()); the
+garbage collector only drops collections that have no lease. Code that
+replaces a collection (migration swap, snapshot import) holds it
+exclusively (see exclusive()): new leases wait until it is released.
+
+Cached handles are re-checked against the collection's current id every
+CHROMA_HANDLE_CHECK_SECONDS, so a collection swapped by another process
+(e.g. scripts/migrate_collections.py) is picked up without a restart.
+
+Every write bumps the collection's version (mark_changed), so derived
+indexes (services/exact_search.py) know when to rebuild. The version is a
+token in a marker file under CHROMA_PATH/versions, shared by every process
+that opens the same store.
+"""
+
+import os
+import time
+import uuid
+import tempfile
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence, Set
+import chromadb
+from langchain_chroma import Chroma
+from services.embedding_engine import get_embedding_engine
+from services.index_profiles import DEFAULT_PROFILE
+
+logger = logging.getLogger("VectorStore")
+
+# Use environment variable for path (supports Docker/Vultr) or fallback to temp
+CHROMA_PATH = os.getenv("CHROMA_PATH", os.path.join(tempfile.gettempdir(), "botblocks_chroma_db"))
+
+# New collections: cosine space + the default index profile (see services/index_profiles.py)
+COLLECTION_METADATA = DEFAULT_PROFILE.to_metadata("cosine")
+
+COLLECTION_PREFIX = "collection_"
+PAGE_SIZE = int(os.getenv("CHROMA_PAGE_SIZE", "2000"))
+HANDLE_CHECK_SECONDS = float(os.getenv("CHROMA_HANDLE_CHECK_SECONDS", "5"))
+VERSIONS_DIR = "versions"
+
+_lock = threading.Lock()
+_released = threading.Condition(_lock)
+_stores: Dict[str, Chroma] = {}
+_checked: Dict[str, float] = {}
+_leases: Dict[str, int] = {}
+_exclusive: Set[str] = set()
+
+
+class CollectionBusy(RuntimeError):
+    """The collection is leased (or already held exclusively) and cannot be replaced now"""
+
+
+def collection_name(bot_id: str) -> str:
+    """Chroma collection name for a bot public_id"""
+    return f"{COLLECTION_PREFIX}{bot_id}"
+
+
+def bot_id_from_collection(name: str) -> Optional[str]:
+    """Inverse of collection_name (None for collections that are not bot collections)"""
+    if not name.startswith(COLLECTION_PREFIX):
+        return None
+    return name[len(COLLECTION_PREFIX):] or None
+
+
+def get_client():
+    """Raw chromadb client on the same persistent directory as the cached handles"""
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    return chromadb.PersistentClient(path=CHROMA_PATH)
+
+
+def get_embeddings():
+    """
+    Shared embedding engine (loaded once per process, serves ingestion and queries).
+    See services/embedding_engine.py for backends and batching.
+    """
+    return get_embedding_engine()
+
+
+def _is_current(name: str, store: Chroma) -> bool:
+    """False if the collection behind a cached handle was renamed, replaced or deleted"""
+    try:
+        return get_client().get_collection(name).id == store._collection.id
+    except Exception:
+        return False
+
+
+def get_vector_store(bot_id: str) -> Chroma:
+    """Cached Chroma handle for a bot's collection (created on first use)"""
+    name = collection_name(bot_id)
+
+    store = _stores.get(name)
+    if store is not None:
+        if time.monotonic() - _checked.get(name, 0.0) < HANDLE_CHECK_SECONDS:
+            return store
+        if _is_current(name, store):
+            _checked[name] = time.monotonic()
+            return store
+        logger.info(f"{name} was replaced, reopening")
+        with _lock:
+            if _stores.get(name) is store:
+                del _stores[name]
+        mark_changed(bot_id)
+
+    embeddings = get_embeddings()
+
+    with _lock:
+        if name not in _stores:
+            os.makedirs(CHROMA_PATH, exist_ok=True)
+            _stores[name] = Chroma(
+                persist_directory=CHROMA_PATH,
+                embedding_function=embeddings,
+                collection_name=name,
+                collection_metadata=COLLECTION_METADATA
+            )
+            _checked[name] = time.monotonic()
+        return _stores[name]
+
+
+def evict_vector_store(bot_id: str):
+    """Drop a cached handle (e.g. before the collection is deleted)"""
+    with _lock:
+        _stores.pop(collection_name(bot_id), None)
+    mark_changed(bot_id)
+
+
+def _version_path(bot_id: str) -> str:
+    return os.path.join(CHROMA_PATH, VERSIONS_DIR, collection_name(bot_id))
+
+
+def mark_changed(bot_id: str):
+    """Record that a bot's collection was written to, replaced or deleted (visible to every process)"""
+    path = _version_path(bot_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+
+
+def get_version(bot_id: str) -> str:
+    """Token that changes on every mark_changed ("" if the collection was never written)"""
+    try:
+        with open(_version_path(bot_id)) as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+@contextmanager
+def lease(bot_id: str):
+    """Mark a collection as in use for the duration of a write or search (waits while it is held exclusively)"""
+    name = collection_name(bot_id)
+    with _lock:
+        while name in _exclusive:
+            _released.wait()
+        _leases[name] = _leases.get(name, 0) + 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _leases[name] -= 1
+            if not _leases[name]:
+                del _leases[name]
+            _released.notify_all()
+
+
+@contextmanager
+def exclusive(bot_id: str):
+    """
+    Hold a collection alone while it is replaced. New leases wait until the
+    block exits; every cached handle is evicted on the way out.
+
+    Raises:
+        CollectionBusy: if the collection is leased (retry later)
+    """
+    name = collection_name(bot_id)
+    with _lock:
+        if name in _leases or name in _exclusive:
+            raise CollectionBusy(f"{name} is in use")
+        _exclusive.add(name)
+    try:
+        yield
+    finally:
+        with _lock:
+            _stores.pop(name, None)
+            _exclusive.discard(name)
+            _released.notify_all()
+        mark_changed(bot_id)
+
+
+def in_use(bot_id: str) -> bool:
+    name = collection_name(bot_id)
+    return name in _leases or name in _exclusive
+
+
+def any_in_use() -> bool:
+    """True while any collection is leased or held exclusively in this process"""
+    return bool(_leases or _exclusive)
+
+
+def drop_collection(bot_id: str) -> bool:
+    """
+    Delete a bot's collection if nothing holds a lease on it.
+    The cached handle is evicted first so no stale handle outlives the collection.
+
+    Returns:
+        bool: False if the collection is in use (retry later)
+    """
+    name = collection_name(bot_id)
+    with _lock:
+        if name in _leases or name in _exclusive:
+            return False
+        _stores.pop(name, None)
+        get_client().delete_collection(name)
+    mark_changed(bot_id)
+    return True
+
+
+def iter_collection(
+    collection,
+    include: Sequence[str] = ("metadatas",),
+    page_size: int = PAGE_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """
+    Page through a raw chromadb collection (never loads it whole).
+
+    Yields:
+        collection.get() results of at most page_size records
+    """
+    offset = 0
+    while True:
+        page = collection.get(include=list(include), limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
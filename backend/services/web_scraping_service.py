@@ -8,21 +8,33 @@ Features:
 - Recursive crawling with depth control
 - Content extraction & cleaning
 - Automatic chunking & ingestion into RAG
-- Rate limiting & robots.txt compliance
+- Rate limiting & robots.txt compliance (Crawl-delay feeds the per-host
+  rate limiter; see services/robots.py)
+- Streaming sitemap reading: indexes, .xml.gz, lastmod priority
+  (see services/sitemaps.py)
 - Progress tracking for async operations
+- Concurrent fetching (asyncio worker pool, per-host token buckets;
+  see services/crawler.py)
+- Incremental recrawls (conditional GETs, content hashes;
+  see services/crawl_state.py)
+- Near-duplicate pages dropped before embedding (SimHash;
+  see services/dedup.py)
 
 Dependencies:
-pip install beautifulsoup4 requests lxml trafilatura sitemap-parser
+pip install requests lxml trafilatura aiohttp
 """
 
 import requests
-from bs4 import BeautifulSoup
+import lxml.etree
+import lxml.html
 from urllib.parse import urljoin, urlparse
 from typing import List, Dict, Any, Set, Optional
 import logging
-import time
 import re
+import hashlib
+import threading
 from datetime import datetime
+from types import SimpleNamespace
 from sqlalchemy.orm import Session
 import trafilatura  # Best library for main content extraction
 from requests.adapters import HTTPAdapter
@@ -30,19 +42,26 @@ from urllib3.util.retry import Retry
 
 from db import models
 from services import data_ingestion  # Your existing ingestion service
+from services import crawler as async_crawler
+from services import robots, sitemaps
+from services.crawl_jobs import CrawlFrontier
+from services.crawl_state import CrawlState
+from services.scrape_pipeline import ScrapePipeline, get_extract_pool
 
 logger = logging.getLogger("WebScrapingService")
 
+UTF8_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 class ScrapingConfig:
     """Centralized configuration for web scraping"""
     
-    # Rate Limiting
-    REQUEST_DELAY = 1.0  # seconds between requests
-    MAX_RETRIES = 3
-    TIMEOUT = 10  # seconds
+    # Rate Limiting (per host token buckets, see services/crawler.py)
+    MAX_RETRIES = async_crawler.CRAWL_MAX_RETRIES
+    TIMEOUT = async_crawler.CRAWL_TIMEOUT  # seconds
+    WORKERS = async_crawler.CRAWL_WORKERS
     
     # Content Limits
     MAX_URLS_PER_SITEMAP = 100  # Prevent abuse
@@ -61,7 +80,7 @@ class ScrapingConfig:
     ]
     
     # User Agent
-    USER_AGENT = 'BotBlocksBot/1.0 (+https://botblocks.com/bot)'
+    USER_AGENT = async_crawler.CRAWL_USER_AGENT
 
 # ============================================================================
 # UTILITIES
@@ -88,28 +107,42 @@ class RequestsHelper:
     
     @staticmethod
     def fetch_url(url: str, session: requests.Session) -> Optional[str]:
-        """Fetch URL content with error handling"""
+        """Fetch URL content with error handling (streamed, stops at MAX_CONTENT_LENGTH)"""
         try:
             headers = {'User-Agent': ScrapingConfig.USER_AGENT}
             
+            # Same per-host budget as the async crawler (no global sleep)
+            async_crawler.get_bucket(async_crawler.host_of(url)).wait()
+            
             response = session.get(
                 url,
                 headers=headers,
                 timeout=ScrapingConfig.TIMEOUT,
-                allow_redirects=True
+                allow_redirects=True,
+                stream=True
             )
             
-            response.raise_for_status()
-            
-            # Check content length
-            if len(response.content) > ScrapingConfig.MAX_CONTENT_LENGTH:
-                logger.warning(f"Content too large for {url}, skipping")
-                return None
-            
-            # Rate limiting
-            time.sleep(ScrapingConfig.REQUEST_DELAY)
-            
-            return response.text
+            with response:
+                response.raise_for_status()
+                
+                # Check type and declared length before reading anything
+                content_length = response.headers.get('Content-Length')
+                content_length = int(content_length) if content_length and content_length.isdigit() else None
+                async_crawler.precheck(
+                    response.headers.get('Content-Type'),
+                    content_length,
+                    ScrapingConfig.MAX_CONTENT_LENGTH
+                )
+                
+                reader = async_crawler.BodyReader(response.encoding, ScrapingConfig.MAX_CONTENT_LENGTH, content_length)
+                for chunk in response.iter_content(async_crawler.DOWNLOAD_CHUNK_SIZE):
+                    reader.feed(chunk)
+                return reader.text()
+        
+        except async_crawler.DownloadAborted as e:
+            async_crawler.download_stats.record(e)
+            logger.warning(f"Skipping {url}: {e.reason}")
+            return None
         
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to fetch {url}: {e}")
@@ -151,34 +184,94 @@ class URLValidator:
 # ============================================================================
 # CONTENT EXTRACTION
 # ============================================================================
+# XPath equivalents of the fallback's content containers
+# ('article', 'main', 'div[role="main"]', '.content', '#content')
+MAIN_CONTENT_XPATHS = [
+    '//article',
+    '//main',
+    '//div[@role="main"]',
+    '//*[contains(concat(" ", normalize-space(@class), " "), " content ")]',
+    '//*[@id="content"]',
+]
+BOILERPLATE_TAGS = ("script", "style", "nav", "footer", "header")
+
+
+def parse_html(html: str) -> Optional[lxml.html.HtmlElement]:
+    """
+    The one parse of a page: link discovery, metadata and main-content
+    extraction all read this tree.
+    """
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # str input with an XML encoding declaration: hand lxml the bytes
+        return lxml.html.document_fromstring(html.encode("utf-8"), parser=UTF8_PARSER)
+    except lxml.etree.ParserError:
+        return None
+
+
+def page_metadata(tree: lxml.html.HtmlElement) -> Dict[str, str]:
+    """
+    Title and description from the tree's <head> (all the pipeline keeps;
+    trafilatura's full metadata pass mostly searches for dates).
+    """
+    def meta(*names):
+        for name in names:
+            found = tree.xpath(f'//meta[@property="{name}" or @name="{name}"]/@content')
+            if found and found[0].strip():
+                return found[0].strip()
+        return ""
+    
+    title = meta("og:title", "twitter:title") or (tree.findtext('.//title') or "").strip()
+    if not title:
+        heading = tree.find('.//h1')
+        title = re.sub(r'\s+', ' ', heading.text_content()).strip() if heading is not None else ""
+    return {
+        "title": title or "Untitled",
+        "description": meta("description", "og:description"),
+    }
+
+
+def page_links(tree: lxml.html.HtmlElement, url: str) -> List[str]:
+    """Normalized absolute targets of every <a href> (unfiltered)"""
+    links = {}
+    for href in tree.xpath('//a/@href'):
+        links[URLValidator.normalize_url(urljoin(url, href.strip()))] = None
+    return list(links)
+
+
 class ContentExtractor:
-    """Extract main content from HTML"""
+    """Extract main content from HTML (or from an already parsed tree)"""
     
     @staticmethod
-    def extract_with_trafilatura(html: str, url: str) -> Optional[Dict[str, Any]]:
+    def extract_with_trafilatura(tree, url: str) -> Optional[Dict[str, Any]]:
         """Use Trafilatura for best content extraction"""
         try:
-            # Extract main content
-            content = trafilatura.extract(
-                html,
+            # Metadata first: read-only, and trafilatura works on its own copy of the tree
+            metadata = page_metadata(tree)
+            document = trafilatura.bare_extraction(
+                tree,
+                url=url,
                 include_links=False,
                 include_images=False,
                 include_tables=True,
                 favor_precision=True,  # Reduces noise
                 deduplicate=True
             )
+            if isinstance(document, dict):  # trafilatura < 2.0
+                document = SimpleNamespace(**document)
             
+            content = getattr(document, "text", None) if document else None
             if not content or len(content.strip()) < 100:
                 logger.warning(f"Insufficient content extracted from {url}")
                 return None
             
-            # Extract metadata
-            metadata = trafilatura.extract_metadata(html)
-            
             return {
                 "content": content.strip(),
-                "title": metadata.title if metadata else "Untitled",
-                "description": metadata.description if metadata else "",
+                "title": metadata["title"],
+                "description": metadata["description"],
                 "url": url,
                 "extracted_at": datetime.now().isoformat()
             }
@@ -188,39 +281,31 @@ class ContentExtractor:
             return None
     
     @staticmethod
-    def extract_with_beautifulsoup(html: str, url: str) -> Optional[Dict[str, Any]]:
-        """Fallback extraction using BeautifulSoup"""
+    def extract_with_lxml(tree, url: str) -> Optional[Dict[str, Any]]:
+        """Fallback extraction from the tree's content containers (modifies the tree)"""
         try:
-            soup = BeautifulSoup(html, 'lxml')
-            
             # Remove script and style elements
-            for script in soup(["script", "style", "nav", "footer", "header"]):
-                script.decompose()
+            for element in tree.iter(*BOILERPLATE_TAGS):
+                element.drop_tree()
             
             # Get title
-            title = soup.find('title')
-            title_text = title.get_text().strip() if title else "Untitled"
+            title_text = (tree.findtext('.//title') or "").strip() or "Untitled"
             
-            # Get main content
+            # Try common content containers, then the body
             main_content = None
-            
-            # Try common content containers
-            for tag in ['article', 'main', 'div[role="main"]', '.content', '#content']:
-                main_content = soup.select_one(tag)
-                if main_content:
+            for xpath in MAIN_CONTENT_XPATHS:
+                found = tree.xpath(xpath)
+                if found:
+                    main_content = found[0]
                     break
+            if main_content is None:
+                main_content = tree.find('.//body')
             
-            # Fallback to body
-            if not main_content:
-                main_content = soup.find('body')
-            
-            if not main_content:
+            if main_content is None:
                 return None
             
-            text = main_content.get_text(separator=' ', strip=True)
-            
             # Clean up whitespace
-            text = re.sub(r'\s+', ' ', text).strip()
+            text = re.sub(r'\s+', ' ', ' '.join(main_content.itertext())).strip()
             
             if len(text) < 100:
                 logger.warning(f"Insufficient content from {url}")
@@ -235,21 +320,60 @@ class ContentExtractor:
             }
         
         except Exception as e:
-            logger.error(f"BeautifulSoup extraction failed for {url}: {e}")
+            logger.error(f"Fallback extraction failed for {url}: {e}")
             return None
     
     @staticmethod
-    def extract(html: str, url: str) -> Optional[Dict[str, Any]]:
-        """Extract content using best available method"""
+    def extract_tree(tree, url: str) -> Optional[Dict[str, Any]]:
+        """Extract content from a parsed page using best available method"""
+        if tree is None:
+            return None
         
         # Try Trafilatura first (best quality)
-        result = ContentExtractor.extract_with_trafilatura(html, url)
+        result = ContentExtractor.extract_with_trafilatura(tree, url)
         
-        # Fallback to BeautifulSoup
+        # Fallback to the page's content containers
         if not result:
-            result = ContentExtractor.extract_with_beautifulsoup(html, url)
+            result = ContentExtractor.extract_with_lxml(tree, url)
         
         return result
+    
+    @staticmethod
+    def extract(html: str, url: str) -> Optional[Dict[str, Any]]:
+        """Extract content using best available method"""
+        return ContentExtractor.extract_tree(parse_html(html), url)
+
+def extract_page(url: str, html: str) -> Optional[Dict[str, Any]]:
+    """Module-level entry point for extraction worker processes"""
+    return ContentExtractor.extract(html, url)
+
+
+def analyze_page(url: str, html: str) -> Dict[str, Any]:
+    """
+    Links and content of a crawled page from a single parse (worker process
+    entry point). Links are read before extraction, which may modify the tree.
+    """
+    tree = parse_html(html)
+    if tree is None:
+        return {"links": [], "page": None}
+    links = page_links(tree, url)
+    return {"links": links, "page": ContentExtractor.extract_tree(tree, url)}
+
+
+def page_source(url: str, extracted: Dict[str, Any]):
+    """
+    (source name, content, chunk metadata) under which a scraped page is stored.
+    The name is a readable host + path slug plus a hash of the full URL, so
+    pages of different hosts, or paths like /a/b and /a_b, never share a source.
+    """
+    parsed = urlparse(url)
+    slug = re.sub(r"[^A-Za-z0-9.-]+", "_", f"{parsed.netloc}{parsed.path}").strip("_")[:80]
+    source_name = f"web_{slug}_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:10]}"
+    return source_name, extracted['content'], {
+        "url": url,
+        "title": extracted['title'],
+        "scraped_at": extracted['extracted_at']
+    }
 
 # ============================================================================
 # CRAWLERS
@@ -257,112 +381,157 @@ class ContentExtractor:
 class WebCrawler:
     """Crawl website and extract URLs"""
     
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, state: Optional[CrawlState] = None):
         self.base_url = base_url
+        self.state = state
         self.base_domain = urlparse(base_url).netloc
         self.session = RequestsHelper.get_session()
         self.visited: Set[str] = set()
+        self.stats = async_crawler.CrawlStats(workers=ScrapingConfig.WORKERS)
+        # Pages fetched during discovery are reused for extraction (fetched once per job)
+        self.cache = async_crawler.PageCache()
+        # Content extracted while discovering links, until the pipeline takes it
+        self.analyses: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._analyses_lock = threading.Lock()
+    
+    def _crawler(self) -> async_crawler.AsyncCrawler:
+        crawler = async_crawler.AsyncCrawler(
+            workers=ScrapingConfig.WORKERS,
+            timeout=ScrapingConfig.TIMEOUT,
+            max_retries=ScrapingConfig.MAX_RETRIES,
+            max_bytes=ScrapingConfig.MAX_CONTENT_LENGTH,
+            user_agent=ScrapingConfig.USER_AGENT,
+            cache=self.cache,
+            # Conditional GETs against what the last crawl saw (services/crawl_state.py)
+            validators=self.state.validators if self.state else None,
+            known_links=self.state.known_links if self.state else None
+        )
+        crawler.stats = self.stats  # accumulate over every run of this crawler
+        return crawler
+    
+    def prefetch(self, urls: List[str], on_page: Optional[async_crawler.PageCallback] = None) -> int:
+        """
+        Make sure every URL is in the job's page cache. Pages already fetched
+        (e.g. during crawl_recursive) are not downloaded again; the rest are
+        fetched concurrently. on_page receives every page, cached or not.
+        Returns how many had to be fetched.
+        """
+        urls = list(dict.fromkeys(urls))
+        missing = [url for url in urls if url not in self.cache]
+        targets = urls if on_page else missing
+        if targets:
+            async_crawler.run_sync(self._crawler().fetch_many(targets, on_page))
+        return len(missing)
+    
+    def get_page(self, url: str) -> Optional[str]:
+        """HTML of a page fetched by this job (None if it failed)"""
+        page = self.cache.get(url)
+        return page.html if page is not None else None
+    
+    def close(self):
+        """Drop the job's page cache"""
+        self.cache.close()
+        self.analyses.clear()
+    
+    def take_analysis(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        ScrapePipeline `prepared` hook: {"page": extracted or None} if the page
+        was already extracted during link discovery, else None
+        """
+        with self._analyses_lock:
+            if url not in self.analyses:
+                return None
+            return {"page": self.analyses.pop(url)}
     
     def get_links_from_page(self, url: str, html: str) -> List[str]:
-        """Extract all valid links from a page"""
+        """
+        Extract all valid links from a page. The same parse also extracts the
+        page's content (in the extraction pool), kept for the scrape pipeline.
+        """
         try:
-            soup = BeautifulSoup(html, 'lxml')
-            links = []
-            
-            for a_tag in soup.find_all('a', href=True):
-                href = a_tag['href']
-                
-                # Convert relative to absolute
-                absolute_url = urljoin(url, href)
-                
-                # Normalize
-                normalized = URLValidator.normalize_url(absolute_url)
-                
-                # Validate
-                if URLValidator.is_valid_url(normalized, self.base_domain):
-                    links.append(normalized)
-            
-            return list(set(links))  # Remove duplicates
-        
+            analysis = get_extract_pool().submit(analyze_page, url, html).result()
         except Exception as e:
             logger.error(f"Failed to extract links from {url}: {e}")
             return []
+        
+        with self._analyses_lock:
+            self.analyses[url] = analysis["page"]
+        
+        return [
+            link for link in analysis["links"]
+            if URLValidator.is_valid_url(link, self.base_domain) and robots.allowed(link)
+        ]
     
-    def crawl_recursive(self, start_url: str, max_depth: int = 2) -> List[str]:
-        """Recursively crawl website up to max_depth"""
+    def crawl_recursive(
+        self,
+        start_url: str,
+        max_depth: int = 2,
+        max_pages: int = 500,
+        on_page: Optional[async_crawler.PageCallback] = None
+    ) -> List[str]:
+        """
+        Breadth-first crawl up to max_depth with the concurrent worker pool.
+        on_page receives each page as soon as it is fetched (scrape pipeline).
+        """
+        
+        logger.info(f"Crawling: {start_url} (max depth: {max_depth}, workers: {ScrapingConfig.WORKERS})")
+        
+        pages = async_crawler.run_sync(
+            self._crawler().crawl(start_url, max_depth, max_pages, self.get_links_from_page, on_page)
+        )
         
-        to_visit = [(start_url, 0)]  # (url, depth)
         discovered_urls = []
+        for page in pages:
+            if page.url not in self.visited:
+                self.visited.add(page.url)
+                discovered_urls.append(page.url)
         
-        while to_visit:
-            url, depth = to_visit.pop(0)
-            
-            # Skip if already visited
-            if url in self.visited:
-                continue
-            
-            # Skip if max depth exceeded
-            if depth > max_depth:
-                continue
-            
-            logger.info(f"Crawling: {url} (depth: {depth})")
-            
-            # Fetch page
-            html = RequestsHelper.fetch_url(url, self.session)
-            if not html:
-                continue
-            
-            # Mark as visited
-            self.visited.add(url)
-            discovered_urls.append(url)
-            
-            # Extract links for next level
-            if depth < max_depth:
-                links = self.get_links_from_page(url, html)
-                for link in links:
-                    if link not in self.visited:
-                        to_visit.append((link, depth + 1))
-        
-        logger.info(f"Crawling complete. Found {len(discovered_urls)} pages.")
+        logger.info(
+            f"Crawling complete. Found {len(discovered_urls)} pages "
+            f"({self.stats.pages_per_second:.1f} pages/sec)."
+        )
         return discovered_urls
     
-    def get_sitemap_urls(self) -> List[str]:
-        """Try to get URLs from sitemap.xml"""
-        sitemap_urls = [
-            urljoin(self.base_url, '/sitemap.xml'),
-            urljoin(self.base_url, '/sitemap_index.xml'),
-        ]
+    def crawl_frontier(
+        self,
+        frontier: CrawlFrontier,
+        on_page: Optional[async_crawler.PageCallback] = None
+    ) -> List[str]:
+        """
+        Run or continue a crawl job from its persisted frontier; stops early
+        when the job is paused or cancelled.
+        """
         
-        for sitemap_url in sitemap_urls:
-            try:
-                logger.info(f"Checking sitemap: {sitemap_url}")
-                html = RequestsHelper.fetch_url(sitemap_url, self.session)
-                
-                if not html:
-                    continue
-                
-                soup = BeautifulSoup(html, 'xml')
-                locs = soup.find_all('loc')
-                
-                urls = [loc.get_text().strip() for loc in locs]
-                
-                # Filter and limit
-                filtered = [
-                    URLValidator.normalize_url(u) 
-                    for u in urls 
-                    if URLValidator.is_valid_url(u, self.base_domain)
-                ]
-                
-                # Apply limit
-                filtered = filtered[:ScrapingConfig.MAX_URLS_PER_SITEMAP]
-                
-                logger.info(f"Found {len(filtered)} URLs in sitemap")
-                return filtered
-            
-            except Exception as e:
-                logger.warning(f"Failed to parse sitemap {sitemap_url}: {e}")
+        logger.info(f"Crawling job {frontier.job_id}: {len(frontier.queue)} URLs queued, {frontier.remaining} pages to go")
+        
+        pages = async_crawler.run_sync(
+            self._crawler().resume(
+                frontier.queue, frontier.known, frontier.max_depth, frontier.remaining,
+                self.get_links_from_page, on_page, should_stop=frontier.should_stop
+            )
+        )
+        return [page.url for page in pages]
+    
+    def _sitemap_url(self, url: str) -> Optional[str]:
+        """Normalized URL if a sitemap entry should be scraped, else None"""
+        normalized = URLValidator.normalize_url(url.strip())
+        if URLValidator.is_valid_url(normalized, self.base_domain) and robots.allowed(normalized):
+            return normalized
+        return None
+    
+    def get_sitemap_urls(self, limit: Optional[int] = None) -> List[str]:
+        """
+        Best URLs from the site's sitemaps (newest lastmod first). Sitemaps
+        are streamed, so their size does not matter; only `limit` URLs are kept.
+        """
+        limit = min(limit or ScrapingConfig.MAX_URLS_PER_SITEMAP, ScrapingConfig.MAX_URLS_PER_SITEMAP)
+        locations = sitemaps.discover(self.base_url, robots.get_policy(self.base_url).sitemaps)
+        logger.info(f"Checking sitemaps: {', '.join(locations)}")
         
-        return []
+        urls = sitemaps.top_urls(sitemaps.iter_urls(locations, self.session), limit, accept=self._sitemap_url)
+        
+        logger.info(f"Found {len(urls)} URLs in sitemap")
+        return urls
 
 # ============================================================================
 # MAIN SCRAPING SERVICE
@@ -386,6 +555,9 @@ class WebScrapingService:
             if not bot:
                 return {"success": False, "error": "Bot not found"}
             
+            if not robots.allowed(url):
+                return {"success": False, "error": "URL is disallowed by the site's robots.txt"}
+            
             # Fetch content
             session = RequestsHelper.get_session()
             html = RequestsHelper.fetch_url(url, session)
@@ -399,26 +571,47 @@ class WebScrapingService:
             if not extracted:
                 return {"success": False, "error": "Failed to extract content"}
             
-            # Ingest into RAG
-            success = data_ingestion.ingest_text_content(
-                bot_id=bot.public_id,
-                content=extracted['content'],
-                source_name=f"web_{urlparse(url).netloc}",
-                metadata={
+            # Own source per page, tracked in the crawl state like a crawled page
+            source_name, content, metadata = page_source(url, extracted)
+            state = CrawlState(bot.public_id)
+            state.record_fetch(async_crawler.FetchResult(url=url, status=200, html=html))
+            reason = state.skip_reason(url, source_name, content)
+            
+            if reason:
+                state.remove_stale()
+                state.checkpoint()
+                return {
+                    "success": True,
                     "url": url,
                     "title": extracted['title'],
-                    "scraped_at": extracted['extracted_at']
+                    "content_length": len(content),
+                    "skipped": reason,
+                    "message": f"Page not ingested ({reason})"
                 }
+            
+            # Ingest into RAG
+            success = data_ingestion.ingest_text_content(
+                bot_id=bot.public_id,
+                content=content,
+                source_name=source_name,
+                metadata=metadata
             )
             
             if not success:
+                state.mark_failed(url)
+                state.checkpoint()
                 return {"success": False, "error": "Failed to ingest content"}
             
+            state.mark_ingested(url)
+            state.remove_stale()
+            # Only this page's row: a crawl job of the same bot may be saving its own state
+            state.checkpoint()
+            
             return {
                 "success": True,
                 "url": url,
                 "title": extracted['title'],
-                "content_length": len(extracted['content']),
+                "content_length": len(content),
                 "message": "Successfully scraped and added to knowledge base"
             }
         
@@ -433,10 +626,13 @@ class WebScrapingService:
         method: str,  # "sitemap", "crawl", or "single"
         db: Session,
         max_pages: int = 50,
-        max_depth: int = 2
+        max_depth: int = 2,
+        force: bool = False,
+        frontier: Optional[CrawlFrontier] = None
     ) -> Dict[str, Any]:
         """
-        Scrape entire website using specified method
+        Scrape entire website using specified method.
+        Recrawls are incremental: unchanged pages are skipped (see services/crawl_state.py).
         
         Args:
             bot_id: Bot ID
@@ -444,9 +640,12 @@ class WebScrapingService:
             method: "sitemap" (use sitemap.xml), "crawl" (recursive), "single"
             max_pages: Maximum pages to scrape
             max_depth: Maximum crawl depth (for "crawl" method)
+            force: Re-scrape every page, even if unchanged
+            frontier: Persisted frontier of a background crawl job (services/crawl_jobs.py)
         """
         
         logger.info(f"Starting website scrape: {start_url}, method: {method}")
+        crawler = None
         
         try:
             # Validate bot
@@ -454,103 +653,108 @@ class WebScrapingService:
             if not bot:
                 return {"success": False, "error": "Bot not found"}
             
-            # Initialize crawler
-            crawler = WebCrawler(start_url)
-            
-            # Get URLs based on method
-            if method == "single":
-                urls = [start_url]
-            
-            elif method == "sitemap":
-                urls = crawler.get_sitemap_urls()
-                if not urls:
-                    logger.warning("No sitemap found, falling back to crawl")
-                    urls = crawler.crawl_recursive(start_url, max_depth=1)
-            
-            elif method == "crawl":
-                urls = crawler.crawl_recursive(start_url, max_depth=max_depth)
-            
-            else:
+            if method not in ("single", "sitemap", "crawl"):
                 return {"success": False, "error": f"Invalid method: {method}"}
             
-            # Limit URLs
-            urls = urls[:max_pages]
-            
-            logger.info(f"Scraping {len(urls)} pages...")
-            
-            # Scrape each URL
-            results = {
-                "total_urls": len(urls),
-                "successful": 0,
-                "failed": 0,
-                "pages": []
-            }
-            
-            for idx, url in enumerate(urls, 1):
-                logger.info(f"Processing {idx}/{len(urls)}: {url}")
+            # Also applies the site's Crawl-delay before the first request
+            if not robots.allowed(start_url):
+                return {"success": False, "error": "URL is disallowed by the site's robots.txt"}
+            
+            # Initialize crawler (its page cache lives for this job)
+            state = CrawlState(bot.public_id, force=force)
+            crawler = WebCrawler(start_url, state=state)
+            if frontier is not None:
+                frontier.state = state
+            
+            def fetch_stage(pipeline_on_page):
+                """Discover + fetch pages, handing each one to the pipeline as it arrives"""
+                def on_page(page):
+                    state.record_fetch(page)
+                    if frontier is not None:
+                        frontier.record_fetch(page)
+                    pipeline_on_page(page)
                 
-                # Fetch
-                html = RequestsHelper.fetch_url(url, crawler.session)
-                if not html:
-                    results['failed'] += 1
-                    continue
+                if frontier is not None:
+                    if not frontier.started:
+                        # First run of the job: plan its URLs the way a direct scrape would
+                        if method == "sitemap":
+                            urls = crawler.get_sitemap_urls(limit=max_pages)
+                            if not urls:
+                                logger.warning("No sitemap found, falling back to crawl")
+                            frontier.seed(urls or [start_url], max_depth=0 if urls else 1)
+                        else:
+                            frontier.seed([start_url], max_depth=0 if method == "single" else max_depth)
+                    crawler.crawl_frontier(frontier, on_page)
                 
-                # Extract
-                extracted = ContentExtractor.extract(html, url)
-                if not extracted:
-                    results['failed'] += 1
-                    continue
+                elif method == "single":
+                    crawler.prefetch([start_url], on_page)
                 
-                # Ingest
-                success = data_ingestion.ingest_text_content(
-                    bot_id=bot.public_id,
-                    content=extracted['content'],
-                    source_name=f"web_{urlparse(url).path.strip('/').replace('/', '_') or 'home'}",
-                    metadata={
-                        "url": url,
-                        "title": extracted['title'],
-                        "scraped_at": extracted['extracted_at']
-                    }
-                )
+                elif method == "sitemap":
+                    urls = crawler.get_sitemap_urls(limit=max_pages)
+                    if urls:
+                        crawler.prefetch(urls, on_page)
+                    else:
+                        logger.warning("No sitemap found, falling back to crawl")
+                        crawler.crawl_recursive(start_url, max_depth=1, max_pages=max_pages, on_page=on_page)
                 
-                if success:
-                    results['successful'] += 1
-                    results['pages'].append({
-                        "url": url,
-                        "title": extracted['title'],
-                        "content_length": len(extracted['content'])
-                    })
                 else:
-                    results['failed'] += 1
+                    crawler.crawl_recursive(start_url, max_depth=max_depth, max_pages=max_pages, on_page=on_page)
+            
+            def on_settled(url, outcome):
+                if outcome == "ingested":
+                    state.mark_ingested(url)
+                elif outcome == "failed":
+                    state.mark_failed(url)
+                if frontier is not None:
+                    frontier.settle(url, outcome)
+            
+            # Fetch, extraction and embedding overlap (see services/scrape_pipeline.py)
+            pipeline = ScrapePipeline(
+                bot.public_id, extract_page, page_source,
+                skip=state.skip_reason,
+                prepared=crawler.take_analysis,
+                on_settled=on_settled
+            )
+            report = pipeline.run(fetch_stage)
+            
+            removed = state.remove_stale()
+            state.save()
+            
+            unchanged = crawler.stats.not_modified + report.unchanged
+            results = {
+                "total_urls": report.fetched + crawler.stats.not_modified + crawler.stats.errors,
+                "successful": report.ingested,
+                "unchanged": unchanged,
+                "duplicates": state.duplicates,
+                "removed": removed,
+                "failed": crawler.stats.errors + report.extract_failed + report.ingest_failed,
+                "pages": [
+                    {"url": p["url"], "title": p["title"], "content_length": p["content_length"]}
+                    for p in report.pages
+                ],
+                "crawl_stats": crawler.stats.to_dict(),
+                "pipeline": report.to_dict()
+            }
             
             return {
                 "success": True,
-                "message": f"Scraped {results['successful']} pages successfully",
+                "message": f"Scraped {results['successful']} pages successfully ({unchanged} unchanged)",
                 "results": results
             }
         
         except Exception as e:
             logger.error(f"Website scraping error: {e}", exc_info=True)
             return {"success": False, "error": str(e)}
+        
+        finally:
+            if crawler is not None:
+                crawler.close()
 
 # ============================================================================
-# BACKGROUND TASK SUPPORT (Optional)
+# BACKGROUND TASK SUPPORT
 # ============================================================================
 """
-For async scraping, integrate with Celery:
-
-@celery_app.task
-def scrape_website_async(bot_id: int, start_url: str, method: str):
-    from db.database import SessionLocal
-    db = SessionLocal()
-    try:
-        result = WebScrapingService.scrape_website(
-            bot_id=bot_id,
-            start_url=start_url,
-            method=method,
-            db=db
-        )
-        return result
-    finally:
-        db.close()
-"""
\ No newline at end of file
+Background scrapes run as crawl jobs (services/crawl_jobs.py): each job
+opens its own database session, persists its frontier, and can be paused,
+resumed or picked up by another worker after a restart.
+"""